@@ -12,6 +12,14 @@ from dotenv import load_dotenv
 
 # Server
 HTTP_PORT = 8000
+HTTP_SERVER_BACKEND = getenv("HTTP_SERVER_BACKEND", "threading")  # or "asyncio"
+HTTP_ASYNC_WORKERS = 4  # thread pool for blocking work in the asyncio backend
+HTTP_KEEPALIVE_TIMEOUT = 15.0
+WEB_DIR = Path("web")
+STATIC_CACHE_MAX_FILE_SIZE = 256 * 1024  # larger files are sent with sendfile
+STATIC_MAX_AGE = 60
+JOB_EVENTS_KEEPALIVE = 15.0  # seconds between SSE keep-alive comments
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
 STATIC_DIR = Path("web/static")
 INDEX_PATH = Path("web/index.html")
 
@@ -24,6 +32,10 @@ load_dotenv()
 RUNWAY_AUTH_TOKEN = getenv("RUNWAYML_API_SECRET")
 
 # Camera
+CAMERA_SOURCE = getenv("CAMERA_SOURCE", "v4l2")  # "v4l2" or "replay"
+CAMERA_REPLAY_PREVIEW = getenv("CAMERA_REPLAY_PREVIEW")
+CAMERA_REPLAY_FULL = getenv("CAMERA_REPLAY_FULL")
+CAMERA_REPLAY_REALTIME = getenv("CAMERA_REPLAY_REALTIME", "1") != "0"
 VIDEO_DEVICE_PREVIEW = "/dev/video12"
 CAMERA_PREVIEW_WIDTH = 640
 CAMERA_PREVIEW_HEIGHT = 480
@@ -32,9 +44,27 @@ VIDEO_DEVICE_FULL = "/dev/video11"
 CAMERA_FULL_WIDTH = 640
 CAMERA_FULL_HEIGHT = 480
 CAMERA_FULL_FORMAT = 'UYVY'
+CAMERA_FULL_MAX_WIDTH = 4224
+CAMERA_FULL_MAX_HEIGHT = 3136
+CAMERA_FULL_KEEPALIVE_FPS = 0  # 0 opens the full device only for stills
+CAMERA_STILL_BURST = 5
+CAMERA_STILL_WARMUP = 3
+CAMERA_STILL_FULL_RESOLUTION = False
+CAMERA_RING_SIZE = 4
+
+# Main loop
+LOOP_FPS_IDLE = 5
+LOOP_FPS_ACTIVE = 20
+LOOP_FPS_MAX = 30  # should not exceed the preview frame rate
+LOOP_IDLE_GRACE = 3.0  # seconds at the active rate after the face left
 
 # Face detection/recognition
 MODEL_DIR = Path("app/res/models")
+GAZE_INFERENCE_WORKER = False  # run gaze inference in a separate process
+GAZE_WORKER_TIMEOUT = 1.0
+GAZE_ROI_TRACKING = True  # track the face in a crop, full-frame detection only periodically
+GAZE_ROI_MARGIN = 0.3  # fraction of the face size added on each side of the crop
+GAZE_ROI_REDETECT_INTERVAL = 15  # frames between full-frame detections
 
 # Display
 SHADER_DIR = Path("app/core/display/shaders")
@@ -48,3 +78,13 @@ FINAL_GENERATED_VIDEO_PATH = TEMP_DIR/"generated_video_final.mp4"
 MORPH_VIDEO_PATH = TEMP_DIR/"morph_video.mp4"
 FACE_MOVIE_FACE_ALIGN_SCRIPT = Path("app/core/morph/face-movie/face-movie/align.py")
 FACE_MOVIE_MORPH_SCRIPT = Path("app/core/morph/face-movie/face-movie/main.py")
+FACE_MOVIE_WORKER = True  # keep one warm interpreter for the scripts, else spawn one per call
+FACE_MOVIE_WORKER_TIMEOUT = 300.0
+REMBG_PRELOAD = True  # load the segmentation model at boot, in the background
+MORPH_PREPROCESS_WORKERS = 3  # preprocessing stages running at the same time
+MORPH_ENGINE = getenv("MORPH_ENGINE", "native")  # or "face_movie", the main.py -morph script
+PINGPONG_SEGMENT_DURATION = 1.0  # reverse in keyframe chunks of at least this many seconds, None for the whole clip at once
+ARTIFACT_CACHE_DIR = RAMDISK_DIR/"cache"  # child-derived outputs, by content hash
+ARTIFACT_CACHE_MAX_BYTES = 128 * 1024 * 1024
+ARTIFACT_CACHE_SPILL_DIR = getenv("ARTIFACT_CACHE_SPILL_DIR")  # e.g. on the SD card, keeps what the ramdisk evicts
+ARTIFACT_CACHE_SPILL_MAX_BYTES = 1024 * 1024 * 1024
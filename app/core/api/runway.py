@@ -14,6 +14,12 @@ from base64 import b64encode
 from app.config import RUNWAY_AUTH_TOKEN
 
 test_video = True
+# Everything that shapes the generated video, also part of its cache key
+MODEL = 'gen4_turbo'
+PROMPT_TEXT = 'The camera is still, with natural lighting. Subject sits still and maintains a serious expression holding direct eye contact with the camera while blinking occasionally. Subject nods slowly at the 3-second marks and occasionally tilts his head slightly.'
+RATIO = '720:1280'
+DURATION = 5
+
 runway_client = RunwayML(api_key=RUNWAY_AUTH_TOKEN)
 
 def generate_video(img: np.ndarray) -> Optional[str]:
@@ -22,11 +28,11 @@ def generate_video(img: np.ndarray) -> Optional[str]:
         data_uri = f"data:image/jpeg;base64,{base64_jpg}"
 
         task = runway_client.image_to_video.create(
-            model='gen4_turbo',
+            model=MODEL,
             prompt_image=data_uri,
-            prompt_text='The camera is still, with natural lighting. Subject sits still and maintains a serious expression holding direct eye contact with the camera while blinking occasionally. Subject nods slowly at the 3-second marks and occasionally tilts his head slightly.',
-            ratio='720:1280',
-            duration=5,
+            prompt_text=PROMPT_TEXT,
+            ratio=RATIO,
+            duration=DURATION,
         ).wait_for_task_output()
 
         video_url = task.output[0]
@@ -5,87 +5,353 @@
 #
 # Distributed under terms of the GPLv3 license.
 
+import threading, time, weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+
 import cv2
+import numpy as np
 
 import app.config as cfg
+from .source import CameraSource, ReplaySource, V4L2Source
 
-import threading
-import cv2
 
-full_cap = None
-preview_cap = None
+class Frame(NamedTuple):
+    seq: int
+    timestamp: float  # time.monotonic() when the frame left the driver
+    image: np.ndarray
+
+
+class _Stream:
+    """A capture device, its grabber thread and a ring of the latest frames.
+
+    Frames live in a pool of preallocated buffers: the driver reads into a
+    reusable raw array, which is flipped into a pooled buffer. Readers get
+    read-only views leased through a _Lease, and a buffer only goes back to
+    the pool once all its leases are gone.
+
+    With an opener, the device is only open while grab() or grab_still()
+    reads from it: a V4L2 device streams from its first read until it is
+    closed, whether or not anyone takes its frames.
+    """
+
+    def __init__(self, name: str, cap: Optional[CameraSource], rate: float = 0.0,
+                 opener: Optional[Callable[[], CameraSource]] = None):
+        self.name = name
+        self.cap = cap
+        self.rate = rate  # grabber frame rate cap, 0 to grab as fast as the device delivers
+        self.opener = opener
+        self.running = False
+        self._thread = None
+        self._cap_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._ring = deque(maxlen=cfg.CAMERA_RING_SIZE)
+        self._seq = 0
+        self._raw = None
+        self._free = []
+        self._leases = {}  # id(buffer) -> live leases
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def release(self) -> None:
+        self.stop()
+        with self._cap_lock:
+            self.opener = None
+            if self.cap:
+                self.cap.release()
+                self.cap = None
+
+    @contextmanager
+    def _device(self) -> Iterator[Optional[CameraSource]]:
+        """The open device, or None; opened and closed around the block with an opener. Hold _cap_lock."""
+        if self.opener is None:
+            yield self.cap if self.cap is not None and self.cap.isOpened() else None
+            return
+        self.cap = self.opener()
+        try:
+            yield self.cap if self.cap.isOpened() else None
+        finally:
+            # Closing is what stops the streaming
+            self.cap.release()
+            self.cap = None
+
+    def grab(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Read one frame from the device and push it into the ring."""
+        with self._cap_lock, self._device() as cap:
+            if cap is None:
+                return False, None
+            ret, raw = cap.read(self._raw)
+            timestamp = time.monotonic()
+            if not ret or raw is None:
+                return False, None
+            self._raw = raw
+            buf = self._publish(raw, timestamp)
+        return True, self._lease(buf)
+
+    def grab_still(self, burst: int, warmup: int, size: Optional[Tuple[int, int]] = None) -> Optional[np.ndarray]:
+        """
+        Read a burst of frames, optionally at another resolution, and push
+        the sharpest one into the ring.
+        """
+        with self._cap_lock, self._device() as cap:
+            if cap is None:
+                return None
+
+            if size:
+                stream_size = (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+
+            try:
+                # Flush frames queued by the driver while the device was idle,
+                # or the first ones after it opened, while exposure settles
+                for _ in range(warmup):
+                    cap.grab()
+
+                best, best_score, best_timestamp = None, -1.0, 0.0
+                for _ in range(burst):
+                    ret, raw = cap.read()
+                    timestamp = time.monotonic()
+                    if not ret or raw is None:
+                        continue
+                    score = _sharpness(raw)
+                    if score > best_score:
+                        best, best_score, best_timestamp = raw, score, timestamp
+            finally:
+                if size and self.opener is None:
+                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, stream_size[0])
+                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, stream_size[1])
+
+            if best is None:
+                return None
+            buf = self._publish(best, best_timestamp)
+        return self._lease(buf)
+
+    def _publish(self, raw: np.ndarray, timestamp: float) -> np.ndarray:
+        buf = self._acquire(raw.shape, raw.dtype)
+        cv2.flip(raw, 0, dst=buf)
+
+        with self._cond:
+            if len(self._ring) == self._ring.maxlen:
+                self._free.append(self._ring.popleft().image)
+            self._seq += 1
+            self._ring.append(Frame(self._seq, timestamp, buf))
+            self._cond.notify_all()
+        return buf
+
+    def _acquire(self, shape, dtype) -> np.ndarray:
+        """Pop a pooled buffer with no lease left, or allocate one."""
+        with self._cond:
+            for i in range(len(self._free)):
+                buf = self._free[i]
+                if buf.shape == shape and buf.dtype == dtype and id(buf) not in self._leases:
+                    return self._free.pop(i)
+            # Buffers leased by slow readers are left behind, keep the pool bounded
+            del self._free[:-cfg.CAMERA_RING_SIZE]
+        return np.empty(shape, dtype)
+
+    def _lease(self, buf: np.ndarray) -> np.ndarray:
+        """Read-only view of buf, which stays out of the pool while the view lives."""
+        lease = _Lease(buf)
+        with self._cond:
+            self._leases[id(buf)] = self._leases.get(id(buf), 0) + 1
+        # The finalizer keeps buf alive, so its id is not reused before the entry goes
+        weakref.finalize(lease, self._unlease, buf).atexit = False
+        return np.asarray(lease)
+
+    def _unlease(self, buf: np.ndarray) -> None:
+        with self._cond:
+            count = self._leases.pop(id(buf)) - 1
+            if count:
+                self._leases[id(buf)] = count
 
-_last_full_frame = None
-_last_preview_frame = None
+    def latest(self, newer_than: Optional[int] = None, timeout: Optional[float] = None) -> Optional[Frame]:
+        """
+        Newest frame, optionally waiting for one with seq > newer_than.
 
-# Locks for thread safety
-_full_lock = threading.Lock()
-_preview_lock = threading.Lock()
+        While capture is stopped the wait lasts until a frame comes in
+        (e.g. from grab()) or timeout expires, so callers looping on it
+        do not spin.
+        """
+        with self._cond:
+            if newer_than is not None:
+                if not self._cond.wait_for(lambda: self._seq > newer_than, timeout):
+                    return None
+            if not self._ring:
+                return None
+            frame = self._ring[-1]
+            return frame._replace(image=self._lease(frame.image))
 
+    @property
+    def seq(self) -> int:
+        with self._cond:
+            return self._seq
 
-def init() -> None:
-    global full_cap, preview_cap
+    def _run(self) -> None:
+        period = 1.0 / self.rate if self.rate else 0.0
+        deadline = time.monotonic()
+        while self.running:
+            ret, _ = self.grab()
+            if not ret:
+                # Device hiccup or closed, do not spin
+                time.sleep(0.01)
+                continue
 
-    # Full
-    full_cap = cv2.VideoCapture(cfg.VIDEO_DEVICE_FULL, cv2.CAP_V4L2)
-    full_cap.set(cv2.CAP_PROP_FRAME_WIDTH, cfg.CAMERA_FULL_WIDTH)
-    full_cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cfg.CAMERA_FULL_HEIGHT)
-    full_cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*cfg.CAMERA_FULL_FORMAT))
+            if period:
+                deadline += period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    deadline = time.monotonic()
 
-    # Preview
-    preview_cap = cv2.VideoCapture(cfg.VIDEO_DEVICE_PREVIEW, cv2.CAP_V4L2)
-    preview_cap.set(cv2.CAP_PROP_FRAME_WIDTH, cfg.CAMERA_PREVIEW_WIDTH)
-    preview_cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cfg.CAMERA_PREVIEW_HEIGHT)
-    preview_cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*cfg.CAMERA_PREVIEW_FORMAT))
+
+class _Lease:
+    """
+    Owner of a read-only view of a pooled buffer.
+
+    The leased array is a view whose base is the lease, and every array
+    derived from it (slices, reshapes, transposes...) references it or the
+    lease through its base chain. So the lease lives exactly as long as some
+    view of the buffer handed out through it, whatever the reader does.
+    """
+
+    def __init__(self, buf: np.ndarray):
+        self.buf = buf
+        interface = dict(buf.__array_interface__)
+        interface["data"] = (interface["data"][0], True)
+        self.__array_interface__ = interface
+
+
+def _sharpness(image: np.ndarray) -> float:
+    """Variance of the Laplacian, computed on a downscaled grey copy."""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = 640 / max(image.shape[:2])
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(image, cv2.CV_64F).var())
+
+
+_full = None
+_preview = None
+
+
+def init(threaded: bool = True, source: str = cfg.CAMERA_SOURCE) -> None:
+    global _full, _preview
+
+    if source == "replay":
+        # Recorded session, e.g. to profile the loop off-device
+        if not cfg.CAMERA_REPLAY_PREVIEW:
+            raise Exception("no preview recording configured for replay")
+        full_cap = ReplaySource(cfg.CAMERA_REPLAY_FULL or cfg.CAMERA_REPLAY_PREVIEW, realtime=cfg.CAMERA_REPLAY_REALTIME)
+        preview_cap = ReplaySource(cfg.CAMERA_REPLAY_PREVIEW, realtime=cfg.CAMERA_REPLAY_REALTIME)
+    else:
+        # Full, stills flush the queue anyway so keep as few stale buffers as possible
+        def open_full() -> V4L2Source:
+            return V4L2Source(cfg.VIDEO_DEVICE_FULL, cfg.CAMERA_FULL_WIDTH, cfg.CAMERA_FULL_HEIGHT,
+                              cfg.CAMERA_FULL_FORMAT, buffer_size=1)
+        full_cap = open_full()
+        # Preview
+        preview_cap = V4L2Source(cfg.VIDEO_DEVICE_PREVIEW, cfg.CAMERA_PREVIEW_WIDTH, cfg.CAMERA_PREVIEW_HEIGHT,
+                                 cfg.CAMERA_PREVIEW_FORMAT)
 
     if not preview_cap.isOpened() or not full_cap.isOpened():
+        full_cap.release()
+        preview_cap.release()
         raise Exception("could not open video devices")
 
+    _preview = _Stream("preview", preview_cap)
+    if source != "replay" and not cfg.CAMERA_FULL_KEEPALIVE_FPS:
+        # Without keep-alive the full device is only opened for stills, once
+        # open it would stream at full rate for good
+        full_cap.release()
+        _full = _Stream("full", None, opener=open_full)
+    else:
+        _full = _Stream("full", full_cap, rate=cfg.CAMERA_FULL_KEEPALIVE_FPS)
+
+    # One grabber thread per stream keeps the rings filled, the full device
+    # stays closed (or at a low keep-alive rate) until a still is requested
+    if threaded:
+        _preview.start()
+        if cfg.CAMERA_FULL_KEEPALIVE_FPS > 0:
+            _full.start()
+
 
 def free() -> None:
-    global full_cap, preview_cap
+    global _full, _preview
 
-    with _full_lock:
-        if full_cap:
-            full_cap.release()
-            full_cap = None
+    for stream in (_full, _preview):
+        if stream:
+            stream.release()
+    _full = None
+    _preview = None
 
-    with _preview_lock:
-        if preview_cap:
-            preview_cap.release()
-            preview_cap = None
 
+def read_frame(preview=False, newer_than: Optional[int] = None, timeout: Optional[float] = None,
+               copy: bool = False) -> Optional[Frame]:
+    """
+    Return the newest captured frame with its sequence number and timestamp (thread-safe).
 
-def read(preview=False):
-    """Return the last captured frame (thread-safe)."""
-    if preview:
-        with _preview_lock:
-            return _last_preview_frame.copy() if _last_preview_frame is not None else None
-    else:
-        with _full_lock:
-            return _last_full_frame.copy() if _last_full_frame is not None else None
+    If newer_than is given, block until a frame with a greater sequence number
+    is available or timeout expires, in which case None is returned.
+    The image is a read-only view into the frame pool unless copy is True.
+    """
+    stream = _preview if preview else _full
+    if stream is None:
+        return None
+    frame = stream.latest(newer_than, timeout)
+    if frame is None or not copy:
+        return frame
+    return frame._replace(image=frame.image.copy())
+
+
+def read(preview=False, newer_than: Optional[int] = None, timeout: Optional[float] = None,
+         copy: bool = False) -> Optional[np.ndarray]:
+    """Return the last captured frame (thread-safe, read-only unless copy is True)."""
+    frame = read_frame(preview, newer_than, timeout, copy)
+    return frame.image if frame is not None else None
 
 
 def capture(preview=False):
     """Grab a new frame from the camera and update the last frame."""
-    global _last_full_frame, _last_preview_frame
+    stream = _preview if preview else _full
+    if stream is None:
+        return False, None
 
-    if preview:
-        with _preview_lock:
-            if preview_cap is None or not preview_cap.isOpened():
-                return False, None
-            ret, frame = preview_cap.read()
-            frame = cv2.flip(frame, 0)
-            if ret:
-                _last_preview_frame = frame.copy()
-            return ret, frame
-    else:
-        with _full_lock:
-            if full_cap is None or not full_cap.isOpened():
-                return False, None
-            ret, frame = full_cap.read()
-            frame = cv2.flip(frame, 0)
-            if ret:
-                _last_full_frame = frame.copy()
-            return ret, frame
+    # The grabber owns the device, just wait for its next frame
+    if stream.running:
+        frame = read_frame(preview, newer_than=stream.seq, timeout=1.0)
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+    return stream.grab()
+
+
+def capture_still(full_resolution: bool = False, burst: int = cfg.CAMERA_STILL_BURST) -> Optional[np.ndarray]:
+    """
+    Take a still picture on the full device.
 
+    Grabs a burst of frames, optionally at the sensor maximum resolution,
+    and returns the sharpest one (variance of the Laplacian). The still also
+    becomes the latest frame returned by read(preview=False).
+    """
+    if _full is None:
+        return None
+    size = (cfg.CAMERA_FULL_MAX_WIDTH, cfg.CAMERA_FULL_MAX_HEIGHT) if full_resolution else None
+    return _full.grab_still(burst, cfg.CAMERA_STILL_WARMUP, size)
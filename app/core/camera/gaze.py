@@ -0,0 +1,26 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+from typing import Optional, Union
+
+import app.config as cfg
+from .gaze_tracker.gaze_tracker import GazeTracker
+from .roi_tracker import RoiGazeTracker
+
+
+def create_tracker(roi: Optional[bool] = None) -> Union[GazeTracker, RoiGazeTracker]:
+    """
+    New gaze tracker for the preview stream.
+
+    With ROI tracking (GAZE_ROI_TRACKING by default) the tracker only looks
+    at the area around the last face on most frames. Use roi=False for
+    unrelated stills.
+    """
+    tracker = GazeTracker(enable_tracking=True, model_dir=str(cfg.MODEL_DIR))
+    if cfg.GAZE_ROI_TRACKING if roi is None else roi:
+        return RoiGazeTracker(tracker)
+    return tracker
@@ -0,0 +1,289 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+import contextlib, os, signal, threading, time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import app.config as cfg
+from . import gaze, landmarks as lmk
+
+MAX_LANDMARKS = 512
+
+_FRAME_HEADER = np.dtype([
+    ("seq", np.int64),
+    ("frame_seq", np.int64),
+    ("timestamp", np.float64),
+    ("shape", np.int32, (3,)),  # height, width, channels (0 for greyscale)
+])
+_FRAME_HEADER_SIZE = 64
+
+_RESULT = np.dtype([
+    ("seq", np.int64),          # submission the result belongs to, 0 until the first result
+    ("frame_seq", np.int64),    # camera sequence number of the frame
+    ("timestamp", np.float64),  # camera timestamp of the frame
+    ("inference", np.float64),  # get_eye_state duration in seconds
+    ("has_state", np.bool_),
+    ("state", "S16"),
+    ("n_landmarks", np.int32),
+    ("landmarks", np.float32, (MAX_LANDMARKS, 3)),
+    ("bbox", np.int32, (4,)),
+    ("size", np.int32, (2,)),   # width, height of the frame
+])
+
+
+class GazeResult(NamedTuple):
+    seq: int
+    frame_seq: int
+    timestamp: float
+    inference: float
+    state: Optional[str]
+    landmarks: Optional[np.ndarray]
+    bbox: Optional[Tuple[int, int, int, int]]
+    size: Tuple[int, int]
+
+
+class GazeWorker:
+    """
+    Gaze inference in a separate process.
+
+    Preview frames are handed over through a shared memory slot and the
+    worker publishes eye state, landmarks and face bbox back through another
+    one, so readers get the latest result without touching the model and
+    capture, inference and streaming do not share a GIL. Exposes the
+    GazeTracker methods the app relies on (get_eye_state, get_landmarks,
+    draw_bbox). Once closed they return None or leave the frame alone, so
+    callers racing close() need no extra care.
+    """
+
+    def __init__(self, max_shape: Tuple[int, int, int] = (cfg.CAMERA_PREVIEW_HEIGHT, cfg.CAMERA_PREVIEW_WIDTH, 3)):
+        ctx = mp.get_context("spawn")
+        self.max_shape = tuple(max_shape)
+
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=_FRAME_HEADER_SIZE + int(np.prod(max_shape)))
+        self._result_shm = shared_memory.SharedMemory(create=True, size=_RESULT.itemsize)
+        self._header, self._data = _frame_views(self._frame_shm)
+        self._result = np.ndarray((), _RESULT, buffer=self._result_shm.buf)
+        self._result[()] = np.zeros((), _RESULT)
+
+        self._frame_lock = ctx.Lock()
+        self._frame_ready = ctx.Event()
+        self._result_cond = ctx.Condition()
+        self._stop = ctx.Event()
+        self._seq = 0
+
+        # Calls in flight on the shared memory, close() waits for them
+        self._state = threading.Condition()
+        self._closed = False
+        self._users = 0
+
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(self._frame_shm.name, self._result_shm.name, self._frame_lock, self._frame_ready,
+                  self._result_cond, self._stop, os.getpid()),
+            name="gaze-worker",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._process.start()
+        print(f"[INFO] Gaze inference worker started (pid {self._process.pid}).")
+
+    def close(self) -> None:
+        with self._state:
+            if self._closed:
+                return
+            self._closed = True
+        # Wake result() waiters, then let calls in flight finish
+        with self._result_cond:
+            self._result_cond.notify_all()
+        with self._state:
+            self._state.wait_for(lambda: self._users == 0)
+
+        self._stop.set()
+        self._frame_ready.set()
+        if self._process.is_alive():
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+
+        # Views must go before the segments can be closed
+        del self._header, self._data, self._result
+        for shm in (self._frame_shm, self._result_shm):
+            shm.close()
+            shm.unlink()
+        print("[INFO] Gaze inference worker stopped.")
+
+    @property
+    def closed(self) -> bool:
+        with self._state:
+            return self._closed
+
+    @contextlib.contextmanager
+    def _in_use(self):
+        """Yield whether the worker is open, keeping it open until the block exits."""
+        with self._state:
+            is_open = not self._closed
+            if is_open:
+                self._users += 1
+        try:
+            yield is_open
+        finally:
+            if is_open:
+                with self._state:
+                    self._users -= 1
+                    self._state.notify_all()
+
+    def submit(self, frame: np.ndarray, frame_seq: int = 0, timestamp: float = 0.0) -> Optional[int]:
+        """
+        Hand a frame over to the worker, replacing any frame not picked up yet.
+
+        Returns:
+            Optional[int]: Submission sequence number, None once closed.
+        """
+        with self._in_use() as is_open:
+            if not is_open:
+                return None
+            if frame.dtype != np.uint8 or frame.ndim not in (2, 3) or frame.size > self._data.size:
+                raise ValueError(f"Frame {frame.shape} {frame.dtype} does not fit the worker slot {self.max_shape}.")
+
+            with self._frame_lock:
+                self._seq += 1
+                np.copyto(self._data[:frame.size].reshape(frame.shape), frame)
+                self._header["seq"] = self._seq
+                self._header["frame_seq"] = frame_seq
+                self._header["timestamp"] = timestamp
+                self._header["shape"] = frame.shape if frame.ndim == 3 else frame.shape + (0,)
+                self._frame_ready.set()
+                return self._seq
+
+    def result(self, newer_than: Optional[int] = None, timeout: Optional[float] = None) -> Optional[GazeResult]:
+        """Latest published result, optionally waiting for one with seq > newer_than. None once closed."""
+        with self._in_use() as is_open:
+            if not is_open:
+                return None
+            with self._result_cond:
+                if newer_than is not None:
+                    ready = self._result_cond.wait_for(
+                        lambda: self._closed or int(self._result["seq"]) > newer_than, timeout)
+                    if not ready or int(self._result["seq"]) <= newer_than:
+                        return None
+                snapshot = self._result[()].copy()
+
+        if snapshot["seq"] == 0:
+            return None
+        n = int(snapshot["n_landmarks"])
+        return GazeResult(
+            seq=int(snapshot["seq"]),
+            frame_seq=int(snapshot["frame_seq"]),
+            timestamp=float(snapshot["timestamp"]),
+            inference=float(snapshot["inference"]),
+            state=snapshot["state"].decode() if snapshot["has_state"] else None,
+            landmarks=snapshot["landmarks"][:n] if n else None,
+            bbox=tuple(int(v) for v in snapshot["bbox"]) if n else None,
+            size=tuple(int(v) for v in snapshot["size"]),
+        )
+
+    def get_eye_state(self, frame: np.ndarray, frame_seq: int = 0, timestamp: float = 0.0,
+                      timeout: float = cfg.GAZE_WORKER_TIMEOUT) -> Optional[str]:
+        seq = self.submit(frame, frame_seq, timestamp)
+        if seq is None:
+            return None
+        result = self.result(newer_than=seq - 1, timeout=timeout)
+        return result.state if result else None
+
+    def get_landmarks(self) -> Optional[List[lmk.Landmark]]:
+        result = self.result()
+        return lmk.array_to_landmarks(result.landmarks) if result else None
+
+    def get_face_landmarks(self) -> Optional[lmk.FaceLandmarks]:
+        result = self.result()
+        if result is None or result.landmarks is None:
+            return None
+        return lmk.FaceLandmarks(result.landmarks, result.size, result.timestamp)
+
+    def draw_bbox(self, frame: np.ndarray, state: str) -> np.ndarray:
+        result = self.result()
+        if result is None or result.bbox is None:
+            return frame
+        x_min, y_min, x_max, y_max = result.bbox
+        cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
+        label = state or result.state
+        if label:
+            cv2.putText(frame, label, (x_min, max(0, y_min - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return frame
+
+
+def _frame_views(shm: shared_memory.SharedMemory) -> Tuple[np.ndarray, np.ndarray]:
+    header = np.ndarray((), _FRAME_HEADER, buffer=shm.buf)
+    data = np.ndarray((shm.size - _FRAME_HEADER_SIZE,), np.uint8, buffer=shm.buf, offset=_FRAME_HEADER_SIZE)
+    return header, data
+
+
+def _worker_main(frame_name, result_name, frame_lock, frame_ready, result_cond, stop, parent_pid) -> None:
+    # The parent handles Ctrl+C and tells us when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    frame_shm = shared_memory.SharedMemory(name=frame_name)
+    result_shm = shared_memory.SharedMemory(name=result_name)
+    header, data = _frame_views(frame_shm)
+    result = np.ndarray((), _RESULT, buffer=result_shm.buf)
+    local = np.empty_like(data)
+
+    tracker = gaze.create_tracker()
+
+    try:
+        while not stop.is_set():
+            if not frame_ready.wait(0.1):
+                if os.getppid() != parent_pid:
+                    break
+                continue
+
+            with frame_lock:
+                frame_ready.clear()
+                meta = header.copy()
+                h, w, c = (int(v) for v in meta["shape"])
+                shape = (h, w, c) if c else (h, w)
+                n = h * w * max(c, 1)
+                np.copyto(local[:n], data[:n])
+            if stop.is_set() or meta["seq"] == 0:
+                continue
+            frame = local[:n].reshape(shape)
+
+            try:
+                start = time.perf_counter()
+                state = tracker.get_eye_state(frame)
+                inference = time.perf_counter() - start
+                landmarks = lmk.landmarks_to_array(tracker.get_landmarks())
+            except Exception as e:
+                print(f"[ERROR] Gaze worker: {e}")
+                state, inference, landmarks = None, 0.0, None
+
+            with result_cond:
+                result["seq"] = meta["seq"]
+                result["frame_seq"] = meta["frame_seq"]
+                result["timestamp"] = meta["timestamp"]
+                result["inference"] = inference
+                result["size"] = (w, h)
+                result["has_state"] = state is not None
+                result["state"] = str(state).encode()[:16] if state is not None else b""
+                if landmarks is not None and len(landmarks):
+                    count = min(len(landmarks), MAX_LANDMARKS)
+                    result["landmarks"][:count] = landmarks[:count]
+                    result["n_landmarks"] = count
+                    result["bbox"] = lmk.landmarks_bbox(landmarks, w, h)
+                else:
+                    result["n_landmarks"] = 0
+                result_cond.notify_all()
+    finally:
+        del header, data, result
+        frame_shm.close()
+        result_shm.close()
@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+import hashlib, threading, time
+from collections import OrderedDict
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Landmark(NamedTuple):
+    """Normalized face landmark, duck-types the MediaPipe landmark objects."""
+    x: float
+    y: float
+    z: float
+
+
+def landmarks_to_array(landmarks: Optional[Sequence]) -> Optional[np.ndarray]:
+    """Convert landmark objects (with x, y, z attributes) to an (N, 3) float32 array."""
+    if landmarks is None:
+        return None
+    if isinstance(landmarks, np.ndarray):
+        return landmarks.astype(np.float32, copy=False)
+    return np.array([(l.x, l.y, l.z) for l in landmarks], dtype=np.float32).reshape(-1, 3)
+
+
+class FaceLandmarks(NamedTuple):
+    """
+    Landmarks of one face in one image, the face geometry shared by the
+    trackers, the crops and the morph.
+    """
+    points: np.ndarray        # (N, 3) float32, x and y normalized to the image, z like MediaPipe
+    size: Tuple[int, int]     # (width, height) of the image
+    timestamp: float          # when the image was taken, or else detected, time.monotonic()
+
+    def pixels(self) -> np.ndarray:
+        """(N, 2) float32 pixel coordinates."""
+        return self.points[:, :2] * np.array(self.size, dtype=np.float32)
+
+    def bbox(self) -> Tuple[int, int, int, int]:
+        return landmarks_bbox(self.points, *self.size)
+
+
+def face_landmarks(tracker, size: Tuple[int, int], timestamp: Optional[float] = None) -> Optional[FaceLandmarks]:
+    """
+    Latest landmarks of a tracker, given the size of the image it last saw.
+
+    Wrappers with get_face_landmarks() hand over their arrays directly, the
+    landmark objects of a bare GazeTracker are converted.
+    """
+    if hasattr(tracker, "get_face_landmarks"):
+        return tracker.get_face_landmarks()
+    points = landmarks_to_array(tracker.get_landmarks())
+    if points is None or not len(points):
+        return None
+    return FaceLandmarks(points, tuple(size), time.monotonic() if timestamp is None else timestamp)
+
+
+def image_key(image: np.ndarray) -> bytes:
+    """Digest of an image's content and shape."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((image.shape, image.dtype.str)).encode())
+    h.update(np.ascontiguousarray(image).data)
+    return h.digest()
+
+
+class LandmarkCache:
+    """
+    Landmarks by image content, so a still goes through a tracker only once
+    however many stages need its face: the upload check and the crop of the
+    child picture, a frame morphed again, ...
+
+    Hashing a still costs a few milliseconds, detection tens of them.
+    Failed detections are cached too.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Optional[FaceLandmarks]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image: np.ndarray, detect: Callable[[np.ndarray], Optional[FaceLandmarks]]) -> Optional[FaceLandmarks]:
+        """Cached landmarks of image, from detect(image) the first time."""
+        key = image_key(image)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        landmarks = detect(image)
+        with self._lock:
+            self._entries[key] = landmarks
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return landmarks
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def array_to_landmarks(landmarks: Optional[np.ndarray]) -> Optional[List[Landmark]]:
+    if landmarks is None:
+        return None
+    return [Landmark(*map(float, l)) for l in landmarks]
+
+
+def landmarks_bbox(landmarks: np.ndarray, width: int, height: int) -> Tuple[int, int, int, int]:
+    """Pixel bounding box (x_min, y_min, x_max, y_max) of normalized landmarks."""
+    xs = landmarks[:, 0] * width
+    ys = landmarks[:, 1] * height
+    return int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
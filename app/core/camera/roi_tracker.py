@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import app.config as cfg
+from . import landmarks as lmk
+
+
+class RoiGazeTracker:
+    """
+    Runs a gaze tracker on a crop around the last seen face.
+
+    The face barely moves between preview frames, so most frames only go
+    through the tracker as a crop of the last face bbox plus a margin. A
+    full-frame detection runs every `redetect_interval` frames, whenever the
+    face is lost in the crop and on the frame after it touched the crop
+    border. Landmarks are mapped back to full-frame coordinates so
+    get_landmarks() and draw_bbox() behave like the wrapped tracker.
+    """
+
+    def __init__(self, tracker, margin: float = cfg.GAZE_ROI_MARGIN,
+                 redetect_interval: int = cfg.GAZE_ROI_REDETECT_INTERVAL):
+        self.tracker = tracker
+        self.margin = margin
+        self.redetect_interval = redetect_interval
+
+        self._roi = None  # (x_min, y_min, x_max, y_max) in pixels
+        self._frame_size = None
+        self._since_detect = 0
+        self._landmarks = None
+        self._timestamp = 0.0
+
+    def get_eye_state(self, frame: np.ndarray) -> Optional[str]:
+        h, w = frame.shape[:2]
+        if self._frame_size != (w, h):
+            self._frame_size = (w, h)
+            self._roi = None
+
+        state, landmarks = None, None
+        if self._roi is not None and self._since_detect < self.redetect_interval:
+            x_min, y_min, x_max, y_max = self._roi
+            state = self.tracker.get_eye_state(frame[y_min:y_max, x_min:x_max])
+            landmarks = lmk.landmarks_to_array(self.tracker.get_landmarks())
+            if landmarks is not None:
+                landmarks = self._to_frame(landmarks, w, h)
+
+        # Face lost in the crop (or time for a periodic check): look at the whole frame
+        if landmarks is None:
+            state = self.tracker.get_eye_state(frame)
+            landmarks = lmk.landmarks_to_array(self.tracker.get_landmarks())
+            self._since_detect = 0
+        else:
+            self._since_detect += 1
+
+        self._landmarks = landmarks
+        self._timestamp = time.monotonic()
+        self._update_roi(landmarks, w, h)
+        return state
+
+    def get_landmarks(self) -> Optional[List[lmk.Landmark]]:
+        return lmk.array_to_landmarks(self._landmarks)
+
+    def get_face_landmarks(self) -> Optional[lmk.FaceLandmarks]:
+        if self._landmarks is None:
+            return None
+        return lmk.FaceLandmarks(self._landmarks, self._frame_size, self._timestamp)
+
+    def draw_bbox(self, frame: np.ndarray, state: str) -> np.ndarray:
+        if self._landmarks is None or self._frame_size is None:
+            return frame
+        x_min, y_min, x_max, y_max = lmk.landmarks_bbox(self._landmarks, *self._frame_size)
+        cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
+        if self._roi is not None:
+            cv2.rectangle(frame, self._roi[:2], self._roi[2:], (255, 128, 0), 1)
+        if state:
+            cv2.putText(frame, state, (x_min, max(0, y_min - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return frame
+
+    def _to_frame(self, landmarks: np.ndarray, w: int, h: int) -> np.ndarray:
+        """Map landmarks normalized to the crop back to the full frame."""
+        x_min, y_min, x_max, y_max = self._roi
+        crop_w, crop_h = x_max - x_min, y_max - y_min
+        mapped = landmarks.copy()
+        mapped[:, 0] = (landmarks[:, 0] * crop_w + x_min) / w
+        mapped[:, 1] = (landmarks[:, 1] * crop_h + y_min) / h
+        # Depth is normalized by the image width as well
+        mapped[:, 2] = landmarks[:, 2] * crop_w / w
+
+        # Face reaching the crop border: the crop no longer contains it all
+        x0, y0, x1, y1 = lmk.landmarks_bbox(mapped, w, h)
+        if x0 <= x_min + 1 and x_min > 0 or y0 <= y_min + 1 and y_min > 0 \
+                or x1 >= x_max - 1 and x_max < w or y1 >= y_max - 1 and y_max < h:
+            self._since_detect = self.redetect_interval
+        return mapped
+
+    def _update_roi(self, landmarks: Optional[np.ndarray], w: int, h: int) -> None:
+        if landmarks is None:
+            self._roi = None
+            return
+
+        # Square crop around the face bbox, grown by the margin on each side
+        x_min, y_min, x_max, y_max = lmk.landmarks_bbox(landmarks, w, h)
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        half = max(x_max - x_min, y_max - y_min) * (0.5 + self.margin)
+        self._roi = _clamp((int(cx - half), int(cy - half), int(cx + half), int(cy + half)), w, h)
+
+
+def _clamp(roi: Tuple[int, int, int, int], w: int, h: int) -> Optional[Tuple[int, int, int, int]]:
+    x_min, y_min, x_max, y_max = roi
+    x_min, y_min = max(0, x_min), max(0, y_min)
+    x_max, y_max = min(w, x_max), min(h, y_max)
+    if x_max - x_min < 16 or y_max - y_min < 16:
+        return None
+    return x_min, y_min, x_max, y_max
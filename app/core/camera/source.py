@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+import abc, time
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+class CameraSource(abc.ABC):
+    """
+    Frame source behind a camera stream.
+
+    Mirrors the subset of the cv2.VideoCapture interface the camera module
+    relies on, so a live device and a recorded session are interchangeable.
+    Subclasses must implement isOpened() and read().
+    """
+
+    @abc.abstractmethod
+    def isOpened(self) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        ...
+
+    def grab(self) -> bool:
+        ret, _ = self.read()
+        return ret
+
+    def get(self, prop: int) -> float:
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        return False
+
+    def release(self) -> None:
+        pass
+
+
+class V4L2Source(CameraSource):
+    """Live V4L2 device opened through OpenCV."""
+
+    def __init__(self, device: str, width: int, height: int, fourcc: str, buffer_size: Optional[int] = None):
+        self._cap = cv2.VideoCapture(device, cv2.CAP_V4L2)
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if buffer_size is not None:
+            self._cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    def isOpened(self) -> bool:
+        return self._cap.isOpened()
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        return self._cap.read(image)
+
+    def grab(self) -> bool:
+        return self._cap.grab()
+
+    def get(self, prop: int) -> float:
+        return self._cap.get(prop)
+
+    def set(self, prop: int, value: float) -> bool:
+        return self._cap.set(prop, value)
+
+    def release(self) -> None:
+        self._cap.release()
+
+
+class ReplaySource(CameraSource):
+    """
+    Recorded session played back as a camera.
+
+    Accepts a video file (anything OpenCV decodes) or a .npy stack of raw
+    frames (N x H x W [x C]), as written by bench/record_session.py. Frames
+    are paced at the recording frame rate when realtime is True, otherwise
+    delivered as fast as they are read.
+    """
+
+    def __init__(self, path: Union[str, Path], realtime: bool = True, fps: float = 30.0, loop: bool = True):
+        self.path = Path(path).expanduser().resolve()
+        if not self.path.exists():
+            raise FileNotFoundError(f"Replay file not found: {self.path}")
+
+        self.realtime = realtime
+        self.loop = loop
+        self._index = 0
+        self._start = None
+
+        if self.path.suffix == ".npy":
+            self._frames = np.load(self.path, mmap_mode="r")
+            self._video = None
+            self.fps = fps
+            self._shape = self._frames.shape[1:]
+        else:
+            self._frames = None
+            self._video = cv2.VideoCapture(str(self.path))
+            if not self._video.isOpened():
+                raise RuntimeError(f"Failed to open replay video: {self.path}")
+            self.fps = self._video.get(cv2.CAP_PROP_FPS) or fps
+            self._shape = (int(self._video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self._video.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+    def isOpened(self) -> bool:
+        return self._frames is not None or (self._video is not None and self._video.isOpened())
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self.isOpened():
+            return False, None
+
+        if self.realtime:
+            self._wait_for_frame()
+
+        if self._frames is not None:
+            if self._index >= len(self._frames):
+                if not self.loop:
+                    return False, None
+                self._rewind()
+            frame = self._frames[self._index]
+            if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+                np.copyto(image, frame)
+            else:
+                image = np.array(frame)
+        else:
+            ret, image = self._video.read(image)
+            if not ret:
+                if not self.loop:
+                    return False, None
+                self._rewind()
+                ret, image = self._video.read(image)
+                if not ret:
+                    return False, None
+
+        self._index += 1
+        return True, image
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._shape[1])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._shape[0])
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def release(self) -> None:
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+        self._frames = None
+
+    def _rewind(self) -> None:
+        self._index = 0
+        self._start = None
+        if self._video is not None:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _wait_for_frame(self) -> None:
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        delay = self._start + self._index / self.fps - now
+        if delay > 0:
+            time.sleep(delay)
@@ -6,8 +6,10 @@
 # Distributed under terms of the GPLv3 license.
 
 import mpv, time, threading
+from typing import Optional
 
 import app.config as cfg
+from app.utils import tracing
 
 player = None
 is_playing = False
@@ -43,7 +45,7 @@ def load_videos() -> None:
     player.playlist_append(str(cfg.FINAL_GENERATED_VIDEO_PATH))
     print("Videos loaded succesfully")
 
-def play() -> None:
+def play(trace: Optional[tracing.Trace] = None) -> None:
     global player, is_playing
     if player is None:
         raise RuntimeError("Display was not initialized.")
@@ -51,9 +53,16 @@ def play() -> None:
     # if is_playing:
     #     return
 
+    if trace:
+        trace.mark("play_request")
+
     def worker(player):
         player.playlist_pos = 0
         player.wait_until_playing()
+        # mpv has the first frame up, the fade-in starts from it
+        if trace:
+            trace.mark("visible")
+            trace.finish()
         _fade_transition(player, duration=1.0, direction=1, step=0.01)
     threading.Thread(target=worker, args=(player,), daemon=True).start()
     is_playing = True
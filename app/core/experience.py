@@ -5,59 +5,170 @@
 #
 # Distributed under terms of the GPLv3 license.
 
-from typing import Optional
-import cv2, os
+from pathlib import Path
+from typing import Optional, Union
+import cv2, os, shutil
 
 import app.config as cfg
+from . import jobs
 from .camera import camera
 from .display import display
 from .morph import morph
-from app.utils import video_processing
+from app.utils import metrics, video_processing
+from app.utils.artifact_cache import cache_key
+from .camera import gaze
 from .camera.gaze_tracker.gaze_tracker import GazeTracker
+from .camera.gaze_worker import GazeWorker
 
 _tracker = None
 
-def start() -> GazeTracker:
+def _ramdisk_used() -> int:
+    total = 0
+    for root, _, files in os.walk(cfg.RAMDISK_DIR):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+metrics.gauge("mirror_ramdisk_used_bytes", "Size of the files on the ramdisk.", fn=_ramdisk_used)
+metrics.gauge("mirror_ramdisk_free_bytes", "Free space left on the ramdisk.",
+              fn=lambda: shutil.disk_usage(cfg.RAMDISK_DIR).free)
+
+# Stages reported by start() when run as a job, in order
+START_STAGES = (
+    "capture", "tracker",
+    *morph.PREPROCESS_STAGES,
+    "morph", "pingpong", "load",
+)
+
+def start(job: Optional[jobs.Job] = None) -> Union[GazeTracker, GazeWorker]:
     # Check if user uploaded its child image
     if not cfg.USER_CHILD_PATH.exists():
         raise RuntimeError("User child picture was not uploaded.")
 
     # Take picture of the user
-    frame = camera.read(preview=False)
-    if frame is not None:
-        cv2.imwrite(str(cfg.USER_CAPTURE_PATH), frame)
-    else:
-        raise RuntimeError("Could not take a picture of the user.")
-
-    # Start gaze detection (new instance of GazeTracker)
+    with jobs.stage(job, "capture"):
+        frame = camera.capture_still(full_resolution=cfg.CAMERA_STILL_FULL_RESOLUTION)
+        if frame is None:
+            raise RuntimeError("Could not take a picture of the user.")
+
+    # Start gaze detection (new instance of GazeTracker, or a worker process
+    # with its own). The stills get a full-frame tracker of their own: the
+    # main loop feeds preview frames to the live one while preprocessing runs
     global _tracker
-    _tracker = GazeTracker(enable_tracking=True, model_dir=str(cfg.MODEL_DIR))
-
-    # # Prepare the three video to display (morph, ai_video, reversed_ai_video)
-    morph.preprocess(_tracker)
-    morph.generate_morph_specialized()
-
-    # Reverse generated video
-    reversed_video_path = cfg.TEMP_DIR/f"{cfg.GENERATED_VIDEO_PATH.stem}_reversed{cfg.GENERATED_VIDEO_PATH.suffix}"
-    video_processing.reverse_video(cfg.GENERATED_VIDEO_PATH, reversed_video_path)
-
-    # Concatenate generated video + reversed generated video
-    video_processing.concatenate_videos([cfg.GENERATED_VIDEO_PATH, reversed_video_path], cfg.FINAL_GENERATED_VIDEO_PATH)
-
-    # Load video for the display
-    display.load_videos()
-
-    return _tracker
+    with jobs.stage(job, "tracker"):
+        # A restart replaces the previous tracker, do not leak its worker
+        _release_tracker()
+        tracker = gaze.create_tracker(roi=False)
+        if cfg.GAZE_INFERENCE_WORKER:
+            live = GazeWorker()
+            try:
+                live.start()
+            except BaseException:
+                live.close()
+                raise
+        else:
+            live = gaze.create_tracker()
+        _tracker = live
+
+    try:
+        # # Prepare the three video to display (morph, ai_video, reversed_ai_video)
+        # The capture goes through preprocessing in memory, no JPEG round-trip
+        if not morph.preprocess(tracker, job, capture=frame):
+            raise RuntimeError("Morph preprocessing failed.")
+        with jobs.stage(job, "morph"):
+            if not morph.generate_morph(tracker):
+                raise RuntimeError("Morph generation failed.")
+
+        # Generated video followed by itself reversed, in one ffmpeg pass. It
+        # only depends on the generated video and how it is reversed, the same
+        # child picture gives the same final video
+        with jobs.stage(job, "pingpong"):
+            final_key = cache_key("final", morph.cache_keys()["video"], cfg.PINGPONG_SEGMENT_DURATION)
+            if not morph.artifacts.fetch(final_key, "final.mp4", cfg.FINAL_GENERATED_VIDEO_PATH):
+                video_processing.make_pingpong_video(cfg.GENERATED_VIDEO_PATH, cfg.FINAL_GENERATED_VIDEO_PATH,
+                                                     segment_duration=cfg.PINGPONG_SEGMENT_DURATION)
+                morph.artifacts.store(final_key, "final.mp4", cfg.FINAL_GENERATED_VIDEO_PATH)
+
+        # Load video for the display
+        with jobs.stage(job, "load"):
+            display.load_videos()
+    except BaseException:
+        if _tracker is live:
+            _release_tracker()
+        raise
+
+    return live
+
+def start_async() -> jobs.Job:
+    """
+    Run start() on the job worker and return its job right away.
+
+    Raises:
+        RuntimeError: If the child picture was not uploaded.
+        jobs.JobConflict: If an experience is already starting.
+    """
+    # Fail fast, rather than in the job, on what the client can fix
+    if not cfg.USER_CHILD_PATH.exists():
+        raise RuntimeError("User child picture was not uploaded.")
+    return jobs.submit("experience", start, START_STAGES, unique=True)
+
+def upload_child(path: Path) -> jobs.Job:
+    """
+    Install an uploaded child picture and start its preprocessing.
+
+    The picture must show a face. The child-side stages then run on the job
+    worker ahead of any start(), which only has the capture side left to do.
+
+    Raises:
+        ValueError: If the picture cannot be read or shows no face.
+        jobs.JobConflict: If an experience is already starting.
+    """
+    job = jobs.active("experience")
+    if job is not None:
+        raise jobs.JobConflict(job)
+
+    image = cv2.imread(str(path))
+    if image is None:
+        raise ValueError("Could not read the picture.")
+    # Cached, the child crop does not detect the face again
+    tracker = gaze.create_tracker(roi=False)
+    if morph.detect_landmarks(tracker, image) is None:
+        raise ValueError("No face found in the picture.")
+
+    # A previous upload still being processed is outdated
+    previous = jobs.active("child")
+    if previous is not None:
+        previous.cancel()
+    os.replace(path, cfg.USER_CHILD_PATH)
+
+    def prepare(job: jobs.Job) -> None:
+        if not morph.preprocess_child(tracker, job):
+            raise RuntimeError("Child preprocessing failed.")
+
+    return jobs.submit("child", prepare, morph.CHILD_STAGES)
+
+def _release_tracker() -> None:
+    """Take the tracker away from its readers (main loop, MJPEG stream), then close it."""
+    global _tracker
+    tracker, _tracker = _tracker, None
+    if isinstance(tracker, GazeWorker):
+        tracker.close()
 
-def get_tracker() -> Optional[GazeTracker]:
+def get_tracker() -> Optional[Union[GazeTracker, GazeWorker]]:
     global _tracker
     return _tracker;
 
 def stop() -> None:
+    # Cancel a start still in progress, it stops at the next stage
+    job = jobs.active("experience")
+    if job is not None:
+        job.cancel()
+
     # Stop gaze detection (del GazeTracker)
-    global _tracker
-    del _tracker
-    _tracker = None
+    _release_tracker()
 
     display.stop()
 
@@ -0,0 +1,205 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+import threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from app.utils import metrics
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised at a stage boundary once the job was cancelled.
+
+    Derives from BaseException so the pipeline's `except Exception` error
+    handling does not swallow it.
+    """
+
+
+class Job:
+    """
+    A long-running task split into named stages.
+
+    Stages report their status and duration as they run, every change bumps
+    the job version so observers can wait for updates. Cancellation is
+    cooperative and takes effect when the next stage starts.
+    """
+
+    def __init__(self, name: str, stages: Sequence[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.status = PENDING
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.duration = None
+        self.stages: Dict[str, Dict] = {s: {"status": PENDING, "duration": None} for s in stages}
+
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+        self._version = 0
+        self._start = None
+        self._listeners = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        if self.status == PENDING:
+            self._finish(CANCELLED)
+        else:
+            self._touch()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Run a block as the named stage, recording its status and duration."""
+        self.check_cancelled()
+        stage = self.stages.setdefault(name, {"status": PENDING, "duration": None})
+        stage["status"] = RUNNING
+        self._touch()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            stage["status"] = CANCELLED if isinstance(e, JobCancelled) else FAILED
+            raise
+        else:
+            stage["status"] = DONE
+        finally:
+            stage["duration"] = time.monotonic() - start
+            metrics.histogram("mirror_job_stage_seconds", "Duration of the job stages.",
+                              job=self.name, stage=name, status=stage["status"]).observe(stage["duration"])
+            self._touch()
+
+    def run(self, fn: Callable[["Job"], object]) -> None:
+        if self.status in FINISHED:
+            return
+        self.status = RUNNING
+        self.started = time.time()
+        self._start = time.monotonic()
+        self._touch()
+        try:
+            fn(self)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            self.error = str(e)
+            self._finish(FAILED)
+        else:
+            self._finish(DONE)
+
+    def to_dict(self) -> Dict:
+        done = sum(1 for s in self.stages.values() if s["status"] == DONE)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "progress": done / len(self.stages) if self.stages else 1.0,
+            "created": self.created,
+            "started": self.started,
+            "duration": self.duration,
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+        }
+
+    def wait_for_update(self, version: int, timeout: Optional[float] = None) -> Tuple[int, Dict]:
+        """Wait until the job changed since version, return the new version and state."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version, self.to_dict()
+
+    def add_listener(self, fn: Callable[[], None]) -> None:
+        """Call fn (from the thread making the change) after every update."""
+        with self._cond:
+            self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[], None]) -> None:
+        with self._cond:
+            self._listeners.remove(fn)
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        if self._start is not None:
+            self.duration = time.monotonic() - self._start
+        self._touch()
+
+    def _touch(self) -> None:
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for fn in listeners:
+            fn()
+
+
+def stage(job: Optional[Job], name: str):
+    """job.stage(name), or a no-op when running outside of a job."""
+    return job.stage(name) if job is not None else nullcontext()
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+_jobs: Dict[str, Job] = {}
+_jobs_lock = threading.Lock()
+_MAX_JOBS = 32
+
+
+class JobConflict(RuntimeError):
+    """Raised by submit() when a unique job with the same name is still active."""
+
+    def __init__(self, job: Job):
+        super().__init__(f"Job {job.name} is already {job.status} ({job.id}).")
+        self.job = job
+
+
+def submit(name: str, fn: Callable[[Job], object], stages: Sequence[str] = (), unique: bool = False) -> Job:
+    """
+    Queue fn(job) on the job worker and return the job right away.
+
+    Raises:
+        JobConflict: If unique is set and a job with that name is pending or running.
+    """
+    job = Job(name, stages)
+    with _jobs_lock:
+        if unique:
+            for other in _jobs.values():
+                if other.name == name and other.status not in FINISHED:
+                    raise JobConflict(other)
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs
+        for old in [j for j in _jobs.values() if j.status in FINISHED][:-_MAX_JOBS]:
+            del _jobs[old.id]
+    _executor.submit(job.run, fn)
+    return job
+
+
+def get(job_id: str) -> Optional[Job]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def active(name: str) -> Optional[Job]:
+    """Pending or running job with the given name, if any."""
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.name == name and job.status not in FINISHED:
+                return job
+    return None
@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 mailitg <mailitg@maili-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+In-process landmark-driven morph.
+
+face-movie's morph re-detects landmarks with its own model in another
+interpreter and warps triangle by triangle in Python. Here the landmarks
+the gaze tracker already gives drive a triangle mesh: it is triangulated
+once, and each frame solves all the per-triangle affine maps in one
+batched call. It then samples both images with one cv2.remap each and
+cross-dissolves them into a preallocated buffer.
+"""
+
+from typing import Iterator, Tuple
+
+import cv2
+import numpy as np
+
+
+def border_points(width: int, height: int) -> np.ndarray:
+    """Corners and edge midpoints, so the mesh covers the whole image."""
+    x, y = width - 1, height - 1
+    return np.array([
+        (0, 0), (x / 2, 0), (x, 0), (x, y / 2),
+        (x, y), (x / 2, y), (0, y), (0, y / 2),
+    ], dtype=np.float32)
+
+
+def triangulate(points: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Delaunay triangulation of pixel points.
+
+    Args:
+        points (np.ndarray): (N, 2) points, inside the image.
+        size (Tuple[int, int]): Image (width, height).
+
+    Returns:
+        np.ndarray: (T, 3) int32 indices into points.
+    """
+    width, height = size
+    subdiv = cv2.Subdiv2D((0, 0, width, height))
+    index = {}
+    for i, (x, y) in enumerate(points.astype(np.float32)):
+        # Duplicates map to the first point, the others end up in no triangle
+        if (x, y) not in index:
+            index[(x, y)] = i
+            subdiv.insert((float(x), float(y)))
+
+    triangles = []
+    for t in subdiv.getTriangleList().astype(np.float32).reshape(-1, 3, 2):
+        # Triangles touching the virtual outer vertices are not found
+        ids = [index.get((x, y)) for x, y in t]
+        if None not in ids:
+            triangles.append(ids)
+    return np.array(triangles, dtype=np.int32).reshape(-1, 3)
+
+
+class MorphEngine:
+    """
+    Morph between two same-sized images given matching landmarks.
+
+    frame() returns the same buffer every call, copy it to keep a frame.
+    """
+
+    def __init__(self, src: np.ndarray, dst: np.ndarray, src_points: np.ndarray, dst_points: np.ndarray):
+        """
+        Args:
+            src (np.ndarray): Start image (H x W x C).
+            dst (np.ndarray): End image, same shape.
+            src_points (np.ndarray): (N, 2) pixel landmarks of src.
+            dst_points (np.ndarray): (N, 2) pixel landmarks of dst, same order.
+
+        Raises:
+            ValueError: If the images or the landmarks do not match.
+        """
+        if src.shape != dst.shape:
+            raise ValueError(f"Images differ in shape: {src.shape} and {dst.shape}")
+        if src_points.shape != dst_points.shape or src_points.ndim != 2 or src_points.shape[1] != 2:
+            raise ValueError("Landmarks must be two (N, 2) arrays of the same length.")
+
+        self.src, self.dst = src, dst
+        h, w = src.shape[:2]
+        limit = np.array([w - 1, h - 1], dtype=np.float32)
+        border = border_points(w, h)
+        self.src_points = np.vstack([np.clip(src_points, 0, limit), border]).astype(np.float32)
+        self.dst_points = np.vstack([np.clip(dst_points, 0, limit), border]).astype(np.float32)
+
+        # One mesh for the whole morph, on the mean shape like face-movie
+        self.triangles = triangulate((self.src_points + self.dst_points) / 2, (w, h))
+        n = len(self.triangles)
+
+        # Right-hand side of the per-triangle solve: where each vertex of
+        # the intermediate triangle comes from, in src (x, y) and dst (x, y)
+        self._rhs = np.concatenate([self.src_points[self.triangles], self.dst_points[self.triangles]], axis=2)
+        self._verts = np.ones((n, 3, 3), dtype=np.float64)
+
+        # Buffers reused by every frame
+        self._xs, self._ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+        self._ids = np.zeros((h, w), dtype=np.int32)
+        self._tmp = np.empty((h, w), dtype=np.float32)
+        self._maps = [np.empty((h, w), dtype=np.float32) for _ in range(4)]
+        self._warped_src = np.empty_like(src)
+        self._warped_dst = np.empty_like(dst)
+        self._out = np.empty_like(src)
+
+    def _affines(self, points: np.ndarray) -> np.ndarray:
+        """(T, 3, 4) maps from intermediate (x, y, 1) to src (x, y), dst (x, y)."""
+        self._verts[:, :, :2] = points[self.triangles]
+        # Degenerate triangles cover no pixel, any invertible matrix will do
+        flat = np.abs(np.linalg.det(self._verts)) < 1e-6
+        self._verts[flat] = np.eye(3)
+        return np.linalg.solve(self._verts, self._rhs).astype(np.float32)
+
+    def _rasterize(self, points: np.ndarray) -> None:
+        """Index of the intermediate triangle each pixel falls in."""
+        corners = np.rint(points[self.triangles]).astype(np.int32)
+        for i, triangle in enumerate(corners):
+            cv2.fillConvexPoly(self._ids, triangle, i)
+
+    def frame(self, alpha: float) -> np.ndarray:
+        """
+        Render the morph at alpha, 0 being src and 1 dst.
+
+        Returns:
+            np.ndarray: The frame, overwritten by the next call.
+        """
+        points = (1 - alpha) * self.src_points + alpha * self.dst_points
+        affines = self._affines(points)
+        self._rasterize(points)
+
+        # Per-pixel coordinates in each image: a*x + b*y + c with the
+        # coefficients of the pixel's triangle, gathered from small
+        # contiguous tables
+        tables = np.ascontiguousarray(affines.transpose(2, 1, 0))
+        for (a, b, c), out in zip(tables, self._maps):
+            np.take(a, self._ids, out=out)
+            out *= self._xs
+            np.take(b, self._ids, out=self._tmp)
+            self._tmp *= self._ys
+            out += self._tmp
+            np.take(c, self._ids, out=self._tmp)
+            out += self._tmp
+
+        src_x, src_y, dst_x, dst_y = self._maps
+        cv2.remap(self.src, src_x, src_y, cv2.INTER_LINEAR, dst=self._warped_src, borderMode=cv2.BORDER_REFLECT)
+        cv2.remap(self.dst, dst_x, dst_y, cv2.INTER_LINEAR, dst=self._warped_dst, borderMode=cv2.BORDER_REFLECT)
+        cv2.addWeighted(self._warped_src, 1 - alpha, self._warped_dst, alpha, 0, dst=self._out)
+        return self._out
+
+    def frames(self, count: int) -> Iterator[np.ndarray]:
+        """Yield count frames from src to dst, both included."""
+        for i in range(count):
+            yield self.frame(i / (count - 1) if count > 1 else 1.0)
+
+
+def morph_frames(
+    src: np.ndarray,
+    dst: np.ndarray,
+    src_points: np.ndarray,
+    dst_points: np.ndarray,
+    fps: int,
+    transition_dur: float,
+    pause_dur: float,
+) -> Iterator[np.ndarray]:
+    """
+    Frames of a face-movie style morph: the transition, then dst held for the pause.
+
+    The yielded arrays are reused, copy them to keep them.
+    """
+    engine = MorphEngine(src, dst, src_points, dst_points)
+    yield from engine.frames(max(int(round(transition_dur * fps)), 1))
+    for _ in range(int(round(pause_dur * fps))):
+        yield dst
@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 mailitg <mailitg@maili-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Long-lived interpreter running the face-movie scripts.
+
+Spawning `python align.py` per call pays the interpreter startup, the numpy,
+OpenCV and dlib imports and the landmark model loading every time. The
+worker does all that once: scripts are executed in-process with runpy as
+if run from the command line, their imports stay in sys.modules and the
+dlib loaders are memoized so the models stay resident between calls.
+
+Requests and replies are JSON lines on the worker stdin/stdout, the
+scripts' own output is captured and returned with the reply.
+"""
+
+import contextlib, io, json, logging, os, runpy, subprocess, sys, threading, traceback
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Imported when the worker starts, whichever are installed
+PRELOAD_MODULES = ("numpy", "cv2", "dlib", "scipy.spatial", "skimage")
+
+
+class FaceMovieWorker:
+    """Client side: one worker process, one call at a time."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.calls = 0
+        self._proc = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        with self._lock:
+            self._start()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def run(self, script: Path, args: List[str]) -> Tuple[bool, str]:
+        """
+        Run script with args in the worker, return (success, captured output).
+
+        Raises:
+            RuntimeError: If the worker died or did not answer in time, it is
+                stopped and restarted on the next call.
+        """
+        with self._lock:
+            self._start()
+            self._next_id += 1
+            request = {"id": self._next_id, "script": str(script), "args": [str(a) for a in args]}
+            try:
+                self._proc.stdin.write(json.dumps(request) + "\n")
+                self._proc.stdin.flush()
+                line = self._readline()
+            except (OSError, ValueError) as e:
+                self._stop()
+                raise RuntimeError(f"face-movie worker failed: {e}")
+            if not line:
+                self._stop()
+                raise RuntimeError("face-movie worker exited")
+
+            reply = json.loads(line)
+            self.calls += 1
+            return reply["ok"], reply["output"]
+
+    def _readline(self) -> str:
+        if self.timeout is None:
+            return self._proc.stdout.readline()
+        # Read on a helper thread so a stuck script can be killed
+        result = []
+        reader = threading.Thread(target=lambda: result.append(self._proc.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(self.timeout)
+        if reader.is_alive():
+            self._stop()
+            raise RuntimeError(f"face-movie worker timed out after {self.timeout}s")
+        return result[0]
+
+    def _start(self) -> None:
+        if self.alive:
+            return
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", __name__],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+        )
+        logger.info(f"face-movie worker started (pid {self._proc.pid}).")
+
+    def _stop(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=2.0)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proc.kill()
+            self._proc.wait()
+        self._proc = None
+
+
+"""
+Worker side
+"""
+def _memoize_dlib() -> None:
+    """Make the dlib model loaders return the same instance for the same file."""
+    try:
+        import dlib
+    except ImportError:
+        return
+
+    cache = {}
+
+    def memoized(name, loader):
+        def load(*args):
+            key = (name,) + tuple(os.path.abspath(a) if isinstance(a, str) else a for a in args)
+            if key not in cache:
+                cache[key] = loader(*args)
+            return cache[key]
+        return load
+
+    for name in ("shape_predictor", "get_frontal_face_detector", "cnn_face_detection_model_v1",
+                 "face_recognition_model_v1"):
+        loader = getattr(dlib, name, None)
+        if loader is not None:
+            setattr(dlib, name, memoized(name, loader))
+
+
+def _run_script(script: str, args: List[str]) -> Tuple[bool, str]:
+    output = io.StringIO()
+    argv, path = sys.argv, list(sys.path)
+    sys.argv = [script] + args
+    # As with `python script.py`, the script directory comes first
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    ok = True
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except BaseException:
+        ok = False
+        output.write(traceback.format_exc())
+    finally:
+        sys.argv, sys.path[:] = argv, path
+    return ok, output.getvalue()
+
+
+def _serve() -> None:
+    # Keep the real stdout for replies, anything else written to fd 1
+    # (C extensions, child processes) goes to stderr instead
+    replies = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    _memoize_dlib()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        ok, output = _run_script(request["script"], request["args"])
+        replies.write(json.dumps({"id": request["id"], "ok": ok, "output": output}) + "\n")
+
+
+if __name__ == "__main__":
+    _serve()
@@ -8,51 +8,82 @@
 import subprocess
 import logging
 from pathlib import Path
+from typing import List, Tuple
+
+import app.config as cfg
+from app.utils import metrics
+from .face_movie_worker import FaceMovieWorker
 
 logger = logging.getLogger(__name__)
 
+_worker = None
+
+def start_worker() -> None:
+    """Start the face-movie worker ahead of the first call, so it is warm by then."""
+    global _worker
+    if not cfg.FACE_MOVIE_WORKER:
+        return
+    if _worker is None:
+        _worker = FaceMovieWorker(timeout=cfg.FACE_MOVIE_WORKER_TIMEOUT)
+    try:
+        _worker.start()
+    except OSError as e:
+        logger.warning(f"Could not start the face-movie worker: {e}")
+
+def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.close()
+        _worker = None
+
+def _run_script(script_path: Path, args: List[str]) -> Tuple[bool, str]:
+    """Run a face-movie script with args, in the worker when enabled, else in a new interpreter."""
+    if cfg.FACE_MOVIE_WORKER:
+        start_worker()
+        try:
+            return _worker.run(script_path, args)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"{e}, falling back to a subprocess.")
+
+    try:
+        subprocess.run(["python", str(script_path), *args], check=True, capture_output=True, text=True)
+        return True, ""
+    except subprocess.CalledProcessError as e:
+        return False, e.stderr
+
+
+@metrics.timed("mirror_pipeline_step_seconds", step="face_movie_align")
 def align_faces(
     images_dir: Path,
     target_path: Path,
     align_script_path: Path,
     aligned_dir: Path,
 ) -> bool:
-    try:
-        subprocess.run(
-            [
-                "python", str(align_script_path),
-                "-images", str(images_dir),
-                "-target", str(target_path),
-                "-overlay",
-                "-outdir", str(aligned_dir)
-            ],
-            check=True, capture_output=True, text=True
-        )
-        logger.info("Face alignment completed.")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Face alignment failed: {e.stderr}")
+    ok, output = _run_script(align_script_path, [
+        "-images", str(images_dir),
+        "-target", str(target_path),
+        "-overlay",
+        "-outdir", str(aligned_dir)
+    ])
+    if not ok:
+        logger.error(f"Face alignment failed: {output}")
         return False
+    logger.info("Face alignment completed.")
+    return True
 
 
+@metrics.timed("mirror_pipeline_step_seconds", step="face_movie_morph")
 def run_morph(morph_script_path: Path, morph_input_dir: Path, output_video_path: Path, transition_dur: float, pause_dur: float, fps: int) -> bool:
-    try:
-        subprocess.run(
-            [
-                "python", str(morph_script_path),
-                "-morph",
-                "-images", str(morph_input_dir),
-                "-td", str(transition_dur),
-                "-pd", str(pause_dur),
-                "-fps", str(fps),
-                "-out", str(output_video_path)
-            ],
-            check=True, capture_output=True, text=True
-        )
-        logger.info(f"Morphing video created at {output_video_path}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Morphing process failed: {e.stderr}")
+    ok, output = _run_script(morph_script_path, [
+        "-morph",
+        "-images", str(morph_input_dir),
+        "-td", str(transition_dur),
+        "-pd", str(pause_dur),
+        "-fps", str(fps),
+        "-out", str(output_video_path)
+    ])
+    if not ok:
+        logger.error(f"Morphing process failed: {output}")
         return False
-
-
+    logger.info(f"Morphing video created at {output_video_path}")
+    return True
@@ -5,93 +5,307 @@
 #
 # Distributed under terms of the GPLv3 license.
 
-import logging, cv2, shutil
-from typing import Optional
+import hashlib, logging, os, threading
+from typing import NamedTuple, Optional
+import cv2
 import numpy as np
 
 import app.config as cfg
+from app.core import jobs
 from app.core.api import runway
-from app.utils import image_processing, video_processing
+from app.utils import dag, image_processing, metrics, video_processing
+from app.utils.artifact_cache import ArtifactCache, cache_key
+from .engine import morph_frames
 from .face_movie_wrapper import align_faces, run_morph
+from ..camera import landmarks as lmk
 from ..camera.gaze_tracker.gaze_tracker import GazeTracker
 
 
 logger = logging.getLogger(__name__)
 
-def preprocess(tracker: GazeTracker) -> bool:
+# Stages reported when run as part of a job, in order
+CHILD_STAGES = ("child_crop", "child_remove_background", "generate_video")
+PREPROCESS_STAGES = ("crop", "remove_background", "align_child", "resize", "align_capture")
+
+align_input1_dir = cfg.MORPH_TMP_DIR/"align_input1"
+align_input2_dir = cfg.MORPH_TMP_DIR/"align_input2"
+align_output1_dir = cfg.MORPH_TMP_DIR/"align_output1"
+morph_input_dir = cfg.MORPH_TMP_DIR/"morph_input"
+# Only what the face-movie scripts and ffmpeg read goes to disk, losslessly
+user_capture_rembg_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CAPTURE_PATH.stem}_rembg.png"
+user_child_rembg_path = align_input1_dir/f"{cfg.USER_CHILD_PATH.stem}_rembg.png"
+extracted_frame_path = morph_input_dir/"1.png"
+user_child_crop_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CHILD_PATH.stem}_crop.png"
+
+CROP_OFFSET = 40
+MORPH_TRANSITION_DURATION = 1.0
+MORPH_PAUSE_DURATION = 0.5
+MORPH_FPS = 25
+
+# Child-side outputs by content hash of the child picture, a visitor trying
+# again with the same picture skips rembg, runway and the video processing
+artifacts = ArtifactCache(cfg.ARTIFACT_CACHE_DIR, cfg.ARTIFACT_CACHE_MAX_BYTES,
+                          cfg.ARTIFACT_CACHE_SPILL_DIR, cfg.ARTIFACT_CACHE_SPILL_MAX_BYTES)
+metrics.gauge("mirror_artifact_cache_bytes", "Size of the artifact cache on the ramdisk.", fn=lambda: artifacts.size)
+metrics.counter("mirror_artifact_cache_hits_total", "Artifacts found in the cache.", fn=lambda: artifacts.hits)
+metrics.counter("mirror_artifact_cache_misses_total", "Artifacts looked up but not cached.", fn=lambda: artifacts.misses)
+
+# Landmarks of the stills, the child picture is checked at upload, then
+# cropped, possibly once per start
+landmark_cache = lmk.LandmarkCache()
+metrics.counter("mirror_landmark_cache_hits_total", "Stills whose landmarks were already known.", fn=lambda: landmark_cache.hits)
+metrics.counter("mirror_landmark_cache_misses_total", "Stills that went through the tracker.", fn=lambda: landmark_cache.misses)
+
+# Identity of the child picture the child-side outputs were made from, and
+# the child picture without background kept for the capture side
+_child_prepared = None
+_child_rembg = None
+# Identity and content hash of the child picture last read
+_child_digest = None
+
+
+class ChildPicture(NamedTuple):
+    """One read of the child picture: later stages must not read the file again, an upload may replace it."""
+    key: tuple   # (inode, mtime_ns, size) of the file read
+    digest: str  # SHA-256 of data
+    data: bytes  # encoded picture
+
+def _make_dirs() -> None:
+    cfg.MORPH_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    for d in (align_input1_dir, align_input2_dir, align_output1_dir, morph_input_dir):
+        d.mkdir(exist_ok=True)
+
+def _stat_key(stat: os.stat_result) -> tuple:
+    # An upload replaces the file, so it gets a new inode whatever its mtime
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def _child_key() -> Optional[tuple]:
     try:
-        global morph_input_dir
-        align_input1_dir = cfg.MORPH_TMP_DIR/"align_input1"
-        align_input2_dir = cfg.MORPH_TMP_DIR/"align_input2"
-        align_output1_dir = cfg.MORPH_TMP_DIR/"align_output1"
-        morph_input_dir = cfg.MORPH_TMP_DIR/"morph_input"
-        cfg.MORPH_TMP_DIR.mkdir(parents=True, exist_ok=True)
-        align_input1_dir.mkdir(exist_ok=True)
-        align_input2_dir.mkdir(exist_ok=True)
-        align_output1_dir.mkdir(exist_ok=True)
-        morph_input_dir.mkdir(exist_ok=True)
-
-        # Crop inputs
-        user_capture_cropped_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CAPTURE_PATH.stem}_cropped{cfg.USER_CAPTURE_PATH.suffix}"
-        user_child_cropped_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CHILD_PATH.stem}_cropped{cfg.USER_CHILD_PATH.suffix}"
-
-        def landmark_fn(frame: np.ndarray) -> Optional[np.ndarray]:
+        return _stat_key(cfg.USER_CHILD_PATH.stat())
+    except OSError:
+        return None
+
+def read_child() -> ChildPicture:
+    """The current child picture, its identity and hash all from the same file."""
+    global _child_digest
+    with open(cfg.USER_CHILD_PATH, "rb") as f:
+        key = _stat_key(os.fstat(f.fileno()))
+        data = f.read()
+    # Same as artifact_cache.file_digest() of the file
+    digest = hashlib.sha256(data).hexdigest()
+    _child_digest = key, digest
+    return ChildPicture(key, digest, data)
+
+def _landmark_fn(tracker: GazeTracker):
+    # Crops may run on several threads, the tracker only on one at a time
+    lock = threading.Lock()
+    def detect(frame: np.ndarray) -> Optional[lmk.FaceLandmarks]:
+        with lock:
             tracker.get_eye_state(frame)
-            return tracker.get_landmarks()
+            return lmk.face_landmarks(tracker, frame.shape[1::-1])
+    return lambda frame: landmark_cache.get(frame, detect)
 
-        image_processing.crop_face_contour(cfg.USER_CAPTURE_PATH, user_capture_cropped_path, landmark_fn, offset=40)
-        image_processing.crop_face_contour(cfg.USER_CHILD_PATH, user_child_cropped_path, landmark_fn, offset=40)
+def detect_landmarks(tracker: GazeTracker, image: np.ndarray) -> Optional[lmk.FaceLandmarks]:
+    """Landmarks of a still, the tracker only runs on a picture it has not seen."""
+    return _landmark_fn(tracker)(image)
 
-        # Remove background
-        user_capture_rembg_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CAPTURE_PATH.stem}_rembg{cfg.USER_CAPTURE_PATH.suffix}"
-        user_child_rembg_path = cfg.MORPH_TMP_DIR/f"{cfg.USER_CHILD_PATH.stem}_rembg{cfg.USER_CHILD_PATH.suffix}"
-        image_processing.remove_background(user_capture_cropped_path, user_capture_rembg_path)
-        image_processing.remove_background(user_child_cropped_path, user_child_rembg_path)
-
-        # Align user child img to user current capture
-        shutil.copy2(user_child_rembg_path, align_input1_dir/user_child_rembg_path.name)
-        success = align_faces(
-            images_dir=align_input1_dir,
-            target_path=user_capture_rembg_path,
-            align_script_path=cfg.FACE_MOVIE_FACE_ALIGN_SCRIPT,
-            aligned_dir=align_output1_dir
-        )
-        if not success:
-            logger.error("Child-capture alignment failed.")
-            return False
+def cache_keys(child: Optional[ChildPicture] = None) -> dict:
+    """
+    Artifact cache keys of a child picture, the current one by default:
+    "crop", "rembg" and "video", each one derived from the previous and its
+    own parameters.
+    """
+    if child is not None:
+        digest = child.digest
+    elif _child_digest is not None and _child_digest[0] == _child_key():
+        digest = _child_digest[1]
+    else:
+        digest = read_child().digest
 
-        # Resize
-        logger.info("Resizing and cropping aligned capture image to match user image...")
-        capture_img = cv2.imread(str(user_capture_rembg_path))
-        child_img = cv2.imread(str(user_child_rembg_path))
+    crop = cache_key("crop", digest, CROP_OFFSET)
+    rembg = cache_key("rembg", crop, image_processing.REMBG_MODEL)
+    if runway.test_video:
+        # The video does not depend on the child then, only on the test file
+        try:
+            stat = cfg.GENERATED_VIDEO_PATH.stat()
+            source = ("test", stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            source = ("test", None)
+    else:
+        source = (runway.MODEL, runway.PROMPT_TEXT, runway.RATIO, runway.DURATION)
+    return {"crop": crop, "rembg": rembg, "video": cache_key("video", rembg, *source)}
 
-        if capture_img is None or child_img is None:
-            raise RuntimeError("Could not read pictures.")
+def _cached_child_rembg(keys: dict) -> Optional[np.ndarray]:
+    if not artifacts.fetch(keys["rembg"], "child_rembg.png", user_child_rembg_path):
+        return None
+    logger.info("Child picture without background found in the artifact cache.")
+    return image_processing.read_image(user_child_rembg_path)
 
-        capture_img = image_processing.resize_and_crop_to_match(capture_img, child_img)
-        cv2.imwrite(str(align_input2_dir/"0.jpg"), capture_img)
+def _store_child_rembg(keys: dict, child_img: np.ndarray) -> None:
+    image_processing.write_lossless(user_child_rembg_path, child_img)
+    artifacts.store(keys["rembg"], "child_rembg.png", user_child_rembg_path)
+
+def child_prepared() -> bool:
+    """Whether preprocess_child() already ran on the current child picture."""
+    return _child_prepared is not None and _child_prepared == _child_key() and _child_rembg is not None
+
+def _crop_child(landmark_fn, keys: dict, child: ChildPicture) -> np.ndarray:
+    if artifacts.fetch(keys["crop"], "child_crop.png", user_child_crop_path):
+        return image_processing.read_image(user_child_crop_path)
+    # The bytes keys were derived from, not whatever the file holds by now
+    child_img = cv2.imdecode(np.frombuffer(child.data, np.uint8), cv2.IMREAD_COLOR)
+    if child_img is None:
+        raise RuntimeError(f"Failed to decode the child picture {cfg.USER_CHILD_PATH}")
+    child_img = image_processing.crop_face_contour_array(child_img, landmark_fn, offset=CROP_OFFSET)
+    image_processing.write_lossless(user_child_crop_path, child_img)
+    artifacts.store(keys["crop"], "child_crop.png", user_child_crop_path)
+    return child_img
+
+def _generate_video(child_img: np.ndarray, keys: dict) -> None:
+    """Call runway and extract the first frame of its video, unless cached."""
+    key = keys["video"]
+    # The test video is the input itself, only its frame is cached
+    if ((runway.test_video or artifacts.fetch(key, "generated.mp4", cfg.GENERATED_VIDEO_PATH))
+            and artifacts.fetch(key, "frame.png", extracted_frame_path)):
+        logger.info("Generated video found in the artifact cache.")
+        return
+
+    if not runway.test_video:
+        url = runway.generate_video(child_img)
+        if url is None:
+            raise RuntimeError("Runway API failed to generate the video.")
+        video_processing.download_video(url, cfg.GENERATED_VIDEO_PATH)
+        artifacts.store(key, "generated.mp4", cfg.GENERATED_VIDEO_PATH)
+
+    video_processing.extract_frame(cfg.GENERATED_VIDEO_PATH, extracted_frame_path, frame_number=0)
+    artifacts.store(key, "frame.png", extracted_frame_path)
+
+def _child_done(child_img: np.ndarray, child: ChildPicture) -> None:
+    global _child_prepared, _child_rembg
+    # The picture may have been replaced by a new upload meanwhile, the
+    # results then stay in the cache under their own keys but are not current
+    if child.key != _child_key():
+        logger.info("Child picture replaced during its preprocessing, results dropped.")
+        return
+    _child_prepared = child.key
+    _child_rembg = child_img
+
+def _align(images_dir, target_path, aligned_dir, what: str) -> None:
+    success = align_faces(
+        images_dir=images_dir,
+        target_path=target_path,
+        align_script_path=cfg.FACE_MOVIE_FACE_ALIGN_SCRIPT,
+        aligned_dir=aligned_dir
+    )
+    if not success:
+        raise RuntimeError(f"{what} alignment failed.")
+
+def preprocess_child(tracker: GazeTracker, job: Optional[jobs.Job] = None) -> bool:
+    """
+    Child-side preprocessing, which does not need the user at the mirror: crop,
+    background removal, AI video generation and its first frame extraction.
+    """
+    try:
+        _make_dirs()
+        child = read_child()
+        keys = cache_keys(child)
+        child_img = _cached_child_rembg(keys)
+
+        # Crop input
+        with jobs.stage(job, "child_crop"):
+            if child_img is None:
+                crop = _crop_child(_landmark_fn(tracker), keys, child)
+
+        # Remove background
+        with jobs.stage(job, "child_remove_background"):
+            if child_img is None:
+                child_img = image_processing.remove_background_array(crop)
+                _store_child_rembg(keys, child_img)
 
         # Call runway and extract frame
-        if not runway.test_video:
-            url = runway.generate_video(child_img)
-            if url is None:
-                raise RuntimeError("Runway API failed to generate the video.")
-            video_processing.download_video(url, cfg.GENERATED_VIDEO_PATH)
-
-        extracted_frame_path = morph_input_dir/"1.jpg"
-        video_processing.extract_frame(cfg.GENERATED_VIDEO_PATH, extracted_frame_path, frame_number=0)
-
-        # Align capture to extracted frame
-        # shutil.copy2(user_capture_rembg_path, align_input2_dir/"0.jpg")
-        success = align_faces(
-            images_dir=align_input2_dir,
-            target_path=extracted_frame_path,
-            align_script_path=cfg.FACE_MOVIE_FACE_ALIGN_SCRIPT,
-            aligned_dir=morph_input_dir
-        )
-        if not success:
-            logger.error("Capture-1st runway frame alignment failed")
-            return False
+        with jobs.stage(job, "generate_video"):
+            _generate_video(child_img, keys)
+
+        _child_done(child_img, child)
+
+    except Exception as e:
+        logger.exception(f"Unexpected error during child preprocessing: {e}")
+        return False
+
+    return True
+
+def preprocess(tracker: GazeTracker, job: Optional[jobs.Job] = None, capture: Optional[np.ndarray] = None) -> bool:
+    """
+    Prepare the morph inputs from the user capture, USER_CAPTURE_PATH is read
+    if no capture image is given.
+
+    The stages form a graph run on a thread pool. The child side is usually
+    done in the background right after the upload. If it is not, both crops
+    are segmented in one rembg call and the AI video generation overlaps the
+    child alignment and the resize.
+    """
+    try:
+        _make_dirs()
+        prepared = child_prepared()
+        child_rembg = _child_rembg
+        child = None if prepared else read_child()
+        keys = None if prepared else cache_keys(child)
+        landmark_fn = _landmark_fn(tracker)
+
+        def crop():
+            image = capture if capture is not None else image_processing.read_image(cfg.USER_CAPTURE_PATH)
+            return image_processing.crop_face_contour_array(image, landmark_fn, offset=CROP_OFFSET)
+
+        def child_crop():
+            # (crop, None), or (None, picture without background) if cached
+            child_img = _cached_child_rembg(keys)
+            return (None, child_img) if child_img is not None else (_crop_child(landmark_fn, keys, child), None)
+
+        def remove_background(capture_img, child=None):
+            if child is None:
+                capture_img, child_img = image_processing.remove_background_array(capture_img), child_rembg
+            elif child[1] is not None:
+                capture_img, child_img = image_processing.remove_background_array(capture_img), child[1]
+            else:
+                child_img, capture_img = image_processing.batch_remove_background([child[0], capture_img])
+                _store_child_rembg(keys, child_img)
+            image_processing.write_lossless(user_capture_rembg_path, capture_img)
+            return capture_img, child_img
+
+        def generate_video(images):
+            _generate_video(images[1], keys)
+            _child_done(images[1], child)
+
+        def align_child(images):
+            # Align user child img to user current capture
+            _align(align_input1_dir, user_capture_rembg_path, align_output1_dir, "Child-capture")
+
+        def resize(images):
+            logger.info("Resizing and cropping aligned capture image to match user image...")
+            capture_img = image_processing.resize_and_crop_to_match(*images)
+            image_processing.write_lossless(align_input2_dir/"0.png", capture_img)
+
+        def align_capture(*_):
+            # Align capture to extracted frame
+            _align(align_input2_dir, extracted_frame_path, morph_input_dir, "Capture-1st runway frame")
+
+        graph = dag.Graph()
+        graph.add("crop", crop)
+        if prepared:
+            graph.add("remove_background", remove_background, ["crop"])
+        else:
+            graph.add("child_crop", child_crop)
+            graph.add("remove_background", remove_background, ["crop", "child_crop"])
+            graph.add("generate_video", generate_video, ["remove_background"])
+        graph.add("align_child", align_child, ["remove_background"])
+        graph.add("resize", resize, ["remove_background"])
+        graph.add("align_capture", align_capture, ["resize"] if prepared else ["resize", "generate_video"])
+
+        try:
+            graph.run(max_workers=cfg.MORPH_PREPROCESS_WORKERS, stage_context=lambda name: jobs.stage(job, name))
+        finally:
+            stages = ", ".join(f"{name} {d:.2f}s" for name, d in graph.durations.items())
+            logger.info(f"Preprocessing stages: {stages} (critical path {graph.critical_path():.2f}s)")
 
     except Exception as e:
         logger.exception(f"Unexpected error during morph preprocessing: {e}")
@@ -100,18 +314,59 @@ def preprocess(tracker: GazeTracker) -> bool:
     return True
 
 
+def generate_morph(tracker: GazeTracker) -> bool:
+    """Morph the aligned capture into the first runway frame, with the configured engine."""
+    if cfg.MORPH_ENGINE == "native":
+        return generate_morph_native(tracker)
+    return generate_morph_specialized()
+
 def generate_morph_specialized() -> bool:
-    global morph_input_dir
     try:
         return run_morph(
             cfg.FACE_MOVIE_MORPH_SCRIPT,
             morph_input_dir,
             cfg.MORPH_VIDEO_PATH,
-            1.0,
-            0.5,
-            25
+            MORPH_TRANSITION_DURATION,
+            MORPH_PAUSE_DURATION,
+            MORPH_FPS
         )
 
     except Exception as e:
         logger.exception(f"Unexpected error during morph generation: {e}")
         return False
+
+@metrics.timed("mirror_pipeline_step_seconds", step="native_morph")
+def generate_morph_native(tracker: GazeTracker) -> bool:
+    """
+    Same morph as generate_morph_specialized(), in process and driven by the
+    gaze tracker landmarks instead of face-movie's own detection.
+    """
+    try:
+        # Sorted like face-movie does: the aligned capture, then the frame
+        images = sorted(morph_input_dir.glob("*.png"))
+        if len(images) < 2:
+            raise RuntimeError(f"Expected two images to morph in {morph_input_dir}")
+        src = image_processing.read_image(images[0])
+        dst = image_processing.read_image(images[-1])
+        h, w = src.shape[:2]
+        if dst.shape[:2] != (h, w):
+            dst = cv2.resize(dst, (w, h), interpolation=cv2.INTER_AREA)
+
+        landmark_fn = _landmark_fn(tracker)
+        points = []
+        for image, path in ((src, images[0]), (dst, images[-1])):
+            landmarks = landmark_fn(image)
+            if landmarks is None:
+                raise RuntimeError(f"No face detected in {path}")
+            points.append(landmarks.pixels())
+
+        # Rendered frames go straight to the encoder, which runs alongside
+        frames = morph_frames(src, dst, *points, MORPH_FPS, MORPH_TRANSITION_DURATION, MORPH_PAUSE_DURATION)
+        encode_fps = video_processing.write_video(frames, cfg.MORPH_VIDEO_PATH, MORPH_FPS)
+
+    except Exception as e:
+        logger.exception(f"Unexpected error during native morph generation: {e}")
+        return False
+
+    logger.info(f"Morphing video created at {cfg.MORPH_VIDEO_PATH} ({encode_fps:.1f} fps)")
+    return True
@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+import time
+
+import app.config as cfg
+from app.utils import metrics
+
+IDLE = "idle"
+ACTIVE = "active"
+MAX = "max"
+
+
+class LoopScheduler:
+    """
+    Paces the main loop on the monotonic clock at a rate depending on activity.
+
+    The loop runs at the idle rate while nobody is in front of the mirror,
+    switches to the active rate as soon as a face shows up (and for a grace
+    period after it left) and to the max rate while a gaze transition is
+    being debounced. Deadlines are absolute so sleep jitter does not drift
+    the rate, and missed deadlines are counted and reported periodically.
+    """
+
+    def __init__(self, report_interval: float = 10.0):
+        self.rates = {
+            IDLE: cfg.LOOP_FPS_IDLE,
+            ACTIVE: cfg.LOOP_FPS_ACTIVE,
+            MAX: cfg.LOOP_FPS_MAX,
+        }
+        self.mode = IDLE
+        self.period = 1.0 / self.rates[IDLE]
+        self.ticks = 0
+        self.missed = 0
+
+        self._report_interval = report_interval
+        self._deadline = time.monotonic()
+        self._last_face = float("-inf")
+        self._report_start = self._deadline
+        self._report_ticks = 0
+        self._report_missed = 0
+        self._woke = self._deadline
+
+        self._tick_time = metrics.histogram("mirror_loop_tick_seconds", "Main loop work time per tick.")
+        self._ticks_total = metrics.counter("mirror_loop_ticks_total", "Main loop ticks.")
+        self._missed_total = metrics.counter("mirror_loop_missed_deadlines_total", "Main loop ticks that overran their period.")
+        self._fps = metrics.gauge("mirror_loop_fps", "Main loop rate achieved over the last report interval.")
+        self._target_fps = metrics.gauge("mirror_loop_target_fps", "Main loop rate of the current mode.")
+        self._target_fps.set(self.rates[IDLE])
+
+    def update(self, face_present: bool, transition_pending: bool = False) -> None:
+        """Pick the loop rate for the next tick."""
+        now = time.monotonic()
+        if face_present:
+            self._last_face = now
+
+        if transition_pending:
+            mode = MAX
+        elif now - self._last_face < cfg.LOOP_IDLE_GRACE:
+            mode = ACTIVE
+        else:
+            mode = IDLE
+
+        if mode != self.mode:
+            print(f"[INFO] Main loop {self.mode} -> {mode} ({self.rates[mode]} FPS)")
+            self.mode = mode
+            self.period = 1.0 / self.rates[mode]
+            self._target_fps.set(self.rates[mode])
+
+    def wait(self) -> None:
+        """Sleep until the next deadline."""
+        self._deadline += self.period
+        now = time.monotonic()
+        self._tick_time.observe(now - self._woke)
+        self._ticks_total.inc()
+        delay = self._deadline - now
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.missed += 1
+            self._missed_total.inc()
+            # Too late to catch up, restart from now instead of bursting
+            if -delay > self.period:
+                self._deadline = now
+
+        self.ticks += 1
+        self._woke = time.monotonic()
+        self._report(now)
+
+    def _report(self, now: float) -> None:
+        elapsed = now - self._report_start
+        if elapsed < self._report_interval:
+            return
+
+        ticks = self.ticks - self._report_ticks
+        missed = self.missed - self._report_missed
+        self._fps.set(ticks / elapsed)
+        if missed:
+            print(f"[WARN] Main loop missed {missed}/{ticks} deadlines in {elapsed:.0f}s "
+                  f"({ticks / elapsed:.1f} FPS achieved, {self.mode} rate {self.rates[self.mode]} FPS)")
+
+        self._report_start = now
+        self._report_ticks = self.ticks
+        self._report_missed = self.missed
@@ -7,16 +7,19 @@
 
 import signal, sys, time, queue
 
+import app.config as cfg
 from app.core import experience
+from app.utils import image_processing, tracing
 
 from .server import server
-from .core.camera import camera
+from .core.camera import camera, landmarks as lmk
+from .core.camera.gaze_worker import GazeWorker
 from .core.display import display
+from .core.morph import face_movie_wrapper
+from .core.scheduler import LoopScheduler
 
 running = True
 
-FPS = 30
-
 def handle_sigint(sig, frame):
     global running
     print("\n[INFO] Caught Ctrl+C, shutting down...")
@@ -34,6 +37,10 @@ def run():
         server.run_async()
         camera.init()
         display.init()
+        face_movie_wrapper.start_worker()
+        if cfg.REMBG_PRELOAD:
+            # ~170 MB model, loaded while the mirror idles instead of on the first experience
+            image_processing.preload_session(background=True)
 
         # Gaze detection
         is_gaze = False
@@ -41,19 +48,30 @@ def run():
         debounce_seconds = 0.5
         gaze_stable_start = 0.0
         min_stable_duration = 2.0
+        last_seq = 0
 
-        while running:
-            start = time.time()
+        scheduler = LoopScheduler()
 
+        while running:
             # Start of Main Loop
 
-            camera.capture(preview=False)
-            camera.capture(preview=True)
-
             tracker = experience.get_tracker()
             if tracker:
-                frame = camera.read(preview=True)
-                state = tracker.get_eye_state(frame)
+                # Frames are grabbed in the background, only wait for a fresh one
+                frame = camera.read_frame(preview=True, newer_than=last_seq, timeout=scheduler.period)
+                if frame is None:
+                    continue
+                last_seq = frame.seq
+                # Debounce on capture time, not on when the loop got to the frame
+                start = frame.timestamp
+                inference_start = time.monotonic()
+                if isinstance(tracker, GazeWorker):
+                    state = tracker.get_eye_state(frame.image, frame.seq, frame.timestamp)
+                else:
+                    state = tracker.get_eye_state(frame.image)
+                inference_end = time.monotonic()
+                tracing.record("frame.age", inference_start - frame.timestamp)
+                tracing.record("frame.inference", inference_end - inference_start)
                 # print(state)
                 if state in ("straight", "down"):
                     if gaze_stable_start == 0.0:
@@ -64,7 +82,13 @@ def run():
                     if not is_gaze and (start - gaze_stable_start) >= min_stable_duration:
                         is_gaze = True
                         print("Gaze started")
-                        display.play()
+                        # The stability wait is by design, keep it out of the latency spans
+                        tracing.record("gaze.debounce", start - gaze_stable_start)
+                        trace = tracing.Trace("gaze", frame.timestamp, stage="capture")
+                        trace.mark("age", inference_start)
+                        trace.mark("inference", inference_end)
+                        trace.mark("decision")
+                        display.play(trace)
                 else:
                     # reset stable timer if gaze lost or other state
                     gaze_stable_start = 0.0
@@ -76,17 +100,26 @@ def run():
                             print("Gaze ended")
                             display.stop()
 
+                # Full rate while a gaze start/end is being debounced
+                pending = (gaze_stable_start != 0.0) != is_gaze
+                scheduler.update(face_present=lmk.face_landmarks(tracker, frame.image.shape[1::-1]) is not None,
+                                 transition_pending=pending)
+            else:
+                scheduler.update(face_present=False)
+
             # End of Main Loop
 
-            elapsed = time.time() - start
-            sleep_time = max(0, 1.0 / FPS - elapsed)
-            time.sleep(sleep_time)
+            scheduler.wait()
     except Exception as e:
         print(f"[ERROR] {e}")
     finally:
         server.close()
+        tracker = experience.get_tracker()
+        if isinstance(tracker, GazeWorker):
+            tracker.close()
         camera.free()
         display.close()
+        face_movie_wrapper.stop_worker()
 
         print("[INFO] Program exited cleanly.")
         sys.exit(0)
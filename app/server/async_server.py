@@ -0,0 +1,427 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+asyncio HTTP/1.1 server, an alternative to the ThreadingHTTPServer backend.
+
+Every connection is a coroutine on a single event loop thread, so long-lived
+MJPEG and SSE streams cost a few KB each instead of a thread and its stack.
+Work that may block runs in a small bounded thread pool. The routes are the
+same as MirrorHTTPRequestHandler's.
+"""
+
+import asyncio, io, json, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPMessage, parse_headers
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import app.config as cfg
+from app.core import experience, jobs
+from app.utils import metrics, tracing
+
+from .http_handler import JOBS_PREFIX, job_body, query_float, static_files
+from .mjpeg import broadcaster
+from .upload import UPLOAD_CHUNK_SIZE, ChildUpload, UploadError
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 64 * 1024
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: HTTPMessage):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = parse_qs(url.query)
+        # Body, left on the connection for the handler to read
+        self.reader = None
+        self.remaining = 0
+
+    @classmethod
+    def parse(cls, head: bytes) -> "Request":
+        """
+        Parse a request line and headers, up to and including the blank line.
+
+        Raises:
+            ValueError: If the request line is malformed.
+        """
+        line, _, rest = head.partition(b"\r\n")
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise ValueError(f"Bad request line: {line!r}")
+        if not version.startswith("HTTP/1."):
+            raise ValueError(f"Unsupported version: {version}")
+        return cls(method, target, version, parse_headers(io.BytesIO(rest)))
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = (self.headers.get("Connection") or "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def read(self, n: int) -> bytes:
+        """Up to n bytes of the body, b"" once it was all read."""
+        if self.remaining <= 0:
+            return b""
+        data = await self.reader.read(min(n, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def query_float(self, name, default, lo, hi):
+        return query_float(self.query, name, default, lo, hi)
+
+
+class Response:
+    """Writes one response on a connection, keep_alive tells if it may be reused."""
+
+    def __init__(self, request: Request, writer: asyncio.StreamWriter):
+        self.request = request
+        self.writer = writer
+        self.keep_alive = request.keep_alive
+
+    def start(self, code: int, headers: List[Tuple[str, str]], length: Optional[int] = None) -> None:
+        # Without a length the body runs until the connection closes
+        if length is None:
+            self.keep_alive = False
+        lines = [f"HTTP/1.1 {code} {HTTPStatus(code).phrase}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 "Server: mirrormorphose-mini"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        lines.append(f"Connection: {'keep-alive' if self.keep_alive else 'close'}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def send(self, code: int, content: bytes = b"", content_type: str = "text/plain",
+                   headers: List[Tuple[str, str]] = ()) -> None:
+        self.start(code, [("Content-Type", content_type), *headers], len(content))
+        if self.request.method != "HEAD":
+            self.writer.write(content)
+        await self.writer.drain()
+
+    async def send_str(self, code: int, content: str = "") -> None:
+        await self.send(code, content.encode())
+
+    async def send_json(self, code: int, body, headers: List[Tuple[str, str]] = ()) -> None:
+        await self.send(code, json.dumps(body).encode(), "application/json", headers)
+
+
+class AsyncHTTPServer:
+    def __init__(self, host: str = "", port: int = cfg.HTTP_PORT, workers: int = cfg.HTTP_ASYNC_WORKERS):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.loop = None
+        self._server = None
+        self._stop = None
+        self._ready = threading.Event()
+
+    """
+    Lifecycle
+    """
+    def serve_forever(self) -> None:
+        asyncio.run(self._serve())
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def shutdown(self) -> None:
+        if self.loop is not None and self._stop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+
+    async def _serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        # Blocking calls go through run_in_executor(None, ...), bounded here
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="http-worker")
+        self.loop.set_default_executor(executor)
+        self._server = await asyncio.start_server(self._handle_connection, self.host or "0.0.0.0", self.port,
+                                                  limit=MAX_HEADER_SIZE, reuse_address=True)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            async with self._server:
+                await self._stop.wait()
+        finally:
+            executor.shutdown(wait=False)
+
+    """
+    Connections
+    """
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), cfg.HTTP_KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(b"HTTP/1.1 431 Request Header Fields Too Large\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                    break
+
+                try:
+                    request = Request.parse(head)
+                    request.reader = reader
+                except ValueError as e:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                    print(f"[WARN] {e}")
+                    break
+
+                response = Response(request, writer)
+                if request.headers.get("Transfer-Encoding"):
+                    # Bodies are read by Content-Length only, a chunked one would be taken for the next request
+                    response.keep_alive = False
+                    await response.send_str(411, "Chunked request bodies are not supported, send a Content-Length.")
+                    break
+                length = request.headers.get("Content-Length", "0").strip()
+                if not (length.isascii() and length.isdigit()):
+                    # Where the body ends is unknown, so is where the next request starts
+                    response.keep_alive = False
+                    await response.send_str(400, "Content-Length must be a non-negative integer.")
+                    break
+                request.remaining = int(length)
+                await self._dispatch(request, response)
+                if not response.keep_alive:
+                    break
+
+                # Skip whatever body the handler did not read to reach the next request
+                if request.remaining > MAX_BODY_SIZE:
+                    break
+                if request.remaining:
+                    await reader.readexactly(request.remaining)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"[ERROR] HTTP connection crashed: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, request: Request, response: Response) -> None:
+        if request.method in ("GET", "HEAD"):
+            routes = {
+                "/api/debug/camera/stream.mjpeg": self._handle_mjpeg_stream,
+                "/api/debug/latency": self._handle_latency,
+                "/api/metrics": self._handle_metrics,
+            }
+            handler = routes.get(request.path)
+            if handler:
+                await handler(request, response)
+            elif request.path.startswith(JOBS_PREFIX):
+                await self._handle_job(request, response, request.path[len(JOBS_PREFIX):])
+            else:
+                await self._serve_direct_file(request, response)
+        elif request.method == "POST":
+            routes = {
+                "/api/experience/start": self._handle_experience_start,
+                "/api/experience/stop": self._handle_experience_stop,
+                "/api/experience/upload": self._handle_upload,
+            }
+            handler = routes.get(request.path)
+            if handler:
+                await handler(request, response)
+            else:
+                await response.send_str(404)
+        else:
+            await response.send_str(405)
+
+    """
+    GET Handlers
+    """
+    async def _handle_mjpeg_stream(self, request: Request, response: Response) -> None:
+        try:
+            settings = {
+                "fps": request.query_float("fps", None, 1, 60),
+                "scale": request.query_float("scale", 1.0, 0.1, 1.0),
+                "quality": int(request.query_float("quality", 80, 10, 100)),
+                "adaptive": request.query.get("adaptive", ["1"])[0] != "0",
+            }
+        except ValueError as e:
+            await response.send_str(400, str(e))
+            return
+
+        response.start(200, [("Content-Type", "multipart/x-mixed-replace; boundary=frame")])
+        writer = response.writer
+        if request.method == "HEAD":
+            await writer.drain()
+            return
+
+        # The encoder thread wakes this coroutine up instead of a blocked thread
+        ready = asyncio.Event()
+        subscriber = broadcaster.subscribe(**settings, notify=lambda: self.loop.call_soon_threadsafe(ready.set))
+        try:
+            while True:
+                await ready.wait()
+                ready.clear()
+                item = subscriber.get(timeout=0)
+                if item is None:
+                    continue
+                _, jpeg = item
+                start = time.monotonic()
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                writer.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                writer.write(jpeg)
+                writer.write(b"\r\n")
+                await writer.drain()
+                subscriber.report_send(time.monotonic() - start)
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    async def _handle_latency(self, request: Request, response: Response) -> None:
+        await response.send(200, json.dumps(tracing.summary(), indent=2).encode(), "application/json")
+
+    async def _handle_metrics(self, request: Request, response: Response) -> None:
+        # Walks the ramdisk for its usage, keep it off the event loop
+        content = await self.loop.run_in_executor(None, metrics.render)
+        await response.send(200, content.encode(), metrics.CONTENT_TYPE)
+
+    async def _handle_job(self, request: Request, response: Response, path: str) -> None:
+        job_id, _, sub = path.partition("/")
+        job = jobs.get(job_id)
+        if job is None or sub not in ("", "events"):
+            await response.send_str(404)
+            return
+        if not sub:
+            await response.send_json(200, job.to_dict())
+            return
+
+        response.start(200, [("Content-Type", "text/event-stream"), ("Cache-Control", "no-cache")])
+        writer = response.writer
+        if request.method == "HEAD":
+            await writer.drain()
+            return
+        updated = asyncio.Event()
+        notify = lambda: self.loop.call_soon_threadsafe(updated.set)
+        job.add_listener(notify)
+        try:
+            while True:
+                state = job.to_dict()
+                writer.write(f"event: {state['status']}\ndata: {json.dumps(state)}\n\n".encode())
+                await writer.drain()
+                if state["status"] in jobs.FINISHED:
+                    break
+                while True:
+                    try:
+                        await asyncio.wait_for(updated.wait(), cfg.JOB_EVENTS_KEEPALIVE)
+                        break
+                    except asyncio.TimeoutError:
+                        writer.write(b": keep-alive\n\n")
+                        await writer.drain()
+                updated.clear()
+        finally:
+            job.remove_listener(notify)
+
+    async def _serve_direct_file(self, request: Request, response: Response) -> None:
+        try:
+            entry = static_files.lookup(unquote(request.path))
+        except PermissionError:
+            await response.send_str(403, "Forbidden")
+            return
+
+        if entry is None:
+            await response.send_str(404)
+            return
+
+        # A 304 carries the ETag of the representation a 200 would have sent
+        encoding = entry.negotiate(request.headers.get("Accept-Encoding"))
+        cache_headers = [
+            ("ETag", entry.etag_for(encoding)),
+            ("Last-Modified", entry.last_modified),
+            ("Cache-Control", f"max-age={cfg.STATIC_MAX_AGE}, must-revalidate"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if entry.not_modified(request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")):
+            response.start(304, cache_headers, 0)
+            await response.writer.drain()
+            return
+
+        content = entry.variants[encoding] if encoding else entry.content
+        headers = [("Content-Type", entry.mime_type)] + cache_headers
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+
+        if content is not None:
+            await response.send(200, content, entry.mime_type, headers[1:])
+            return
+
+        # Large file, let the kernel copy it to the socket
+        response.start(200, headers, entry.size)
+        await response.writer.drain()
+        if request.method != "HEAD":
+            with open(entry.path, "rb") as f:
+                await self.loop.sendfile(response.writer.transport, f)
+
+    """
+    POST Handlers
+    """
+    async def _handle_experience_start(self, request: Request, response: Response) -> None:
+        try:
+            job = experience.start_async()
+        except jobs.JobConflict as e:
+            await self._send_job(response, 409, e.job)
+        except Exception as e:
+            await response.send_str(500, f"Experience crashed : {e}")
+        else:
+            await self._send_job(response, 202, job)
+
+    async def _handle_experience_stop(self, request: Request, response: Response) -> None:
+        try:
+            await self.loop.run_in_executor(None, experience.stop)
+        except Exception as e:
+            await response.send_str(500, f"Experience crashed : {e}")
+        else:
+            await response.send_str(200, "Experience finished succesfully.")
+
+    async def _handle_upload(self, request: Request, response: Response) -> None:
+        length = request.headers.get("Content-Length")
+        try:
+            upload = ChildUpload(request.headers.get("Content-Type"), int(length) if length and length.isdigit() else None)
+            while request.remaining > 0:
+                chunk = await request.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                upload.feed(chunk)
+            path = upload.finish()
+        except UploadError as e:
+            response.keep_alive = False
+            await response.send_str(e.code, str(e))
+            return
+
+        # Face detection takes a while, keep it off the event loop
+        job = None
+        try:
+            job = await self.loop.run_in_executor(None, experience.upload_child, path)
+        except jobs.JobConflict as e:
+            await self._send_job(response, 409, e.job)
+        except ValueError as e:
+            await response.send_str(422, str(e))
+        except Exception as e:
+            await response.send_str(500, f"Upload failed : {e}")
+        else:
+            await self._send_job(response, 202, job)
+        finally:
+            if job is None:
+                # Not installed, do not leave it on the ramdisk
+                upload.abort()
+
+    """
+    Helpers
+    """
+    async def _send_job(self, response: Response, code: int, job: jobs.Job) -> None:
+        body = job_body(job)
+        await response.send_json(code, body, [("Location", body["status_url"])])
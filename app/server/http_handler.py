@@ -6,32 +6,73 @@
 # Distributed under terms of the GPLv3 license.
 
 from http.server import BaseHTTPRequestHandler
-from mimetypes import guess_type
-from urllib.parse import unquote
-import os, cv2, time
+from urllib.parse import parse_qs, unquote, urlsplit
+import json, math, time
 
-from app.core import experience
+import app.config as cfg
+from app.core import experience, jobs
+from app.utils import metrics, tracing
 
-from ..core.camera import camera
 from ..core import experience
+from .mjpeg import broadcaster
+from .static import StaticFiles
+from .upload import UPLOAD_CHUNK_SIZE, ChildUpload, UploadError
+
+JOBS_PREFIX = "/api/experience/jobs/"
+
+static_files = StaticFiles(cfg.WEB_DIR, max_cached_size=cfg.STATIC_CACHE_MAX_FILE_SIZE)
+
+def query_float(query, name, default, lo, hi):
+    """
+    Float query parameter clamped to [lo, hi], default when absent.
+
+    Raises:
+        ValueError: If the value is not a finite number.
+    """
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = float(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {values[0]}")
+    # nan passes min/max unchanged and inf is no setting either
+    if not math.isfinite(value):
+        raise ValueError(f"Invalid {name}: {values[0]}")
+    return min(max(value, lo), hi)
+
+def job_body(job):
+    """Job state plus the URLs to follow it, as returned by POST start."""
+    return dict(job.to_dict(),
+                status_url=f"{JOBS_PREFIX}{job.id}",
+                events_url=f"{JOBS_PREFIX}{job.id}/events")
 
 class MirrorHTTPRequestHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         routes = { 
-            "/api/debug/camera/stream.mjpeg": self._handle_mjpeg_stream
+            "/api/debug/camera/stream.mjpeg": self._handle_mjpeg_stream,
+            "/api/debug/latency": self._handle_latency,
+            "/api/metrics": self._handle_metrics,
         }
-        handler = routes.get(self.path)
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        handler = routes.get(url.path)
         if handler:
             handler()
+        elif url.path.startswith(JOBS_PREFIX):
+            self._handle_job(url.path[len(JOBS_PREFIX):])
         else:
-            self._serve_direct_file("web")
+            self._serve_direct_file(url.path)
 
     def do_POST(self):
         routes = {
             "/api/experience/start": lambda: self._handle_experience("start"),
             "/api/experience/stop": lambda: self._handle_experience("stop"),
+            "/api/experience/upload": self._handle_upload,
         }
-        handler = routes.get(self.path)
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        handler = routes.get(url.path)
         if handler:
             handler()
         else:
@@ -41,77 +82,215 @@ class MirrorHTTPRequestHandler(BaseHTTPRequestHandler):
     GET Handlers
     """
     def _handle_mjpeg_stream(self):
+        """
+        Query parameters: fps (max frame rate), scale (0.1-1), quality (JPEG,
+        10-100) and adaptive (0 to keep them fixed regardless of the link).
+        """
+        try:
+            settings = {
+                "fps": self._query_float("fps", None, 1, 60),
+                "scale": self._query_float("scale", 1.0, 0.1, 1.0),
+                "quality": int(self._query_float("quality", 80, 10, 100)),
+                "adaptive": self.query.get("adaptive", ["1"])[0] != "0",
+            }
+        except ValueError as e:
+            self._send_response_str(400, str(e))
+            return
+
         self.send_response(200)
         self.send_header('Content-type', 'multipart/x-mixed-replace; boundary=frame')
         self.end_headers()
 
+        # Frames are encoded once by the broadcaster, only the newest one is sent
+        subscriber = broadcaster.subscribe(**settings)
         try:
             while True:
-                frame = camera.read(preview=True)
-                if frame is None:
-                    continue
-                tracker = experience.get_tracker()
-                if tracker is not None:
-                    frame = tracker.draw_bbox(frame, "")
-                # Encode frame as JPEG
-                ret, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-                if not ret:
+                item = subscriber.get(timeout=1.0)
+                if item is None:
                     continue
+                _, jpeg = item
+                start = time.monotonic()
                 self.wfile.write(b"--frame\r\n")
                 self.wfile.write(b"Content-Type: image/jpeg\r\n")
                 self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
-                self.wfile.write(jpeg.tobytes())
+                self.wfile.write(jpeg)
                 self.wfile.write(b"\r\n")
-                time.sleep(0.01)
-        except BrokenPipeError:
+                subscriber.report_send(time.monotonic() - start)
+        except (BrokenPipeError, ConnectionResetError):
             print("Client disconnected")
+        finally:
+            broadcaster.unsubscribe(subscriber)
 
+    def _handle_latency(self):
+        """Latency percentiles (seconds) of every traced span, as JSON."""
+        self._send_response(200, json.dumps(tracing.summary(), indent=2).encode(), "application/json")
 
+    def _handle_metrics(self):
+        """Every metric in the Prometheus text format."""
+        self._send_response(200, metrics.render().encode(), metrics.CONTENT_TYPE)
 
-    def _serve_direct_file(self, base_dir):
-        request_path = unquote(self.path)
-        if request_path == "/":
-            request_path = "/index.html"
+    def _handle_job(self, path):
+        """
+        /api/experience/jobs/<id> returns the job state as JSON,
+        /api/experience/jobs/<id>/events streams it as server-sent events
+        until the job is finished.
+        """
+        job_id, _, sub = path.partition("/")
+        job = jobs.get(job_id)
+        if job is None or sub not in ("", "events"):
+            self._send_response_str(404)
+            return
+        if not sub:
+            self._send_response(200, json.dumps(job.to_dict()).encode(), "application/json")
+            return
 
-        # Normalize and strip leading slashes to avoid path traversal
-        safe_path = os.path.normpath(request_path).lstrip("/\\")
-        file_path = os.path.join(base_dir, safe_path)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            version, state = -1, None
+            while True:
+                new_version, state = job.wait_for_update(version, timeout=cfg.JOB_EVENTS_KEEPALIVE)
+                if new_version == version:
+                    # Comment line, keeps proxies and the browser from timing out
+                    self.wfile.write(b": keep-alive\n\n")
+                else:
+                    version = new_version
+                    self.wfile.write(f"event: {state['status']}\ndata: {json.dumps(state)}\n\n".encode())
+                self.wfile.flush()
+                if state["status"] in jobs.FINISHED:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
 
-        # Prevent escaping base_dir
-        if not os.path.abspath(file_path).startswith(os.path.abspath(base_dir)):
+    def _serve_direct_file(self, path):
+        try:
+            entry = static_files.lookup(unquote(path))
+        except PermissionError:
             self._send_response_str(403, "Forbidden")
             return
 
-        if not os.path.isfile(file_path):
+        if entry is None:
             self._send_response_str(404)
             return
 
-        mime_type, _ = guess_type(file_path)
-        mime_type = mime_type or "application/octet-stream"
-
+        headers_sent = False
         try:
-            with open(file_path, "rb") as f:
-                content = f.read()
-            self._send_response(200, content, mime_type)
+            # A 304 carries the ETag of the representation a 200 would have sent
+            encoding = entry.negotiate(self.headers.get("Accept-Encoding"))
+            if entry.not_modified(self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")):
+                self.send_response(304)
+                self._send_cache_headers(entry, encoding)
+                self.end_headers()
+                return
+
+            content = entry.variants[encoding] if encoding else entry.content
+
+            self.send_response(200)
+            self.send_header("Content-Type", entry.mime_type)
+            self.send_header("Content-Length", str(len(content) if content is not None else entry.size))
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self._send_cache_headers(entry, encoding)
+            self.end_headers()
+            headers_sent = True
+
+            if content is not None:
+                self.wfile.write(content)
+            else:
+                # Large file, let the kernel copy it to the socket
+                with open(entry.path, "rb") as f:
+                    self.connection.sendfile(f)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
         except Exception as e:
-            self._send_response_str(500, f"Server error: {e}")
+            if not headers_sent:
+                self._send_response_str(500, f"Server error: {e}")
+                return
+            # Too late for a status, a 500 would land in the middle of the body
+            print(f"[ERROR] Sending {path} failed: {e}")
+            self.close_connection = True
+
     """
     POST Handlers 
     """
     def _handle_experience(self, state: str):
         try:
             if state == "start":
-                experience.start()
-                self._send_response_str(200, "Experience started succesfully.")
+                # Preprocessing takes minutes, answer right away and let the
+                # client follow the job
+                try:
+                    job = experience.start_async()
+                except jobs.JobConflict as e:
+                    self._send_job(409, e.job)
+                    return
+                self._send_job(202, job)
             elif state == "stop":
                 experience.stop()
                 self._send_response_str(200, "Experience finished succesfully.")
         except Exception as e:
             self._send_response_str(500, f"Experience crashed : {e}")
 
+    def _handle_upload(self):
+        """
+        Child picture, as multipart/form-data or a raw image body. Streamed to
+        the ramdisk, checked for a face, then preprocessed in a background job.
+        """
+        length = self.headers.get("Content-Length")
+        try:
+            upload = ChildUpload(self.headers.get("Content-Type"), int(length) if length and length.isdigit() else None)
+            remaining = upload.length
+            while remaining > 0:
+                chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                upload.feed(chunk)
+                remaining -= len(chunk)
+            path = upload.finish()
+        except UploadError as e:
+            self.close_connection = True
+            self._send_response_str(e.code, str(e))
+            return
+
+        job = None
+        try:
+            job = experience.upload_child(path)
+        except jobs.JobConflict as e:
+            self._send_job(409, e.job)
+        except ValueError as e:
+            self._send_response_str(422, str(e))
+        except Exception as e:
+            self._send_response_str(500, f"Upload failed : {e}")
+        else:
+            self._send_job(202, job)
+        finally:
+            if job is None:
+                # Not installed, do not leave it on the ramdisk
+                upload.abort()
+
     """
     Helpers
     """
+    def _query_float(self, name, default, lo, hi):
+        return query_float(self.query, name, default, lo, hi)
+
+    def _send_cache_headers(self, entry, encoding=None):
+        self.send_header("ETag", entry.etag_for(encoding))
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Cache-Control", f"max-age={cfg.STATIC_MAX_AGE}, must-revalidate")
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _send_job(self, code, job):
+        body = job_body(job)
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Location", body["status_url"])
+        self.end_headers()
+        self.wfile.write(content)
+
     def _send_response_str(self, code, content=""):
         self._send_response(code, content.encode(), "text/plain")
 
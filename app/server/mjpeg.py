@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+import threading, time
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..core.camera import camera
+from ..core import experience
+from app.utils import metrics
+
+MIN_QUALITY = 30
+MIN_SCALE = 0.25
+IDLE_WAIT = 1 / 30  # seconds between polls while there is no camera
+
+_frames_dropped = metrics.counter("mirror_mjpeg_frames_dropped_total", "Frames replaced before a slow client sent them.")
+
+
+class Subscriber:
+    """
+    One MJPEG client: its stream settings and a depth-one frame slot.
+
+    The slot only ever holds the newest JPEG, a frame the client did not
+    pick up in time is dropped instead of queued. With adaptive set, the
+    measured send time lowers the JPEG quality, then the scale, when the
+    client cannot keep up, and restores them once it can again.
+
+    notify, if given, is called from the encoder thread after each offer,
+    for consumers that cannot block in get() such as an event loop.
+    """
+
+    def __init__(self, fps: Optional[float] = None, scale: float = 1.0, quality: int = 80, adaptive: bool = True,
+                 notify: Optional[Callable[[], None]] = None):
+        self.fps = fps
+        self.scale = scale
+        self.quality = quality
+        self.adaptive = adaptive
+        self.notify = notify
+
+        # Effective settings, lowered by the adaptation
+        self.current_scale = scale
+        self.current_quality = quality
+        self.sent = 0
+        self.dropped = 0
+
+        self._cond = threading.Condition()
+        self._item = None
+        self._last_offer = 0.0
+        self._interval = None
+        self._send_time = None
+        self._last_adapt = 0.0
+
+    @property
+    def variant(self) -> Tuple[float, int]:
+        return self.current_scale, self.current_quality
+
+    def wants(self, now: float) -> bool:
+        """Whether a frame is due according to the requested frame rate."""
+        return not self.fps or now - self._last_offer >= 0.9 / self.fps
+
+    def offer(self, seq: int, jpeg: bytes, now: float) -> None:
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+                _frames_dropped.inc()
+            self._item = (seq, jpeg)
+            if self._last_offer:
+                interval = now - self._last_offer
+                self._interval = interval if self._interval is None else 0.8 * self._interval + 0.2 * interval
+            self._last_offer = now
+            self._cond.notify_all()
+        if self.notify is not None:
+            self.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[int, bytes]]:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is not None, timeout):
+                return None
+            item, self._item = self._item, None
+            return item
+
+    def report_send(self, seconds: float) -> None:
+        """Feed back how long writing the last frame to the client took."""
+        self.sent += 1
+        self._send_time = seconds if self._send_time is None else 0.8 * self._send_time + 0.2 * seconds
+        if not self.adaptive or self._interval is None:
+            return
+
+        now = time.monotonic()
+        if now - self._last_adapt < 1.0:
+            return
+
+        budget = self._interval
+        if self._send_time > 0.8 * budget:
+            # Cheaper frames first, smaller frames next
+            if self.current_quality > MIN_QUALITY:
+                self.current_quality = max(MIN_QUALITY, self.current_quality - 10)
+            elif self.current_scale > MIN_SCALE:
+                self.current_scale = max(MIN_SCALE, round(self.current_scale * 0.75, 2))
+            else:
+                return
+        elif self._send_time < 0.3 * budget:
+            if self.current_scale < self.scale:
+                self.current_scale = min(self.scale, round(self.current_scale / 0.75, 2))
+            elif self.current_quality < self.quality:
+                self.current_quality = min(self.quality, self.current_quality + 10)
+            else:
+                return
+        else:
+            return
+        self._last_adapt = now
+
+
+class MjpegBroadcaster:
+    """
+    Encodes each new preview frame once and fans the JPEG out to every client.
+
+    A single encoder thread waits for frames with a new sequence number,
+    annotates them with the tracker bbox, encodes them once per distinct
+    (scale, quality) among the subscribers a frame is due for, and drops
+    the result in their slots. Slow clients never hold up the encoder or
+    the other viewers. The thread only runs while someone is subscribed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._thread = None
+        self.encoded = 0
+
+        self._encode_time = metrics.histogram("mirror_mjpeg_encode_seconds", "JPEG encode time per stream variant.")
+        metrics.gauge("mirror_mjpeg_subscribers", "Connected MJPEG clients.", fn=lambda: self.subscribers)
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self, **settings) -> Subscriber:
+        subscriber = Subscriber(**settings)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mjpeg-encoder", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.remove(subscriber)
+
+    def _run(self) -> None:
+        last_seq = 0
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        # Under the same lock as the check, a subscribe() from
+                        # now on starts a new thread
+                        self._thread = None
+                        return
+                    subscribers = list(self._subscribers)
+
+                frame = camera.read_frame(preview=True, newer_than=last_seq, timeout=0.5)
+                if frame is None:
+                    # Camera not initialised yet or freed, read_frame then returns at once
+                    time.sleep(IDLE_WAIT)
+                    continue
+                last_seq = frame.seq
+
+                try:
+                    self._broadcast(frame, subscribers)
+                except Exception as e:
+                    # One bad frame must not take the stream down
+                    print(f"[ERROR] MJPEG frame {frame.seq}: {e}")
+        finally:
+            # On an unexpected exit, so the next subscribe() restarts the thread
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _broadcast(self, frame: camera.Frame, subscribers) -> None:
+        now = time.monotonic()
+        due = [s for s in subscribers if s.wants(now)]
+        if not due:
+            return
+
+        image = frame.image
+        tracker = experience.get_tracker()
+        if tracker is not None:
+            # Camera frames are shared read-only views, annotate a copy
+            image = tracker.draw_bbox(image.copy(), "")
+
+        jpegs: Dict[Tuple[float, int], Optional[bytes]] = {}
+        for subscriber in due:
+            variant = subscriber.variant
+            if variant not in jpegs:
+                jpegs[variant] = self._encode(image, *variant)
+            if jpegs[variant] is not None:
+                try:
+                    subscriber.offer(frame.seq, jpegs[variant], now)
+                except Exception as e:
+                    # e.g. notify on an event loop already closed, the others still get the frame
+                    print(f"[WARN] MJPEG subscriber: {e}")
+
+    def _encode(self, image: np.ndarray, scale: float, quality: int) -> Optional[bytes]:
+        start = time.monotonic()
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ret:
+            return None
+        self.encoded += 1
+        self._encode_time.observe(time.monotonic() - start)
+        return jpeg.tobytes()
+
+
+broadcaster = MjpegBroadcaster()
@@ -9,21 +9,31 @@ from http.server import ThreadingHTTPServer
 import threading
 
 from .http_handler import MirrorHTTPRequestHandler
-from ..config import HTTP_PORT
+from .async_server import AsyncHTTPServer
+from ..config import HTTP_PORT, HTTP_SERVER_BACKEND
 
 httpd = None
 
-def run_async():
+def create(backend: str = HTTP_SERVER_BACKEND, port: int = HTTP_PORT):
+    """Server for the backend, both expose serve_forever() and shutdown()."""
+    if backend == "asyncio":
+        return AsyncHTTPServer(port=port)
+    if backend == "threading":
+        return ThreadingHTTPServer(('', port), MirrorHTTPRequestHandler)
+    raise ValueError(f"Unknown HTTP server backend: {backend}")
+
+def run_async(backend: str = HTTP_SERVER_BACKEND):
     global httpd
-    httpd = ThreadingHTTPServer(('', HTTP_PORT), MirrorHTTPRequestHandler)
-    print(f"[INFO] HTTP server running on port {HTTP_PORT}")
+    httpd = create(backend)
+    print(f"[INFO] HTTP server ({backend}) running on port {HTTP_PORT}")
     def worker(_httpd):
         try:
             _httpd.serve_forever()
         except Exception as e:
             print(f"[ERROR] HTTP server stopped: {e}")
         finally:
-            _httpd.server_close()
+            if hasattr(_httpd, "server_close"):
+                _httpd.server_close()
             print("[INFO] HTTP server closed.")
 
     t = threading.Thread(target=worker, args=(httpd,), daemon=True)
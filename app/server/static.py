@@ -0,0 +1,157 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+import gzip, os, threading, time
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from pathlib import Path
+from stat import S_ISREG
+from typing import Dict, Optional, Union
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 1024
+
+
+class StaticFile:
+    """A file under the static root with its validators and encoded variants."""
+
+    def __init__(self, path: str, stat: os.stat_result, max_cached_size: int):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        mime_type, _ = guess_type(path)
+        self.mime_type = mime_type or "application/octet-stream"
+        self.checked = time.monotonic()
+
+        # Small files live in memory with their compressed variants, large
+        # ones are streamed from disk with sendfile
+        self.content = None
+        self.variants: Dict[str, bytes] = {}
+        if self.size <= max_cached_size:
+            with open(path, "rb") as f:
+                self.content = f.read()
+            self._load_variants()
+
+    def _load_variants(self) -> None:
+        # Precompressed files shipped next to the asset win if up to date
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            precompressed = self.path + suffix
+            try:
+                if os.stat(precompressed).st_mtime >= self.mtime:
+                    with open(precompressed, "rb") as f:
+                        self.variants[encoding] = f.read()
+            except OSError:
+                pass
+
+        if self.size < MIN_COMPRESS_SIZE or not self.mime_type.startswith(COMPRESSIBLE_TYPES):
+            return
+        if "gzip" not in self.variants:
+            self.variants["gzip"] = gzip.compress(self.content, compresslevel=9, mtime=0)
+        if "br" not in self.variants and brotli is not None:
+            self.variants["br"] = brotli.compress(self.content)
+        # Only keep variants that are actually smaller
+        self.variants = {k: v for k, v in self.variants.items() if len(v) < self.size}
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Strong ETag of the identity content or of an encoded variant, which differ in bytes."""
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        if if_none_match:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            # Any representation of the same file revision is still fresh
+            current = {self.etag, *(self.etag_for(encoding) for encoding in self.variants)}
+            return "*" in tags or not current.isdisjoint(tags)
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= self.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Best available content encoding accepted by the client, if any."""
+        if not self.variants or not accept_encoding:
+            return None
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip().lower()] = q
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+
+class StaticFiles:
+    """
+    In-memory cache of the files under a directory.
+
+    Entries are revalidated against the file system at most every `ttl`
+    seconds, so serving a cached asset costs no syscall at all.
+    """
+
+    def __init__(self, base_dir: Union[str, Path], max_cached_size: int = 256 * 1024, ttl: float = 2.0):
+        self.base_dir = os.path.abspath(base_dir)
+        self.max_cached_size = max_cached_size
+        self.ttl = ttl
+        self._entries: Dict[str, StaticFile] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, request_path: str) -> Optional[StaticFile]:
+        """
+        File for an URL path, None if it does not exist.
+
+        Raises:
+            PermissionError: If the path escapes the base directory.
+        """
+        if request_path == "/":
+            request_path = "/index.html"
+
+        # Normalize and strip leading slashes to avoid path traversal
+        safe_path = os.path.normpath(request_path).lstrip("/\\")
+        file_path = os.path.abspath(os.path.join(self.base_dir, safe_path))
+        if not file_path.startswith(self.base_dir + os.sep):
+            raise PermissionError(request_path)
+
+        with self._lock:
+            entry = self._entries.get(file_path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked < self.ttl:
+            return entry
+
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            with self._lock:
+                self._entries.pop(file_path, None)
+            return None
+
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            entry.checked = now
+            return entry
+
+        entry = StaticFile(file_path, stat, self.max_cached_size)
+        with self._lock:
+            self._entries[file_path] = entry
+        return entry
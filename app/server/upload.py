@@ -0,0 +1,193 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+import os, tempfile
+from email.message import Message
+from pathlib import Path
+from typing import Optional
+
+import app.config as cfg
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Rejected upload, code is the HTTP status to answer with."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _parse_header(value: str):
+    """Main value and parameters of a Content-Type like header."""
+    msg = Message()
+    msg["Content-Type"] = value
+    return msg.get_content_type(), dict(msg.get_params()[1:])
+
+
+class MultipartReader:
+    """
+    Incremental multipart/form-data parser that streams one file field to disk.
+
+    Data is fed in arbitrary chunks; only the tail that could hold the start
+    of the next boundary is kept in memory, the rest of the field is written
+    out as it arrives. Other fields are skipped.
+    """
+
+    def __init__(self, boundary: str, field: str, out):
+        self.field = field
+        self.out = out
+        self.found = False
+        self.content_type = None
+
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        self._buf = b"\r\n"  # so the first boundary matches the delimiter too
+        self._state = "preamble"
+        self._writing = False
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+        while True:
+            if self._state == "preamble":
+                i = self._buf.find(self._delimiter)
+                if i < 0:
+                    self._buf = self._buf[-len(self._delimiter):]
+                    return
+                self._buf = self._buf[i + len(self._delimiter):]
+                self._state = "boundary"
+
+            elif self._state == "boundary":
+                # "--" closes the body, CRLF starts the next part
+                if len(self._buf) < 2:
+                    return
+                if self._buf.startswith(b"--"):
+                    self._state = "end"
+                    self._buf = b""
+                    return
+                if not self._buf.startswith(b"\r\n"):
+                    raise UploadError(400, "Malformed multipart boundary.")
+                self._buf = self._buf[2:]
+                self._state = "headers"
+
+            elif self._state == "headers":
+                i = self._buf.find(b"\r\n\r\n")
+                if i < 0:
+                    if len(self._buf) > 16 * 1024:
+                        raise UploadError(400, "Multipart headers too large.")
+                    return
+                self._start_part(self._buf[:i].decode("utf-8", "replace"))
+                self._buf = self._buf[i + 4:]
+                self._state = "body"
+
+            elif self._state == "body":
+                i = self._buf.find(self._delimiter)
+                if i < 0:
+                    # Keep what could be the beginning of a delimiter
+                    keep = len(self._delimiter) - 1
+                    if len(self._buf) > keep:
+                        self._write(self._buf[:-keep])
+                        self._buf = self._buf[-keep:]
+                    return
+                self._write(self._buf[:i])
+                self._writing = False
+                self._buf = self._buf[i + len(self._delimiter):]
+                self._state = "boundary"
+
+            else:
+                self._buf = b""
+                return
+
+    def close(self) -> None:
+        if self._state != "end":
+            raise UploadError(400, "Truncated multipart body.")
+        if not self.found:
+            raise UploadError(400, f"Missing '{self.field}' field.")
+
+    def _start_part(self, head: str) -> None:
+        headers = {}
+        for line in head.split("\r\n"):
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        disposition = headers.get("content-disposition", "")
+        _, params = _parse_header("x/x; " + disposition.partition(";")[2])
+        self._writing = params.get("name") == self.field and not self.found
+        if self._writing:
+            self.found = True
+            self.content_type = headers.get("content-type")
+
+    def _write(self, data: bytes) -> None:
+        if self._writing and data:
+            self.out.write(data)
+
+
+class ChildUpload:
+    """
+    Receives a child picture into the ramdisk as the request body arrives.
+
+    Accepts multipart/form-data with a `file` field, as sent by the web
+    page, or a raw image body. Feed the body with feed() and call finish()
+    for the path of the received file, a temporary file of its own to move
+    elsewhere or abort() once done with.
+
+    Raises:
+        UploadError: From any method, when the upload must be rejected.
+    """
+
+    def __init__(self, content_type: Optional[str], length: Optional[int], field: str = "file"):
+        if length is None:
+            raise UploadError(411, "Content-Length required.")
+        if length > cfg.UPLOAD_MAX_SIZE:
+            raise UploadError(413, f"Picture larger than {cfg.UPLOAD_MAX_SIZE} bytes.")
+
+        ctype, params = _parse_header(content_type or "application/octet-stream")
+        if ctype == "multipart/form-data":
+            if not params.get("boundary"):
+                raise UploadError(400, "Missing multipart boundary.")
+        elif not ctype.startswith("image/"):
+            raise UploadError(415, f"Unsupported content type: {ctype}")
+
+        self.length = length
+        self.received = 0
+        # One file per request, concurrent uploads must not write into each other
+        cfg.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=cfg.TEMP_DIR, suffix=".upload")
+        self.path = Path(path)
+        self._file = os.fdopen(fd, "wb")
+        self._multipart = MultipartReader(params["boundary"], field, self._file) if ctype == "multipart/form-data" else None
+
+    def feed(self, data: bytes) -> None:
+        self.received += len(data)
+        try:
+            if self._multipart is not None:
+                self._multipart.feed(data)
+            else:
+                self._file.write(data)
+        except BaseException:
+            self.abort()
+            raise
+
+    def finish(self) -> Path:
+        try:
+            if self.received < self.length:
+                raise UploadError(400, "Truncated body.")
+            if self._multipart is not None:
+                self._multipart.close()
+            self._file.close()
+            if self.path.stat().st_size == 0:
+                raise UploadError(400, "Empty picture.")
+        except BaseException:
+            self.abort()
+            raise
+        return self.path
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
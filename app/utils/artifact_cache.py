@@ -0,0 +1,167 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the MIT license.
+
+import hashlib, os, shutil, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+
+def cache_key(*parts) -> str:
+    """
+    Hash of the given parts, usable as an ArtifactCache key.
+
+    Args:
+        *parts: bytes, str, numbers or None; each part is length-prefixed so
+            ("ab", "c") and ("a", "bc") differ.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, (bytes, bytearray, memoryview)) else repr(part).encode()
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """
+    SHA-256 of a file's content.
+
+    Args:
+        path (Union[str, Path]): File to hash.
+
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of files, bounded in size with LRU eviction.
+
+    Each key is a directory holding the named artifacts derived from the
+    same inputs; a whole key is evicted at once, least recently used first.
+    Evicted keys move to the spill cache when there is one (e.g. on the SD
+    card behind a ramdisk cache) and come back from it on a hit. Recency
+    survives restarts through the key directories' mtime.
+    """
+
+    def __init__(self, root: Union[str, Path], max_bytes: int,
+                 spill_dir: Optional[Union[str, Path]] = None, spill_max_bytes: Optional[int] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.spill = ArtifactCache(spill_dir, spill_max_bytes or max_bytes) if spill_dir else None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._scan()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def fetch(self, key: str, name: str, dst: Union[str, Path]) -> bool:
+        """
+        Copy a cached artifact to dst.
+
+        Args:
+            key (str): Cache key.
+            name (str): Artifact file name within the key.
+            dst (Union[str, Path]): Destination path, overwritten.
+
+        Returns:
+            bool: False on a miss, dst is then left untouched.
+        """
+        with self._lock:
+            path = self._get(key, name)
+            if path is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            # Copies, not links: tools later rewrite the working files in place
+            shutil.copyfile(path, dst)
+            return True
+
+    def contains(self, key: str, name: str) -> bool:
+        with self._lock:
+            return (self.root/key/name).is_file() or (self.spill is not None and self.spill.contains(key, name))
+
+    def store(self, key: str, name: str, src: Union[str, Path]) -> None:
+        """
+        Copy src into the cache as artifact name of key, then evict to fit.
+
+        Args:
+            key (str): Cache key.
+            name (str): Artifact file name within the key.
+            src (Union[str, Path]): File to copy in.
+        """
+        with self._lock:
+            entry = self.root/key
+            entry.mkdir(parents=True, exist_ok=True)
+            tmp = entry/f".{name}.tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, entry/name)
+            self._touch(key)
+            self._evict()
+
+    def _get(self, key: str, name: str) -> Optional[Path]:
+        path = self.root/key/name
+        if path.is_file():
+            self._touch(key)
+            return path
+        if self.spill is not None:
+            spilled = self.spill._get(key, name)
+            if spilled is not None:
+                self.store(key, name, spilled)
+                return path if path.is_file() else spilled
+        return None
+
+    def _touch(self, key: str) -> None:
+        entry = self.root/key
+        size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+        self._size += size - self._entries.get(key, 0)
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        now = time.time()
+        os.utime(entry, (now, now))
+
+    def _evict(self) -> None:
+        # The most recent key stays even if alone over budget
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            entry = self.root/key
+            if self.spill is not None:
+                for f in entry.iterdir():
+                    if f.is_file() and not f.name.startswith("."):
+                        self.spill.store(key, f.name, f)
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _scan(self) -> None:
+        if not self.root.is_dir():
+            return
+        entries = []
+        for entry in self.root.iterdir():
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+            entries.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the MIT license.
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, NamedTuple, Optional, Sequence
+
+
+class Stage(NamedTuple):
+    name: str
+    fn: Callable[..., Any]
+    deps: Sequence[str]
+
+
+class Graph:
+    """
+    Small dependency graph of stages run on a thread pool.
+
+    Each stage is called with the results of its dependencies, in order, as
+    soon as they are all available, so independent branches overlap. Stages
+    are meant to release the GIL (native inference, subprocesses, network).
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> None:
+        """
+        Add a stage.
+
+        Args:
+            name (str): Unique stage name.
+            fn (Callable): Called with the dependency results as positional arguments.
+            deps (Sequence[str]): Names of previously added stages it depends on.
+
+        Raises:
+            ValueError: If the name is taken or a dependency is unknown.
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Unknown dependency of {name}: {dep}")
+        self.stages[name] = Stage(name, fn, tuple(deps))
+
+    def run(self, max_workers: int = 4,
+            stage_context: Optional[Callable[[str], ContextManager]] = None) -> Dict[str, Any]:
+        """
+        Run every stage, return their results by name.
+
+        Args:
+            max_workers (int): Stages running at the same time.
+            stage_context (Optional[Callable]): Returns a context manager each
+                stage runs in, given its name (e.g. progress reporting).
+
+        Returns:
+            Dict[str, Any]: Result of each stage.
+
+        Raises:
+            BaseException: The first exception raised by a stage, once the
+                stages already running are done. No new stage starts after it.
+        """
+        results: Dict[str, Any] = {}
+        pending = dict(self.stages)
+        running: Dict[Future, str] = {}
+        error = None
+
+        def call(stage: Stage, args: List[Any]) -> Any:
+            start = time.monotonic()
+            try:
+                with stage_context(stage.name) if stage_context else nullcontext():
+                    return stage.fn(*args)
+            finally:
+                self.durations[stage.name] = time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dag") as executor:
+            while pending or running:
+                if error is None:
+                    for name, stage in list(pending.items()):
+                        if all(dep in results for dep in stage.deps):
+                            del pending[name]
+                            args = [results[dep] for dep in stage.deps]
+                            running[executor.submit(call, stage, args)] = name
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+
+        if error is not None:
+            raise error
+        return results
+
+    def critical_path(self) -> float:
+        """Longest chain of stage durations from the last run, in seconds."""
+        finish: Dict[str, float] = {}
+        for name, stage in self.stages.items():
+            finish[name] = self.durations.get(name, 0.0) + max((finish[d] for d in stage.deps), default=0.0)
+        return max(finish.values(), default=0.0)
@@ -6,40 +6,155 @@
 # Distributed under terms of the MIT license.
 
 import cv2
+import threading
 import numpy as np
 from pathlib import Path
 from rembg import remove, new_session
-from typing import Callable, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-def crop_face_contour(
-    input_path: Union[str, Path],
-    output_path: Union[str, Path],
-    get_face_landmarks: Callable[[np.ndarray], Optional[np.ndarray]],
-    offset: int = 0
-) -> None:
+from . import metrics
+
+LOSSLESS_PARAMS = [int(cv2.IMWRITE_PNG_COMPRESSION), 1]
+
+REMBG_MODEL = "u2net_human_seg"
+# Models sharing the u2net preprocessing, which batch_remove_background() can batch
+_U2NET_MODELS = ("u2net", "u2netp", "u2net_human_seg")
+_U2NET_INPUT = ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320))
+# Largest mask difference, in levels, between a batched and a single inference
+_BATCH_MASK_TOLERANCE = 2
+
+_sessions: Dict[str, object] = {}
+_sessions_lock = threading.Lock()
+_no_batch = set()
+_batch_checked = set()
+
+def get_session(model: str = REMBG_MODEL) -> object:
     """
-    Detect the face in an image using MediaPipe and crop to the face contour.
+    Process-wide rembg session for a model, loaded on first use.
 
     Args:
-        input_path (Union[str, Path]): Path to the input image.
-        output_path (Union[str, Path]): Path to save cropped image.
-        offset (int): Number of pixels to expand the crop around the face.
+        model (str): rembg model name.
 
-    Raises:
-        FileNotFoundError: If input file does not exist.
-        RuntimeError: If face cannot be detected.
+    Returns:
+        object: The rembg session.
     """
-    input_path = Path(input_path).expanduser().resolve()
-    output_path = Path(output_path).expanduser().resolve()
+    # Held while loading so concurrent callers wait for the one load
+    with _sessions_lock:
+        session = _sessions.get(model)
+        if session is None:
+            session = _sessions[model] = new_session(model)
+        return session
+
+def preload_session(model: str = REMBG_MODEL, background: bool = False) -> Optional[threading.Thread]:
+    """
+    Load a rembg session ahead of its first use.
+
+    Args:
+        model (str): rembg model name.
+        background (bool): Load in a daemon thread instead of blocking.
+
+    Returns:
+        Optional[threading.Thread]: The loading thread when in background.
+    """
+    if not background:
+        get_session(model)
+        return None
+
+    def load():
+        try:
+            get_session(model)
+        except Exception as e:
+            print(f"[ERROR] Could not preload rembg model {model}: {e}")
+
+    thread = threading.Thread(target=load, name="rembg-preload", daemon=True)
+    thread.start()
+    return thread
 
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+def read_image(path: Union[str, Path], flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """
+    Read an image file into a NumPy array.
+
+    Args:
+        path (Union[str, Path]): Path to the image.
+        flags (int): cv2.imread flags.
+
+    Returns:
+        np.ndarray: The decoded image.
 
-    # Load image
-    image = cv2.imread(str(input_path))
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        RuntimeError: If the image cannot be decoded.
+    """
+    path = Path(path).expanduser().resolve()
+    if not path.exists():
+        raise FileNotFoundError(f"Input file not found: {path}")
+    image = cv2.imread(str(path), flags)
     if image is None:
-        raise RuntimeError(f"Failed to read image: {input_path}")
+        raise RuntimeError(f"Failed to read image: {path}")
+    return image
 
+def write_lossless(path: Union[str, Path], image: np.ndarray) -> Path:
+    """
+    Write an image for an external tool as a fast, lightly compressed PNG.
+
+    Args:
+        path (Union[str, Path]): Output path, its suffix is replaced by .png.
+        image (np.ndarray): Image to write.
+
+    Returns:
+        Path: The path written to.
+
+    Raises:
+        RuntimeError: If the image cannot be written.
+    """
+    path = Path(path).with_suffix(".png")
+    if not cv2.imwrite(str(path), image, LOSSLESS_PARAMS):
+        raise RuntimeError(f"Failed to write image: {path}")
+    return path
+
+def face_bbox(landmarks: Any, width: int, height: int, offset: int = 0) -> Tuple[int, int, int, int]:
+    """
+    Pixel bounding box of face landmarks, grown by offset and clamped to the image.
+
+    Args:
+        landmarks (Any): FaceLandmarks, (N, 2+) array of normalized points,
+            or landmark objects with x and y attributes.
+        width (int): Image width.
+        height (int): Image height.
+        offset (int): Number of pixels added on each side.
+
+    Returns:
+        Tuple[int, int, int, int]: (x_min, y_min, x_max, y_max).
+    """
+    points = getattr(landmarks, "points", landmarks)
+    if not isinstance(points, np.ndarray):
+        points = np.array([(l.x, l.y) for l in points], dtype=np.float32).reshape(-1, 2)
+    # Same as truncating every point then taking the extremes
+    lo = (points[:, :2].min(axis=0) * (width, height)).astype(int)
+    hi = (points[:, :2].max(axis=0) * (width, height)).astype(int)
+    return (max(lo[0] - offset, 0), max(lo[1] - offset, 0),
+            min(hi[0] + offset, width), min(hi[1] + offset, height))
+
+def crop_face_contour_array(
+    image: np.ndarray,
+    get_face_landmarks: Callable[[np.ndarray], Optional[Any]],
+    offset: int = 0
+) -> np.ndarray:
+    """
+    Crop an image to the bounding box of the detected face contour.
+
+    Args:
+        image (np.ndarray): Input image (H x W x C, BGR).
+        get_face_landmarks (Callable): Returns the face landmarks of an image,
+            in any form face_bbox() takes.
+        offset (int): Number of pixels to expand the crop around the face.
+
+    Returns:
+        np.ndarray: The cropped image, a view into the input.
+
+    Raises:
+        RuntimeError: If face cannot be detected.
+    """
     # # Convert to RGB for MediaPipe
     # image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
@@ -58,20 +173,36 @@ def crop_face_contour(
     if landmarks is None:
         raise RuntimeError("No face detected in the image.")
 
-    h, w, _ = image.shape
+    h, w = image.shape[:2]
 
     # Get bounding box of face contour
-    xs = [int(landmark.x * w) for landmark in landmarks]
-    ys = [int(landmark.y * h) for landmark in landmarks]
+    x_min, y_min, x_max, y_max = face_bbox(landmarks, w, h, offset)
+
+    return image[y_min:y_max, x_min:x_max]
+
+def crop_face_contour(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    get_face_landmarks: Callable[[np.ndarray], Optional[Any]],
+    offset: int = 0
+) -> None:
+    """
+    Detect the face in an image file and crop it to the face contour.
 
-    x_min = max(min(xs) - offset, 0)
-    x_max = min(max(xs) + offset, w)
-    y_min = max(min(ys) - offset, 0)
-    y_max = min(max(ys) + offset, h)
+    File-based wrapper around crop_face_contour_array().
+
+    Args:
+        input_path (Union[str, Path]): Path to the input image.
+        output_path (Union[str, Path]): Path to save cropped image.
+        offset (int): Number of pixels to expand the crop around the face.
 
-    # Crop and save
-    cropped = image[y_min:y_max, x_min:x_max]
-    cv2.imwrite(str(output_path), cropped)
+    Raises:
+        FileNotFoundError: If input file does not exist.
+        RuntimeError: If face cannot be detected.
+    """
+    image = read_image(input_path)
+    cropped = crop_face_contour_array(image, get_face_landmarks, offset)
+    cv2.imwrite(str(Path(output_path).expanduser().resolve()), cropped)
 
 def resize_and_crop_to_match(source_img: np.ndarray, target_img: np.ndarray) -> np.ndarray:
     """
@@ -167,73 +298,202 @@ def add_black_background(image_rgba: np.ndarray) -> np.ndarray:
     if image_rgba is None or image_rgba.shape[2] != 4:
         raise ValueError("Input image must be RGBA with 4 channels.")
 
-    # Split channels
-    b, g, r, a = cv2.split(image_rgba)
+    # Over black, blending is just premultiplying by alpha
+    return composite_alpha(cv2.cvtColor(image_rgba, cv2.COLOR_BGRA2BGR), cv2.extractChannel(image_rgba, 3), blur_radius=0)
 
-    # Prepare black background
-    black_bg = np.zeros_like(image_rgba[:, :, :3], dtype=np.uint8)
+def composite_alpha(
+    images: np.ndarray,
+    alphas: np.ndarray,
+    out: Optional[np.ndarray] = None,
+    blur_radius: int = 4
+) -> np.ndarray:
+    """
+    Smooth alpha masks and composite their images over black, in one go.
 
-    # Alpha blending: out = fg*alpha + bg*(1-alpha)
-    alpha_normalized = a.astype(np.float32) / 255.0
-    for c in range(3):
-        black_bg[:, :, c] = (r if c == 2 else g if c == 1 else b) * alpha_normalized + black_bg[:, :, c] * (1 - alpha_normalized)
+    Same result as refine_edges() then add_black_background(), give or take
+    one level of rounding, without the RGBA copy and the float conversion:
+    each mask is blurred, then its image is premultiplied straight into out
+    with a fixed-point cv2.multiply. A batch reuses the same two mask
+    buffers for every image.
 
-    return black_bg
+    Args:
+        images (np.ndarray): BGR image (H x W x 3) or batch of them (N x H x W x 3), uint8.
+        alphas (np.ndarray): Matching masks (H x W or N x H x W), uint8.
+        out (Optional[np.ndarray]): C-contiguous output buffer shaped like
+            images, may be images itself. Allocated if not given.
+        blur_radius (int): Gaussian blur sigma of the masks, 0 for none.
 
-def remove_background(
-    input_path: Union[str, Path],
-    output_path: Union[str, Path],
-    session: Optional[object] = None
-) -> None:
+    Returns:
+        np.ndarray: out, the images on a black background.
+
+    Raises:
+        ValueError: If shapes, dtypes or the output buffer do not match.
+    """
+    if images.dtype != np.uint8 or alphas.dtype != np.uint8:
+        raise ValueError("Images and masks must be uint8.")
+    if images.ndim not in (3, 4) or images.shape[-1] != 3 or images.shape[:-1] != alphas.shape:
+        raise ValueError(f"Masks {alphas.shape} do not match BGR images {images.shape}.")
+    if out is None:
+        out = np.empty(images.shape, dtype=np.uint8)
+    elif out.shape != images.shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+        raise ValueError("Output buffer must be a contiguous uint8 array shaped like the images.")
+
+    h, w = alphas.shape[-2:]
+    blurred = np.empty((h, w), dtype=np.uint8) if blur_radius > 0 else None
+    alpha3 = np.empty((h, w, 3), dtype=np.uint8)
+    for image, mask, result in zip(images.reshape(-1, h, w, 3), alphas.reshape(-1, h, w), out.reshape(-1, h, w, 3)):
+        if blurred is not None:
+            cv2.GaussianBlur(mask, (0, 0), sigmaX=blur_radius, sigmaY=blur_radius, dst=blurred)
+            mask = blurred
+        cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR, dst=alpha3)
+        cv2.multiply(image, alpha3, dst=result, scale=1 / 255)
+    return out
+
+def cutout_on_black(image: np.ndarray, mask: np.ndarray, blur_radius: int = 4) -> np.ndarray:
     """
-    Remove background from an image using rembg, refine edges, and apply black background.
+    Cut an image out with a rembg mask, refine the edges and put it over black.
+
+    Same as rembg's default cutout (colours scaled by the mask, the mask as
+    alpha) followed by refine_edges() and add_black_background(), give or
+    take one level of rounding. Single and batched background removal both
+    end here, so they give the same picture for the same mask.
 
     Args:
-        input_path (Union[str, Path]): Path to input image.
-        output_path (Union[str, Path]): Path to save processed image.
+        image (np.ndarray): Input image (H x W x 3, BGR), uint8.
+        mask (np.ndarray): Foreground mask (H x W), uint8.
+        blur_radius (int): Gaussian blur sigma of the alpha.
+
+    Returns:
+        np.ndarray: The cutout on a black background (H x W x 3, BGR).
+    """
+    cutout = cv2.multiply(image, cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR), scale=1 / 255)
+    return composite_alpha(cutout, mask, out=cutout, blur_radius=blur_radius)
+
+def _remove_mask(image: np.ndarray, session: object) -> np.ndarray:
+    """Foreground mask of a BGR image through rembg's public remove()."""
+    mask = remove(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), session=session, only_mask=True)
+    if mask is None:
+        raise RuntimeError("rembg returned no mask.")
+    mask = np.asarray(mask)
+    if mask.shape != image.shape[:2]:
+        raise RuntimeError(f"rembg returned a {mask.shape} mask for a {image.shape[:2]} image.")
+    return mask
+
+def _u2net_masks(session: object, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+    """
+    Masks of several BGR images from one u2net inference.
+
+    Reproduces the preprocessing and postprocessing of rembg's u2net
+    sessions (rembg pinned in requirements.txt); batch_remove_background()
+    checks the result against _remove_mask() before relying on it.
+    """
+    from PIL import Image
+    mean, std, size = _U2NET_INPUT
+    pictures = [Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in images]
+    inputs = [session.normalize(picture, mean, std, size) for picture in pictures]
+    name = next(iter(inputs[0]))
+    preds = session.inner_session.run(None, {name: np.concatenate([i[name] for i in inputs])})[0][:, 0]
+
+    masks = []
+    for picture, pred in zip(pictures, preds):
+        pred = (pred - pred.min()) / max(pred.max() - pred.min(), 1e-8)
+        mask = Image.fromarray((pred.clip(0, 1) * 255).astype(np.uint8))
+        masks.append(np.asarray(mask.resize(picture.size, Image.Resampling.LANCZOS)))
+    return masks
+
+@metrics.timed("mirror_pipeline_step_seconds", step="rembg")
+def remove_background_array(image: np.ndarray, session: Optional[object] = None) -> np.ndarray:
+    """
+    Remove the background of an image using rembg, refine edges, and apply black background.
+
+    Args:
+        image (np.ndarray): Input image (H x W x 3, BGR).
         session (Optional[object]): Optional rembg session.
 
+    Returns:
+        np.ndarray: The image on a black background (H x W x 3, BGR).
+
     Raises:
-        FileNotFoundError: If input file does not exist.
-        RuntimeError: If rembg fails or image cannot be decoded.
+        RuntimeError: If rembg fails.
         ValueError: If image format is invalid.
     """
-    input_path = Path(input_path).expanduser().resolve()
-    output_path = Path(output_path).expanduser().resolve()
+    if image is None or image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError("Input image must be BGR with 3 channels.")
 
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file does not exist: {input_path}")
+    # Shared session if not provided
+    if session is None:
+        session = get_session()
 
-    # Read input image as bytes
-    with open(input_path, "rb") as f:
-        input_bytes = f.read()
+    return cutout_on_black(image, _remove_mask(image, session))
 
-    # Create rembg session if not provided
-    if session is None:
-        session = new_session("u2net_human_seg")
+@metrics.timed("mirror_pipeline_step_seconds", step="rembg_batch")
+def batch_remove_background(images: Sequence[np.ndarray], model: str = REMBG_MODEL) -> List[np.ndarray]:
+    """
+    Remove the background of several images in a single inference call.
 
-    # Remove background
-    output_bytes = remove(input_bytes, session=session)
+    Only u2net models are batched, and only if their ONNX graph accepts a
+    batch dimension; otherwise every image goes through
+    remove_background_array() in turn. The first batch of each model is
+    checked against remove_background_array(), results are cached under the
+    same keys, and a model that does not match is not batched again.
 
-    # Convert bytes to RGBA NumPy array
-    arr = np.frombuffer(output_bytes, dtype=np.uint8)
-    image = cv2.imdecode(arr, cv2.IMREAD_UNCHANGED)  # Keep alpha if exists
-    if image is None:
-        raise RuntimeError("Failed to decode image from rembg output.")
+    Args:
+        images (Sequence[np.ndarray]): Input images (H x W x 3, BGR), sizes may differ.
+        model (str): rembg model name.
 
-    # Ensure RGBA
-    if image.ndim == 2:
-        # Grayscale -> BGRA
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
-    elif image.shape[2] == 3:
-        # BGR -> BGRA
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    Returns:
+        List[np.ndarray]: The images on a black background (H x W x 3, BGR).
 
-    # Refine edges
-    refined = refine_edges(image)
+    Raises:
+        RuntimeError: If rembg fails.
+        ValueError: If an image format is invalid.
+    """
+    for image in images:
+        if image is None or image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError("Input images must be BGR with 3 channels.")
+
+    session = get_session(model)
+    if (len(images) < 2 or model not in _U2NET_MODELS or model in _no_batch
+            or getattr(session, "inner_session", None) is None):
+        return [remove_background_array(image, session) for image in images]
+
+    try:
+        masks = _u2net_masks(session, images)
+    except Exception:
+        # Fixed batch size of 1 in this model export
+        _no_batch.add(model)
+        return [remove_background_array(image, session) for image in images]
+
+    if model not in _batch_checked:
+        single = _remove_mask(images[0], session)
+        if np.abs(single.astype(np.int16) - masks[0]).max() > _BATCH_MASK_TOLERANCE:
+            print(f"[WARN] Batched rembg masks differ from rembg's own for {model}, not batching it anymore.")
+            _no_batch.add(model)
+            return [cutout_on_black(images[0], single)] + [remove_background_array(image, session) for image in images[1:]]
+        _batch_checked.add(model)
+
+    return [cutout_on_black(image, mask) for image, mask in zip(images, masks)]
 
-    # Apply black background
-    final_image = add_black_background(refined)
+def remove_background(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    session: Optional[object] = None
+) -> None:
+    """
+    Remove background from an image file, refine edges, and apply black background.
 
-    # Save result as PNG
-    cv2.imwrite(str(output_path), final_image)
+    File-based wrapper around remove_background_array().
+
+    Args:
+        input_path (Union[str, Path]): Path to input image.
+        output_path (Union[str, Path]): Path to save processed image.
+        session (Optional[object]): Optional rembg session.
+
+    Raises:
+        FileNotFoundError: If input file does not exist.
+        RuntimeError: If rembg fails or image cannot be decoded.
+        ValueError: If image format is invalid.
+    """
+    image = read_image(input_path)
+    final_image = remove_background_array(image, session)
+    cv2.imwrite(str(Path(output_path).expanduser().resolve()), final_image)
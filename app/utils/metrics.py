@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the MIT license.
+
+import functools, math, threading, time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """Monotonically increasing value, or read from fn at scrape time (a running total kept elsewhere)."""
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.fn = fn
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def get(self) -> float:
+        return self.fn() if self.fn is not None else self.value
+
+
+class Gauge:
+    """Value that goes up and down, or is read from fn at scrape time."""
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        return self.fn() if self.fn is not None else self.value
+
+
+# Fixed-bucket histograms are the latency ones from tracing
+Histogram = tracing.Histogram
+
+_TYPES = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}
+
+
+class _Family:
+    def __init__(self, name: str, kind: type, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.children: Dict[Tuple[Tuple[str, str], ...], object] = {}
+
+
+_families: Dict[str, _Family] = {}
+_lock = threading.Lock()
+
+
+def _get(kind: type, name: str, help: str, labels: Dict[str, str], factory: Callable[[], object]):
+    key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+    with _lock:
+        family = _families.get(name)
+        if family is None:
+            family = _families[name] = _Family(name, kind, help)
+        elif family.kind is not kind:
+            raise ValueError(f"Metric {name} is a {_TYPES[family.kind]}")
+        elif help and not family.help:
+            family.help = help
+        metric = family.children.get(key)
+        if metric is None:
+            metric = family.children[key] = factory()
+        return metric
+
+
+def counter(name: str, help: str = "", fn: Optional[Callable[[], float]] = None, **labels) -> Counter:
+    """
+    Counter registered under name and labels, created on first use.
+
+    Look metrics up once and keep them: updating one is a lock and an add,
+    cheap enough for every frame, the registry lookup is not free.
+    """
+    c = _get(Counter, name, help, labels, lambda: Counter(fn))
+    if fn is not None:
+        c.fn = fn
+    return c
+
+
+def gauge(name: str, help: str = "", fn: Optional[Callable[[], float]] = None, **labels) -> Gauge:
+    g = _get(Gauge, name, help, labels, lambda: Gauge(fn))
+    if fn is not None:
+        g.fn = fn
+    return g
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = tracing.LATENCY_BUCKETS, **labels) -> Histogram:
+    return _get(Histogram, name, help, labels, lambda: Histogram(buckets))
+
+
+def timed(name: str, help: str = "", **labels):
+    """Decorator recording the duration of every call into a histogram, in seconds."""
+    def decorator(fn):
+        hist = histogram(name, help, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.monotonic() - start)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _render_histogram(lines: List[str], name: str, labels: Tuple[Tuple[str, str], ...], hist: Histogram) -> None:
+    for bound, count in hist.cumulative():
+        le = labels + (("le", _format_value(bound)),)
+        lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(hist.sum)}")
+    lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+
+
+def render() -> str:
+    """Every metric, plus the tracing spans, in the Prometheus text format."""
+    with _lock:
+        families = [(f, list(f.children.items())) for f in sorted(_families.values(), key=lambda f: f.name)]
+
+    lines = []
+    for family, children in families:
+        if family.help:
+            lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {_TYPES[family.kind]}")
+        for labels, metric in children:
+            if family.kind is Histogram:
+                _render_histogram(lines, family.name, labels, metric)
+                continue
+            try:
+                value = metric.get()
+            except Exception:
+                continue
+            lines.append(f"{family.name}{_format_labels(labels)} {_format_value(value)}")
+
+    # Spans traced across threads (frame age, inference, gaze onset to visible...)
+    spans = tracing.histograms()
+    if spans:
+        lines.append("# HELP mirror_span_seconds Traced latency spans.")
+        lines.append("# TYPE mirror_span_seconds histogram")
+        for span, hist in spans.items():
+            _render_histogram(lines, "mirror_span_seconds", (("span", span),), hist)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the MIT license.
+
+import bisect, threading, time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 1 ms to ~1 min, 50% apart
+LATENCY_BUCKETS = tuple(0.001 * 1.5 ** i for i in range(28))
+
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram.
+
+    Percentiles are interpolated linearly inside the bucket they fall in,
+    so their precision is bounded by the bucket width.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Value below which a fraction q (0-1) of the observations fall."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self._counts):
+                if n and seen + n >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else self.min
+                    upper = self.buckets[i] if i < len(self.buckets) else self.max
+                    lower, upper = max(lower, self.min), min(upper, self.max)
+                    return lower + (upper - lower) * (rank - seen) / n
+                seen += n
+            return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, count of observations <= bound) per bucket, +Inf last."""
+        with self._lock:
+            counts = list(self._counts)
+        total, out = 0, []
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(name: str) -> Histogram:
+    """Latency histogram registered under name, created on first use."""
+    with _histograms_lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        return hist
+
+
+def record(name: str, seconds: float) -> None:
+    histogram(name).observe(seconds)
+
+
+def histograms() -> Dict[str, Histogram]:
+    """Every span histogram, by name."""
+    with _histograms_lock:
+        return dict(sorted(_histograms.items()))
+
+
+def summary() -> Dict[str, Dict[str, Optional[float]]]:
+    """Percentiles of every span recorded so far, in seconds."""
+    return {name: hist.summary() for name, hist in histograms().items()}
+
+
+class Trace:
+    """
+    Timeline of one event across threads, as monotonic timestamps.
+
+    Each mark closes the span that started at the previous one; finish()
+    records every span as `<name>.<stage>` plus `<name>.total` into the
+    latency histograms.
+    """
+
+    def __init__(self, name: str, start: Optional[float] = None, stage: str = "start"):
+        self.name = name
+        self.marks: List[Tuple[str, float]] = [(stage, time.monotonic() if start is None else start)]
+        self._finished = False
+
+    def mark(self, stage: str, timestamp: Optional[float] = None) -> None:
+        self.marks.append((stage, time.monotonic() if timestamp is None else timestamp))
+
+    def spans(self) -> List[Tuple[str, float]]:
+        return [(stage, t - prev) for (_, prev), (stage, t) in zip(self.marks, self.marks[1:])]
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        for stage, duration in self.spans():
+            record(f"{self.name}.{stage}", duration)
+        record(f"{self.name}.total", self.marks[-1][1] - self.marks[0][1])
@@ -6,11 +6,19 @@
 # Distributed under terms of the MIT license.
 
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterable, List, Optional, Tuple, Union
 import ffmpeg
+import numpy as np
+import queue
 import shutil
+import threading
+import time
 import requests
 
+from . import metrics
+
+_encode_fps = metrics.gauge("mirror_video_encode_fps", "Frames per second of the last streamed video encode.")
+
 def resize_video(
     input_path: Union[str, Path],
     output_path: Union[str, Path],
@@ -66,6 +74,7 @@ def resize_video(
     if input_path == output_path:
         shutil.move(str(tmp_output), str(output_path))
 
+@metrics.timed("mirror_pipeline_step_seconds", "Duration of the ffmpeg, rembg and face-movie pipeline steps.", step="ffmpeg_reverse")
 def reverse_video(input: Union[str, Path], output: Optional[Union[str, Path]] = None) -> None:
     """
     Reverse a video using ffmpeg-python.
@@ -105,6 +114,7 @@ def reverse_video(input: Union[str, Path], output: Optional[Union[str, Path]] =
     if overwrite_input:
         shutil.move(str(output), str(input))
 
+@metrics.timed("mirror_pipeline_step_seconds", step="ffmpeg_concat")
 def concatenate_videos(inputs: List[Union[str, Path]],
                        output: Union[str, Path]) -> None:
     """
@@ -157,6 +167,7 @@ from typing import Union, Optional
 import ffmpeg
 
 
+@metrics.timed("mirror_pipeline_step_seconds", step="ffmpeg_extract_frame")
 def extract_frame(video: Union[str, Path],
                   output: Union[str, Path],
                   frame_number: Optional[int] = None,
@@ -207,6 +218,131 @@ def extract_frame(video: Union[str, Path],
     except ffmpeg.Error as e:
         raise RuntimeError(f"ffmpeg failed: {e.stderr.decode()}") from e
 
+def _probe_seconds(value) -> Optional[float]:
+    """An ffprobe time field in seconds, None when missing or N/A."""
+    if value in (None, 'N/A'):
+        return None
+    return float(value)
+
+def keyframe_times(video: Union[str, Path]) -> Tuple[List[float], Optional[float]]:
+    """
+    Keyframe timestamps of a video, only the keyframes are decoded.
+
+    Args:
+        video (Union[str, Path]): Input video file.
+
+    Returns:
+        Tuple[List[float], Optional[float]]: Sorted keyframe times and the
+            video duration in seconds, from the container or else the
+            stream, None when neither knows it (e.g. raw H.264).
+
+    Raises:
+        RuntimeError: If ffprobe fails.
+    """
+    try:
+        probe = ffmpeg.probe(str(video), select_streams='v:0', skip_frame='nokey',
+                             show_entries='frame=pts_time,pkt_pts_time')
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"ffprobe failed: {e.stderr.decode()}") from e
+
+    times = []
+    for frame in probe.get('frames', []):
+        t = _probe_seconds(frame.get('pts_time'))
+        if t is None:
+            t = _probe_seconds(frame.get('pkt_pts_time'))
+        if t is not None:
+            times.append(t)
+    duration = _probe_seconds(probe.get('format', {}).get('duration'))
+    if duration is None and probe.get('streams'):
+        duration = _probe_seconds(probe['streams'][0].get('duration'))
+    return sorted(times), duration
+
+def keyframe_chunks(keyframes: Iterable[float],
+                    duration: Optional[float],
+                    segment_duration: float) -> List[Tuple[float, Optional[float]]]:
+    """
+    Split a video into chunks that start on keyframes.
+
+    Args:
+        keyframes (Iterable[float]): Sorted keyframe times in seconds.
+        duration (Optional[float]): Video duration, None if unknown.
+        segment_duration (float): Minimum chunk length in seconds, 0 for
+            one chunk per GOP.
+
+    Returns:
+        List[Tuple[float, Optional[float]]]: (start, end) of each chunk in
+            order, the last end being None when the duration is unknown.
+    """
+    bounds = [0.0]
+    for t in keyframes:
+        if t - bounds[-1] >= max(segment_duration, 1e-3):
+            bounds.append(t)
+    # Unknown duration: the last chunk runs to the end of the input
+    bounds.append(duration)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end is None or end > start]
+
+@metrics.timed("mirror_pipeline_step_seconds", step="ffmpeg_pingpong")
+def make_pingpong_video(input: Union[str, Path],
+                        output: Union[str, Path],
+                        segment_duration: Optional[float] = None) -> None:
+    """
+    Write the video followed by itself reversed, decoding and encoding once.
+
+    Same result as reverse_video() then concatenate_videos() on the input
+    and its reversed copy, in a single filter graph (split, reverse,
+    concat). The reverse filter holds every decoded frame in memory; with
+    segment_duration the reversed half is instead built from chunks that
+    start on keyframes and last at least that long, each reversed on its
+    own and played last to first, so at most one chunk is held at a time.
+
+    Args:
+        input (Union[str, Path]): Input video.
+        output (Union[str, Path]): Output video, may be the input.
+        segment_duration (Optional[float]): Minimum chunk length in seconds
+            for the reversed half, 0 for one chunk per GOP, None to reverse
+            the whole clip at once.
+
+    Raises:
+        FileNotFoundError: If the input file does not exist.
+        RuntimeError: If ffmpeg fails.
+    """
+    input = Path(input).expanduser().resolve()
+    output = Path(output).expanduser().resolve()
+
+    if not input.exists():
+        raise FileNotFoundError(f"Input file not found: {input}")
+
+    overwrite_input = output == input
+    tmp_output = output.with_name(f"{output.stem}_tmp{output.suffix}") if overwrite_input else output
+
+    source = ffmpeg.input(str(input)).video
+    if segment_duration is None:
+        split = source.split()
+        parts = [split[0], split[1].filter('reverse')]
+    else:
+        # Input seeking to a keyframe is cheap and frame accurate
+        parts = [source]
+        for start, end in reversed(keyframe_chunks(*keyframe_times(input), segment_duration)):
+            # No seek from the start: raw streams without timestamps cannot seek
+            kwargs = {'ss': start} if start > 0 else {}
+            if end is not None:
+                kwargs['t'] = end - start
+            parts.append(ffmpeg.input(str(input), **kwargs).video.filter('reverse'))
+
+    try:
+        (
+            ffmpeg
+            .concat(*parts, v=1, a=0)
+            .output(str(tmp_output))
+            .overwrite_output()
+            .run(quiet=True, capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"ffmpeg failed: {e.stderr.decode()}") from e
+
+    if overwrite_input:
+        shutil.move(str(tmp_output), str(output))
+
 def trim_video(input: Union[str, Path],
                output: Union[str, Path],
                start_time: Optional[float] = None,
@@ -247,6 +383,7 @@ def trim_video(input: Union[str, Path],
     except ffmpeg.Error as e:
         raise RuntimeError(f"ffmpeg failed: {e.stderr.decode()}") from e
 
+@metrics.timed("mirror_pipeline_step_seconds", step="download_video")
 def download_video(url: str, output_path: Union[str, Path]) -> None:
     output_path = Path(output_path).expanduser().resolve()
     
@@ -255,3 +392,172 @@ def download_video(url: str, output_path: Union[str, Path]) -> None:
         with open(output_path, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
+
+class VideoStreamWriter:
+    """
+    Encode raw BGR frames into a video through the stdin of an ffmpeg process.
+
+    Frames are queued and fed to ffmpeg from a thread, so the caller renders
+    the next frame while ffmpeg encodes on another core. The queue is
+    bounded: write() blocks when the encoder falls behind. Only the output
+    video touches the disk.
+    """
+
+    def __init__(self,
+                 output: Union[str, Path],
+                 size: Tuple[int, int],
+                 fps: float,
+                 queue_size: int = 8,
+                 vcodec: str = 'libx264',
+                 pix_fmt: str = 'yuv420p',
+                 **output_kwargs) -> None:
+        """
+        Args:
+            output (Union[str, Path]): Output video, overwritten.
+            size (Tuple[int, int]): Frame (width, height).
+            fps (float): Frame rate.
+            queue_size (int): Frames buffered between the caller and ffmpeg.
+            vcodec (str): Output codec.
+            pix_fmt (str): Output pixel format.
+            **output_kwargs: Extra ffmpeg output options (e.g. preset, crf).
+        """
+        self.output = Path(output).expanduser().resolve()
+        self.size = size
+        self.frames = 0
+        self.encode_fps = None
+
+        width, height = size
+        stream = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='bgr24', s=f'{width}x{height}', framerate=fps)
+        if pix_fmt == 'yuv420p' and (width % 2 or height % 2):
+            # 4:2:0 needs even dimensions
+            stream = stream.filter('crop', 'trunc(iw/2)*2', 'trunc(ih/2)*2')
+        self._process = (
+            stream
+            .output(str(self.output), vcodec=vcodec, pix_fmt=pix_fmt, **output_kwargs)
+            .overwrite_output()
+            .global_args('-loglevel', 'error')
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        self._start = None
+        self._error = None
+        self._stderr = b''
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._feeder = threading.Thread(target=self._feed, name="ffmpeg-feed", daemon=True)
+        self._feeder.start()
+        self._reader = threading.Thread(target=self._read_stderr, name="ffmpeg-stderr", daemon=True)
+        self._reader.start()
+
+    def __enter__(self) -> "VideoStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        Queue a frame, copied so the caller can reuse its buffer.
+
+        Raises:
+            ValueError: If the frame is not a uint8 BGR image of the writer size.
+            RuntimeError: If ffmpeg exited.
+        """
+        width, height = self.size
+        if frame.shape != (height, width, 3) or frame.dtype != np.uint8:
+            raise ValueError(f"Expected a {width}x{height} BGR uint8 frame, got {frame.shape} {frame.dtype}")
+        if self._error is not None or self._process.poll() is not None:
+            raise RuntimeError(f"ffmpeg exited early: {self._stderr.decode(errors='replace')}")
+        if self._start is None:
+            self._start = time.monotonic()
+        self._queue.put(frame.tobytes())
+        self.frames += 1
+
+    def close(self) -> float:
+        """
+        Wait for ffmpeg to encode the queued frames and exit.
+
+        Returns:
+            float: Frames per second from the first frame written to the
+                end of the encode.
+
+        Raises:
+            RuntimeError: If ffmpeg fails.
+        """
+        self._queue.put(None)
+        self._feeder.join()
+        returncode = self._process.wait()
+        self._reader.join()
+        if returncode != 0 or self._error is not None:
+            raise RuntimeError(f"ffmpeg failed: {self._stderr.decode(errors='replace')}")
+
+        elapsed = time.monotonic() - self._start if self._start is not None else 0.0
+        self.encode_fps = self.frames / elapsed if elapsed > 0 else 0.0
+        _encode_fps.set(self.encode_fps)
+        return self.encode_fps
+
+    def abort(self) -> None:
+        """Stop ffmpeg without waiting for the queued frames."""
+        self._process.kill()
+        # The feeder drops what is left once the pipe is broken
+        self._queue.put(None)
+        self._feeder.join()
+        self._process.wait()
+        self._reader.join()
+
+    def _feed(self) -> None:
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    return
+                self._process.stdin.write(data)
+        except OSError as e:
+            # ffmpeg exited, keep emptying the queue so write() does not block
+            self._error = e
+            while self._queue.get() is not None:
+                pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def _read_stderr(self) -> None:
+        self._stderr = self._process.stderr.read()
+
+@metrics.timed("mirror_pipeline_step_seconds", step="ffmpeg_encode")
+def write_video(frames: Iterable[np.ndarray],
+                output: Union[str, Path],
+                fps: float,
+                queue_size: int = 8,
+                **kwargs) -> float:
+    """
+    Encode frames from an iterable (e.g. a generator rendering them) into a video.
+
+    Args:
+        frames (Iterable[np.ndarray]): BGR uint8 frames, all the same size.
+        output (Union[str, Path]): Output video, overwritten.
+        fps (float): Frame rate.
+        queue_size (int): Frames buffered between rendering and encoding.
+        **kwargs: Passed to VideoStreamWriter.
+
+    Returns:
+        float: Encode frames per second, see VideoStreamWriter.close().
+
+    Raises:
+        ValueError: If there are no frames or they differ in size.
+        RuntimeError: If ffmpeg fails.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("No frames to encode.")
+
+    height, width = first.shape[:2]
+    with VideoStreamWriter(output, (width, height), fps, queue_size, **kwargs) as writer:
+        writer.write(first)
+        for frame in frames:
+            writer.write(frame)
+    return writer.encode_fps
@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the MIT license.
+
+"""
+Alpha refine-and-composite: the former refine_edges() + add_black_background()
+against composite_alpha(), on one image and on a batch.
+
+Runs on synthetic images with a soft elliptic mask at 640x480 and 1080p,
+and prints the largest difference to the former output.
+
+Usage: python -m bench.alpha_composite [--runs N] [--batch N]
+"""
+
+import argparse, time
+
+import cv2
+import numpy as np
+
+from app.utils.image_processing import composite_alpha
+
+SIZES = {"640x480": (480, 640), "1080p": (1080, 1920)}
+
+
+def former(image_bgra: np.ndarray) -> np.ndarray:
+    """refine_edges() then add_black_background() as they were."""
+    result = image_bgra.copy()
+    result[:, :, 3] = cv2.GaussianBlur(image_bgra[:, :, 3], (0, 0), sigmaX=4, sigmaY=4)
+    b, g, r, a = cv2.split(result)
+    black_bg = np.zeros_like(result[:, :, :3], dtype=np.uint8)
+    alpha_normalized = a.astype(np.float32) / 255.0
+    for c in range(3):
+        black_bg[:, :, c] = (r if c == 2 else g if c == 1 else b) * alpha_normalized + black_bg[:, :, c] * (1 - alpha_normalized)
+    return black_bg
+
+
+def sample(shape, rng) -> np.ndarray:
+    h, w = shape
+    image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(mask, (w // 2, h // 2), (w // 4, h // 3), 0, 0, 360, 255, -1)
+    return image, mask
+
+
+def timeit(fn, runs: int) -> float:
+    fn()
+    start = time.monotonic()
+    for _ in range(runs):
+        fn()
+    return (time.monotonic() - start) / runs * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=4)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, shape in SIZES.items():
+        image, mask = sample(shape, rng)
+        bgra = np.dstack([image, mask])
+        out = np.empty_like(image)
+        images = np.stack([image] * args.batch)
+        masks = np.stack([mask] * args.batch)
+        batch_out = np.empty_like(images)
+
+        diff = np.abs(former(bgra).astype(int) - composite_alpha(image, mask).astype(int)).max()
+        before = timeit(lambda: former(bgra), args.runs)
+        fused = timeit(lambda: composite_alpha(image, mask, out), args.runs)
+        batched = timeit(lambda: composite_alpha(images, masks, batch_out), args.runs) / args.batch
+        print(f"{name:<8} former {before:7.2f} ms   fused {fused:7.2f} ms   "
+              f"batch of {args.batch} {batched:7.2f} ms/image   max diff {diff}")
+
+
+if __name__ == "__main__":
+    main()
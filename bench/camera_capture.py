@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Allocation/latency benchmark of the camera capture path.
+
+Compares the former capture path (VideoCapture.read allocation, cv2.flip
+allocation, copy into the last frame, copy again on read) with the pooled
+ring buffer of app.core.camera.camera. A fake device fills frames in memory
+so the numbers only reflect the Python/OpenCV side.
+
+Usage: python -m bench.camera_capture [--ticks N] [--width W] [--height H]
+"""
+
+import argparse, time, tracemalloc
+
+import cv2
+import numpy as np
+
+from app.core.camera import camera
+
+
+class FakeCapture:
+    """Stands in for cv2.VideoCapture, honours the optional output buffer."""
+
+    def __init__(self, width: int, height: int):
+        self.shape = (height, width, 3)
+        self.frame = np.random.randint(0, 255, self.shape, dtype=np.uint8)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self, image=None):
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, np.uint8)
+        np.copyto(image, self.frame)
+        return True, image
+
+    def release(self) -> None:
+        pass
+
+
+def legacy_tick(cap, state):
+    ret, frame = cap.read()
+    frame = cv2.flip(frame, 0)
+    if ret:
+        state["last"] = frame.copy()
+    return state["last"].copy()
+
+
+def pooled_tick(stream):
+    stream.grab()
+    return stream.latest().image
+
+
+def measure(name, tick, ticks):
+    for _ in range(10):
+        tick()
+
+    tracemalloc.start()
+    allocated = 0
+    latencies = []
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        frame = tick()
+        latencies.append(time.perf_counter() - start)
+        # Peak growth during the tick: every transient frame-sized allocation shows up here
+        allocated += tracemalloc.get_traced_memory()[1] - base
+        del frame
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1e3
+    print(f"{name:>8}: mean {latencies.mean():.3f} ms | p50 {np.percentile(latencies, 50):.3f} ms"
+          f" | p99 {np.percentile(latencies, 99):.3f} ms"
+          f" | peak alloc/tick {allocated / ticks / 1024:.1f} KiB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ticks", type=int, default=500)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    args = ap.parse_args()
+
+    state = {"last": None}
+    legacy_cap = FakeCapture(args.width, args.height)
+    measure("before", lambda: legacy_tick(legacy_cap, state), args.ticks)
+
+    stream = camera._Stream("bench", FakeCapture(args.width, args.height))
+    measure("after", lambda: pooled_tick(stream), args.ticks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 mailitg <mailitg@maili-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Per-call latency of the face-movie alignment, cold vs. warm.
+
+Cold runs spawn `python align.py` per call like before the worker; warm
+runs go through one persistent FaceMovieWorker, whose first call still
+pays the imports and model loading. Needs the face-movie submodule and an
+images directory plus a target picture with a face.
+
+Usage: python -m bench.face_movie_worker IMAGES_DIR TARGET [--calls N] [--script ALIGN]
+"""
+
+import argparse, subprocess, tempfile, time
+
+import numpy as np
+
+import app.config as cfg
+from app.core.morph.face_movie_worker import FaceMovieWorker
+
+
+def report(name: str, latencies) -> None:
+    lat = np.array(latencies) * 1000
+    print(f"{name:<14} first {lat[0]:8.0f} ms   rest p50 {np.percentile(lat[1:], 50):8.0f} ms"
+          f"   max {lat[1:].max():8.0f} ms" if len(lat) > 1 else f"{name:<14} first {lat[0]:8.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("images", help="directory of pictures to align")
+    ap.add_argument("target", help="picture to align them to")
+    ap.add_argument("--calls", type=int, default=5)
+    ap.add_argument("--script", default=str(cfg.FACE_MOVIE_FACE_ALIGN_SCRIPT))
+    args = ap.parse_args()
+
+    def script_args(outdir):
+        return ["-images", args.images, "-target", args.target, "-overlay", "-outdir", outdir]
+
+    cold = []
+    for _ in range(args.calls):
+        with tempfile.TemporaryDirectory() as outdir:
+            start = time.monotonic()
+            subprocess.run(["python", args.script, *script_args(outdir)], check=True, capture_output=True)
+            cold.append(time.monotonic() - start)
+
+    worker = FaceMovieWorker()
+    warm = []
+    try:
+        for _ in range(args.calls):
+            with tempfile.TemporaryDirectory() as outdir:
+                start = time.monotonic()
+                ok, output = worker.run(args.script, script_args(outdir))
+                warm.append(time.monotonic() - start)
+                if not ok:
+                    raise SystemExit(f"alignment failed in the worker:\n{output}")
+    finally:
+        worker.close()
+
+    report("subprocess", cold)
+    report("worker", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright (C) 2025 Stanley Arnaud <stantonik@stantonik-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Load test the threading and asyncio HTTP server backends side by side.
+
+Each backend runs in its own process serving a small static page. The
+bench first opens --streams long-lived SSE connections (the job events
+stream of an idle job, like a phone left on the progress page), then
+--clients concurrent keep-alive clients fetch the page for --duration
+seconds. Reports requests/s, latency percentiles, failed requests and the
+server thread count and RSS while under load.
+
+Usage: python -m bench.http_load [--streams N] [--clients N] [--duration S]
+"""
+
+import argparse, asyncio, os, socket, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+import numpy as np
+
+BACKENDS = ("threading", "asyncio")
+
+
+def serve(backend: str, port: int, web_dir: str) -> None:
+    """Server process: serve web_dir and print the id of an idle job to stream."""
+    import app.config as cfg
+    cfg.WEB_DIR = Path(web_dir)
+    cfg.HTTP_PORT = port
+    from app.core import jobs
+    from app.server import server
+
+    idle = threading.Event()
+    job = jobs.submit("bench", lambda job: idle.wait(), ["idle"])
+    server.run_async(backend)
+    print(job.id, flush=True)
+    threading.Event().wait()
+
+
+def proc_status(pid: int) -> dict:
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.strip()
+    return {"threads": int(status["Threads"]), "rss_mb": int(status["VmRSS"].split()[0]) / 1024}
+
+
+async def open_stream(port: int, path: str) -> asyncio.StreamWriter:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+
+    async def drain():
+        try:
+            while await reader.read(4096):
+                pass
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    asyncio.ensure_future(drain())
+    return writer
+
+
+async def client(port: int, path: str, deadline: float, latencies: list, errors: list) -> None:
+    reader = writer = None
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").lower()
+            length = int(head.split("content-length:")[1].split("\r\n")[0])
+            await reader.readexactly(length)
+            latencies.append(time.monotonic() - start)
+            # HTTP/1.0 servers close after every response
+            if head.startswith("http/1.0") or "connection: close" in head:
+                writer.close()
+                writer = None
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port: int, job_id: str, pid: int, args) -> dict:
+    streams = [await open_stream(port, f"/api/experience/jobs/{job_id}/events") for _ in range(args.streams)]
+    await asyncio.sleep(0.5)
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    tasks = [asyncio.ensure_future(client(port, "/index.html", deadline, latencies, errors))
+             for _ in range(args.clients)]
+    await asyncio.sleep(args.duration / 2)
+    usage = proc_status(pid)
+    await asyncio.gather(*tasks)
+
+    for writer in streams:
+        writer.close()
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return dict(usage, rps=len(latencies) / args.duration, errors=len(errors),
+                p50=np.percentile(lat, 50), p99=np.percentile(lat, 99))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--streams", type=int, default=50, help="idle SSE connections held open")
+    ap.add_argument("--clients", type=int, default=20, help="concurrent keep-alive clients")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--backend", choices=BACKENDS, action="append", help="default: both")
+    ap.add_argument("--serve", choices=BACKENDS, help=argparse.SUPPRESS)
+    ap.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--web", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.web)
+        return
+
+    web_dir = tempfile.mkdtemp(prefix="http_load_")
+    Path(web_dir, "index.html").write_text("<!doctype html>" + "<p>mirror</p>" * 300)
+
+    print(f"{args.streams} streams, {args.clients} clients, {args.duration:.0f} s")
+    print(f"{'backend':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'threads':>8} {'rss MB':>7}")
+    for backend in args.backend or BACKENDS:
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "-m", "bench.http_load", "--serve", backend,
+                                 "--port", str(port), "--web", web_dir],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                env=dict(os.environ, PYTHONUNBUFFERED="1"))
+        try:
+            # The first line that looks like a job id, after the startup logs
+            job_id = ""
+            while len(job_id) != 12:
+                line = proc.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"{backend} server exited")
+                job_id = line.strip()
+            time.sleep(0.5)
+            r = asyncio.run(load(port, job_id, proc.pid, args))
+            print(f"{backend:<10} {r['rps']:>8.0f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['errors']:>7} "
+                  f"{r['threads']:>8} {r['rss_mb']:>7.1f}")
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 mailitg <mailitg@maili-mba.local>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Native morph engine vs. face-movie's `main.py -morph` subprocess.
+
+Both morph SRC into DST with the experience settings (1.0 s transition,
+0.5 s pause, 25 fps) and write a video. The native side uses the gaze
+tracker landmarks and reports the render time per frame apart from the
+total. The subprocess side needs the face-movie submodule, skip it with
+--native-only.
+
+Usage: python -m bench.morph_engine SRC DST [--runs N] [--native-only] [--script MAIN]
+"""
+
+import argparse, subprocess, tempfile, time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import app.config as cfg
+from app.core.camera import gaze, landmarks as lmk
+from app.core.morph import morph
+from app.core.morph.engine import MorphEngine
+from app.utils import image_processing
+
+
+def report(name: str, seconds) -> None:
+    s = np.array(seconds) * 1000
+    print(f"{name:<22} p50 {np.percentile(s, 50):8.1f} ms   min {s.min():8.1f} ms   max {s.max():8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("src", help="picture to morph from, e.g. the aligned capture")
+    ap.add_argument("dst", help="picture to morph to, e.g. the first runway frame")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--native-only", action="store_true")
+    ap.add_argument("--script", default=str(cfg.FACE_MOVIE_MORPH_SCRIPT))
+    args = ap.parse_args()
+
+    src = image_processing.read_image(args.src)
+    dst = cv2.resize(image_processing.read_image(args.dst), src.shape[1::-1], interpolation=cv2.INTER_AREA)
+    tracker = gaze.create_tracker(roi=False)
+    points = []
+    for image in (src, dst):
+        tracker.get_eye_state(image)
+        landmarks = lmk.landmarks_to_array(tracker.get_landmarks())
+        if landmarks is None:
+            raise SystemExit("No face detected in one of the pictures.")
+        points.append(landmarks[:, :2] * np.array(src.shape[1::-1], dtype=np.float32))
+
+    count = int(round(morph.MORPH_TRANSITION_DURATION * morph.MORPH_FPS))
+    setup, frames, native = [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # Keep off the app ramdisk
+        cfg.MORPH_VIDEO_PATH = tmp/"native.mp4"
+        morph.morph_input_dir = tmp/"morph_input"
+        morph.morph_input_dir.mkdir()
+        cv2.imwrite(str(morph.morph_input_dir/"0.png"), src)
+        cv2.imwrite(str(morph.morph_input_dir/"1.png"), dst)
+
+        for _ in range(args.runs):
+            start = time.monotonic()
+            engine = MorphEngine(src, dst, *points)
+            setup.append(time.monotonic() - start)
+            for alpha in np.linspace(0, 1, count):
+                start = time.monotonic()
+                engine.frame(alpha)
+                frames.append(time.monotonic() - start)
+
+            # Whole video as in the experience, landmark detection included
+            start = time.monotonic()
+            if not morph.generate_morph_native(tracker):
+                raise SystemExit("native morph failed")
+            native.append(time.monotonic() - start)
+
+        print(f"{src.shape[1]}x{src.shape[0]}, {len(points[0])} landmarks, "
+              f"{len(engine.triangles)} triangles, {count} transition frames")
+        report("native setup", setup)
+        report("native frame", frames)
+        report("native video", native)
+
+        if args.native_only:
+            return
+        subproc = []
+        for _ in range(args.runs):
+            start = time.monotonic()
+            subprocess.run(["python", args.script, "-morph", "-images", str(morph.morph_input_dir),
+                            "-td", str(morph.MORPH_TRANSITION_DURATION), "-pd", str(morph.MORPH_PAUSE_DURATION),
+                            "-fps", str(morph.MORPH_FPS), "-out", str(tmp/"face_movie.mp4")],
+                           check=True, capture_output=True)
+            subproc.append(time.monotonic() - start)
+        report("face-movie subprocess", subproc)
+
+
+if __name__ == "__main__":
+    main()
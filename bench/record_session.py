@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Record raw preview frames from the camera into a .npy stack for replay.
+
+Frames are stored as delivered by the device (not flipped), so replaying
+them through CAMERA_SOURCE=replay goes through the exact same code path.
+
+Usage: python -m bench.record_session OUT.npy [--seconds S] [--full]
+"""
+
+import argparse, time
+
+import numpy as np
+
+import app.config as cfg
+from app.core.camera.source import V4L2Source
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out", help="output .npy file")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--full", action="store_true", help="record the full device instead of the preview")
+    args = ap.parse_args()
+
+    if args.full:
+        source = V4L2Source(cfg.VIDEO_DEVICE_FULL, cfg.CAMERA_FULL_WIDTH, cfg.CAMERA_FULL_HEIGHT, cfg.CAMERA_FULL_FORMAT)
+    else:
+        source = V4L2Source(cfg.VIDEO_DEVICE_PREVIEW, cfg.CAMERA_PREVIEW_WIDTH, cfg.CAMERA_PREVIEW_HEIGHT,
+                            cfg.CAMERA_PREVIEW_FORMAT)
+    if not source.isOpened():
+        raise SystemExit("could not open video device")
+
+    frames = []
+    end = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < end:
+            ret, frame = source.read()
+            if ret:
+                frames.append(frame)
+    finally:
+        source.release()
+
+    if not frames:
+        raise SystemExit("no frame recorded")
+    np.save(args.out, np.stack(frames))
+    print(f"[INFO] Recorded {len(frames)} frames ({len(frames) / args.seconds:.1f} FPS) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# vim:fenc=utf-8
+#
+# Copyright © 2025 ubuntu <ubuntu@mirrormini>
+#
+# Distributed under terms of the GPLv3 license.
+
+"""
+Replay a recorded session through the camera and gaze tracker.
+
+Reports loop throughput, get_eye_state latency percentiles and CPU usage,
+so the loop can be profiled on a dev machine against the same footage.
+In real-time mode the grabber threads pace the recording like a live
+camera; otherwise every frame is processed as fast as possible.
+
+Usage: python -m bench.replay_loop PREVIEW [--full FULL] [--realtime] [--frames N]
+"""
+
+import argparse, resource, time
+
+import numpy as np
+
+import app.config as cfg
+from app.core.camera import camera
+from app.core.camera.gaze_tracker.gaze_tracker import GazeTracker
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("preview", help="recorded preview session (.npy stack or video)")
+    ap.add_argument("--full", help="recorded full session, defaults to the preview one")
+    ap.add_argument("--realtime", action="store_true", help="pace frames at the recording frame rate")
+    ap.add_argument("--frames", type=int, default=300)
+    args = ap.parse_args()
+
+    cfg.CAMERA_REPLAY_PREVIEW = args.preview
+    cfg.CAMERA_REPLAY_FULL = args.full
+    cfg.CAMERA_REPLAY_REALTIME = args.realtime
+    camera.init(threaded=args.realtime, source="replay")
+
+    tracker = GazeTracker(enable_tracking=True, model_dir=str(cfg.MODEL_DIR))
+    latencies = []
+    states = {}
+    last_seq = 0
+
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    try:
+        while len(latencies) < args.frames:
+            if args.realtime:
+                frame = camera.read_frame(preview=True, newer_than=last_seq, timeout=1.0)
+                if frame is None:
+                    break
+                last_seq = frame.seq
+                image = frame.image
+            else:
+                ret, image = camera.capture(preview=True)
+                if not ret:
+                    break
+
+            start = time.perf_counter()
+            state = tracker.get_eye_state(image)
+            latencies.append(time.perf_counter() - start)
+            states[state] = states.get(state, 0) + 1
+    finally:
+        camera.free()
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    if not latencies:
+        raise SystemExit("no frame processed")
+    latencies = np.array(latencies) * 1e3
+    print(f"frames      : {len(latencies)} in {wall:.2f} s ({len(latencies) / wall:.1f} FPS)")
+    print(f"gaze latency: p50 {np.percentile(latencies, 50):.2f} ms | p95 {np.percentile(latencies, 95):.2f} ms"
+          f" | p99 {np.percentile(latencies, 99):.2f} ms | max {latencies.max():.2f} ms")
+    print(f"cpu         : {cpu:.2f} s ({100 * cpu / wall:.0f}% of one core)"
+          f" | max rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    print(f"states      : {states}")
+
+
+if __name__ == "__main__":
+    main()
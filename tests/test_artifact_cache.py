@@ -0,0 +1,92 @@
+import os, time
+
+from app.utils.artifact_cache import ArtifactCache, cache_key, file_digest
+
+
+def write(path, size, fill=b"x"):
+    path.write_bytes(fill * size)
+    return path
+
+
+def test_cache_key_separates_parts():
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+    assert cache_key(b"x", 1, None) == cache_key(b"x", 1, None)
+    assert cache_key("1") != cache_key(1)
+
+
+def test_file_digest(tmp_path):
+    import hashlib
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    (tmp_path/"f").write_bytes(data)
+    assert file_digest(tmp_path/"f") == hashlib.sha256(data).hexdigest()
+
+
+def test_store_fetch_and_counts(tmp_path):
+    cache = ArtifactCache(tmp_path/"cache", 1000)
+    src = write(tmp_path/"src", 10, b"a")
+    dst = tmp_path/"dst"
+
+    assert not cache.fetch("k", "a.bin", dst) and not dst.exists()
+    cache.store("k", "a.bin", src)
+    assert cache.contains("k", "a.bin") and not cache.contains("k", "b.bin")
+    assert cache.fetch("k", "a.bin", dst) and dst.read_bytes() == b"a" * 10
+    assert (cache.hits, cache.misses, cache.size) == (1, 1, 10)
+
+    # Replacing an artifact does not count it twice
+    cache.store("k", "a.bin", write(src, 20))
+    assert cache.size == 20
+
+
+def test_least_recently_used_key_is_evicted(tmp_path):
+    cache = ArtifactCache(tmp_path/"cache", 250)
+    src = tmp_path/"src"
+    for key in ("a", "b"):
+        cache.store(key, "f", write(src, 100))
+    # A hit makes "a" the most recent
+    assert cache.fetch("a", "f", tmp_path/"dst")
+    cache.store("c", "f", write(src, 100))
+
+    assert cache.contains("a", "f") and cache.contains("c", "f")
+    assert not cache.contains("b", "f") and not (tmp_path/"cache"/"b").exists()
+    assert cache.size == 200
+
+
+def test_whole_key_goes_and_last_one_stays(tmp_path):
+    cache = ArtifactCache(tmp_path/"cache", 150)
+    src = tmp_path/"src"
+    cache.store("a", "one", write(src, 60))
+    cache.store("a", "two", write(src, 60))
+    cache.store("b", "big", write(src, 400))
+    assert not cache.contains("a", "one") and not cache.contains("a", "two")
+    # Alone over budget, the newest key is kept
+    assert cache.contains("b", "big") and cache.size == 400
+
+
+def test_evicted_keys_spill_and_come_back(tmp_path):
+    cache = ArtifactCache(tmp_path/"ram", 150, spill_dir=tmp_path/"sd", spill_max_bytes=1000)
+    src = tmp_path/"src"
+    cache.store("a", "f", write(src, 100, b"a"))
+    cache.store("b", "f", write(src, 100, b"b"))
+
+    assert not (tmp_path/"ram"/"a").exists()
+    assert (tmp_path/"sd"/"a"/"f").read_bytes() == b"a" * 100
+    assert cache.contains("a", "f")
+
+    # A hit from the spill brings the key back, and pushes "b" out in turn
+    dst = tmp_path/"dst"
+    assert cache.fetch("a", "f", dst) and dst.read_bytes() == b"a" * 100
+    assert (tmp_path/"ram"/"a"/"f").exists() and not (tmp_path/"ram"/"b").exists()
+    assert cache.spill.contains("b", "f")
+
+
+def test_recency_survives_restart(tmp_path):
+    cache = ArtifactCache(tmp_path/"cache", 1000)
+    src = tmp_path/"src"
+    for key in ("old", "new"):
+        cache.store(key, "f", write(src, 100))
+    past = time.time() - 100
+    os.utime(tmp_path/"cache"/"old", (past, past))
+
+    reopened = ArtifactCache(tmp_path/"cache", 150)
+    assert reopened.size == 100
+    assert reopened.contains("new", "f") and not reopened.contains("old", "f")
@@ -0,0 +1,70 @@
+import socket, threading
+
+import pytest
+
+for module in ("mpv", "rembg", "runwayml"):
+    pytest.importorskip(module)
+
+from app.server.async_server import AsyncHTTPServer
+
+
+@pytest.fixture
+def server():
+    server = AsyncHTTPServer(port=0, workers=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    assert server.wait_ready(5)
+    yield server
+    server.shutdown()
+    thread.join(5)
+
+
+def exchange(server, raw: bytes) -> bytes:
+    """Send raw bytes and read until the server closes the connection."""
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        sock.sendall(raw)
+        data = b""
+        while chunk := sock.recv(65536):
+            data += chunk
+    return data
+
+
+def test_chunked_body_is_rejected(server):
+    data = exchange(server, b"POST /api/experience/upload HTTP/1.1\r\nHost: x\r\n"
+                            b"Transfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n")
+    assert data.startswith(b"HTTP/1.1 411 ")
+    assert data.count(b"HTTP/1.1") == 1
+
+
+def test_head_stream_sends_headers_only(server):
+    data = exchange(server, b"HEAD /api/debug/camera/stream.mjpeg HTTP/1.1\r\nHost: x\r\n\r\n")
+    head, _, body = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"multipart/x-mixed-replace" in head
+    assert body == b""
+
+
+def test_static_etag_follows_encoding(server):
+    def get(extra=b""):
+        data = exchange(server, b"GET /index.html HTTP/1.1\r\nHost: x\r\nConnection: close\r\n" + extra + b"\r\n")
+        head = data.partition(b"\r\n\r\n")[0].decode()
+        return head.split(" ")[1], dict(line.split(": ", 1) for line in head.split("\r\n")[1:])
+
+    status, identity = get()
+    if status != "200":
+        pytest.skip("no index.html to serve")
+    status, encoded = get(b"Accept-Encoding: gzip\r\n")
+    if "Content-Encoding" not in encoded:
+        pytest.skip("index.html is not served compressed")
+    assert encoded["ETag"] != identity["ETag"]
+
+    status, revalidated = get(b"Accept-Encoding: gzip\r\nIf-None-Match: " + identity["ETag"].encode() + b"\r\n")
+    assert status == "304" and revalidated["ETag"] == encoded["ETag"]
+
+
+@pytest.mark.parametrize("length", [b"-5", b"five", b"1e3", b"+5", b""])
+def test_bad_content_length_is_rejected(server, length):
+    data = exchange(server, b"POST /api/experience/upload HTTP/1.1\r\nHost: x\r\n"
+                            b"Content-Length: " + length + b"\r\n\r\nhello")
+    assert data.startswith(b"HTTP/1.1 400 ")
+    assert data.count(b"HTTP/1.1") == 1
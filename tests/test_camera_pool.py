@@ -0,0 +1,121 @@
+import threading, time
+
+import numpy as np
+import pytest
+
+from app.core.camera import camera
+from app.core.camera.source import CameraSource
+
+
+class FakeSource(CameraSource):
+    """Frames numbered by their first pixel, read into the given buffer."""
+
+    def __init__(self, shape=(4, 6, 3)):
+        self.shape = shape
+        self.count = 0
+        self.released = False
+
+    def isOpened(self) -> bool:
+        return not self.released
+
+    def release(self) -> None:
+        self.released = True
+
+    def read(self, image=None):
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, np.uint8)
+        self.count += 1
+        image[...] = self.count
+        return True, image
+
+
+@pytest.fixture
+def stream():
+    stream = camera._Stream("test", FakeSource())
+    yield stream
+    stream.release()
+
+
+def fill_ring(stream):
+    for _ in range(camera.cfg.CAMERA_RING_SIZE + 1):
+        stream.grab()
+
+
+def test_grab_returns_read_only_flipped_view(stream):
+    stream.cap.read = lambda image=None: (True, np.arange(6, dtype=np.uint8).reshape(3, 2, 1).repeat(3, 2))
+    ret, image = stream.grab()
+    assert ret
+    assert not image.flags.writeable
+    assert image[0, 0, 0] == 4 and image[-1, 0, 0] == 0
+
+
+def test_buffers_are_reused_once_released(stream):
+    fill_ring(stream)
+    pooled = {id(b) for b in stream._free}
+    assert pooled
+    _, image = stream.grab()
+    del image
+    fill_ring(stream)
+    assert {id(f.image) for f in stream._ring} & pooled
+
+
+def test_leased_buffer_is_not_reused(stream):
+    _, image = stream.grab()
+    value = int(image[0, 0, 0])
+    for _ in range(3 * camera.cfg.CAMERA_RING_SIZE):
+        stream.grab()
+    assert image[0, 0, 0] == value
+
+
+def test_derived_views_keep_the_lease(stream):
+    _, image = stream.grab()
+    value = int(image[0, 0, 0])
+    part = image[1:, ::2].T
+    del image
+    for _ in range(3 * camera.cfg.CAMERA_RING_SIZE):
+        stream.grab()
+    assert part.base is not None and (part == value).all()
+
+    base = part
+    while not isinstance(base, camera._Lease):
+        base = base.base
+    buf = base.buf
+    del part, base
+    assert id(buf) not in stream._leases
+
+
+def test_latest_waits_while_stopped(stream):
+    seq = stream.grab() and stream.seq
+    start = time.monotonic()
+    assert stream.latest(newer_than=seq, timeout=0.2) is None
+    assert time.monotonic() - start >= 0.2
+
+
+def test_latest_wakes_on_new_frame(stream):
+    seq = stream.grab() and stream.seq
+    timer = threading.Timer(0.05, stream.grab)
+    timer.start()
+    frame = stream.latest(newer_than=seq, timeout=2.0)
+    timer.join()
+    assert frame is not None and frame.seq == seq + 1
+
+
+def test_opener_opens_the_device_only_for_reads():
+    opened = []
+
+    def opener():
+        opened.append(FakeSource())
+        return opened[-1]
+
+    stream = camera._Stream("full", None, opener=opener)
+    image = stream.grab_still(burst=3, warmup=2)
+    assert image is not None and image[0, 0, 0] >= 3
+    assert len(opened) == 1 and opened[0].count == 5 and opened[0].released
+    assert stream.cap is None
+
+    assert stream.grab()[0]
+    assert len(opened) == 2 and opened[1].released
+
+    stream.release()
+    assert stream.grab_still(burst=3, warmup=2) is None
+    assert len(opened) == 2
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from app.core.camera.source import CameraSource, ReplaySource
+
+
+def test_incomplete_source_fails_on_creation():
+    class NoRead(CameraSource):
+        def isOpened(self) -> bool:
+            return True
+
+    with pytest.raises(TypeError):
+        NoRead()
+
+
+def test_replay_npy_loops_into_given_buffer(tmp_path):
+    frames = np.arange(3, dtype=np.uint8).reshape(3, 1, 1, 1) * np.ones((3, 2, 4, 3), np.uint8)
+    np.save(tmp_path/"session.npy", frames)
+    source = ReplaySource(tmp_path/"session.npy", realtime=False)
+
+    buf = np.empty((2, 4, 3), np.uint8)
+    values = []
+    for _ in range(4):
+        ret, image = source.read(buf)
+        assert ret and image is buf
+        values.append(int(image[0, 0, 0]))
+    assert values == [0, 1, 2, 0]
+    source.release()
+    assert not source.isOpened()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("rembg")
+
+import cv2
+
+from app.utils.image_processing import add_black_background, composite_alpha, refine_edges
+
+
+def sample(rng, h=48, w=64):
+    image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(mask, (w // 2, h // 2), (w // 4, h // 3), 0, 0, 360, 255, -1)
+    mask[: h // 4] = rng.integers(0, 256, (h // 4, w), dtype=np.uint8)
+    return image, mask
+
+
+def former(image, mask, blur_radius=4):
+    """refine_edges() then add_black_background() as they were, in float."""
+    alpha = cv2.GaussianBlur(mask, (0, 0), sigmaX=blur_radius, sigmaY=blur_radius) if blur_radius else mask
+    return (image * (alpha.astype(np.float32) / 255.0)[..., None]).astype(np.uint8)
+
+
+def test_matches_former_within_one_level():
+    image, mask = sample(np.random.default_rng(0))
+    for blur_radius in (0, 4):
+        diff = composite_alpha(image, mask, blur_radius=blur_radius).astype(int) - former(image, mask, blur_radius)
+        assert np.abs(diff).max() <= 1
+
+
+def test_refine_then_black_background():
+    image, mask = sample(np.random.default_rng(1))
+    result = add_black_background(refine_edges(np.dstack([image, mask])))
+    assert np.array_equal(result, composite_alpha(image, mask))
+
+
+def test_batch_equals_single():
+    rng = np.random.default_rng(2)
+    images, masks = zip(*(sample(rng) for _ in range(3)))
+    batch = composite_alpha(np.stack(images), np.stack(masks))
+    for image, mask, result in zip(images, masks, batch):
+        assert np.array_equal(result, composite_alpha(image, mask))
+
+
+def test_out_buffer():
+    image, mask = sample(np.random.default_rng(3))
+    expected = composite_alpha(image, mask)
+    out = np.empty_like(image)
+    assert composite_alpha(image, mask, out) is out
+    assert np.array_equal(out, expected)
+    # In place
+    assert np.array_equal(composite_alpha(image, mask, image), expected)
+
+
+def test_opaque_and_transparent():
+    image = np.full((8, 8, 3), 200, dtype=np.uint8)
+    assert np.array_equal(composite_alpha(image, np.full((8, 8), 255, np.uint8), blur_radius=0), image)
+    assert not composite_alpha(image, np.zeros((8, 8), np.uint8)).any()
+
+
+@pytest.mark.parametrize("images, masks, out", [
+    (np.zeros((8, 8, 3), np.float32), np.zeros((8, 8), np.uint8), None),
+    (np.zeros((8, 8, 3), np.uint8), np.zeros((8, 8), np.float32), None),
+    (np.zeros((8, 8, 4), np.uint8), np.zeros((8, 8), np.uint8), None),
+    (np.zeros((8, 8, 3), np.uint8), np.zeros((8, 9), np.uint8), None),
+    (np.zeros((2, 8, 8, 3), np.uint8), np.zeros((8, 8), np.uint8), None),
+    (np.zeros((8, 8, 3), np.uint8), np.zeros((8, 8), np.uint8), np.zeros((8, 8, 3), np.uint16)),
+    (np.zeros((8, 8, 3), np.uint8), np.zeros((8, 8), np.uint8), np.zeros((8, 16, 3), np.uint8)[:, ::2]),
+])
+def test_rejects_mismatches(images, masks, out):
+    with pytest.raises(ValueError):
+        composite_alpha(images, masks, out)
@@ -0,0 +1,73 @@
+import threading, time
+from contextlib import contextmanager
+
+import pytest
+
+from app.utils.dag import Graph
+
+
+def test_results_flow_through_dependencies():
+    graph = Graph()
+    graph.add("a", lambda: 2)
+    graph.add("b", lambda: 3)
+    graph.add("sum", lambda a, b: a + b, ["a", "b"])
+    graph.add("double", lambda s: 2 * s, ["sum"])
+    assert graph.run() == {"a": 2, "b": 3, "sum": 5, "double": 10}
+
+
+def test_add_rejects_bad_stages():
+    graph = Graph()
+    graph.add("a", lambda: None)
+    with pytest.raises(ValueError, match="Duplicate"):
+        graph.add("a", lambda: None)
+    with pytest.raises(ValueError, match="Unknown dependency"):
+        graph.add("b", lambda x: None, ["missing"])
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=2)
+    graph = Graph()
+    graph.add("left", barrier.wait)
+    graph.add("right", barrier.wait)
+    graph.run(max_workers=2)
+
+
+def test_first_error_is_raised_after_running_stages_finish():
+    finished, started = [], []
+    graph = Graph()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    def slow():
+        time.sleep(0.2)
+        finished.append("slow")
+
+    graph.add("fail", fail)
+    graph.add("slow", slow)
+    graph.add("after", lambda: started.append("after"), ["fail"])
+    graph.add("after_slow", lambda _: started.append("after_slow"), ["slow"])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.run(max_workers=2)
+    assert finished == ["slow"]
+    assert started == []
+
+
+def test_stage_context_and_durations():
+    entered = []
+
+    @contextmanager
+    def context(name):
+        entered.append(name)
+        yield
+
+    graph = Graph()
+    graph.add("a", lambda: time.sleep(0.05))
+    graph.add("b", lambda _: time.sleep(0.05), ["a"])
+    graph.add("c", lambda _: None, ["a"])
+    graph.run(stage_context=context)
+
+    assert sorted(entered) == ["a", "b", "c"]
+    assert graph.critical_path() >= 0.1
+    assert graph.critical_path() == pytest.approx(graph.durations["a"] + graph.durations["b"])
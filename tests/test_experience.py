@@ -0,0 +1,39 @@
+import pytest
+
+for module in ("mpv", "rembg", "runwayml", "app.core.camera.gaze_tracker.gaze_tracker"):
+    pytest.importorskip(module)
+
+from app.core import experience
+
+
+@pytest.mark.parametrize("roi", [True, False])
+def test_stills_and_preview_use_separate_trackers(tmp_path, monkeypatch, roi):
+    child = tmp_path/"child.png"
+    child.touch()
+    monkeypatch.setattr(experience.cfg, "USER_CHILD_PATH", child)
+    monkeypatch.setattr(experience.cfg, "GAZE_INFERENCE_WORKER", False)
+    monkeypatch.setattr(experience.cfg, "GAZE_ROI_TRACKING", roi)
+    monkeypatch.setattr(experience.camera, "capture_still", lambda full_resolution=False: object())
+    created = []
+
+    def create_tracker(roi=None):
+        created.append((roi, object()))
+        return created[-1][1]
+
+    seen = []
+
+    def preprocess(tracker, job=None, capture=None):
+        seen.append((tracker, experience.get_tracker()))
+        return False
+
+    monkeypatch.setattr(experience.gaze, "create_tracker", create_tracker)
+    monkeypatch.setattr(experience.morph, "preprocess", preprocess)
+    monkeypatch.setattr(experience, "_tracker", None)
+    with pytest.raises(RuntimeError, match="preprocessing"):
+        experience.start()
+
+    # The main loop feeds preview frames to the live one meanwhile
+    (_, stills), (_, preview) = created
+    assert [roi for roi, _ in created] == [False, None]
+    assert seen == [(stills, preview)]
+    assert experience.get_tracker() is None
@@ -0,0 +1,33 @@
+import threading
+
+import numpy as np
+
+from app.core.camera.gaze_worker import GazeWorker
+
+
+def test_calls_after_close_are_no_ops():
+    worker = GazeWorker(max_shape=(4, 4, 3))
+    frame = np.zeros((4, 4, 3), np.uint8)
+    assert worker.submit(frame) == 1
+    worker.close()
+
+    assert worker.closed
+    assert worker.submit(frame) is None
+    assert worker.result() is None
+    assert worker.get_eye_state(frame) is None
+    assert worker.get_face_landmarks() is None
+    assert worker.draw_bbox(frame, "") is frame
+    worker.close()
+
+
+def test_close_wakes_waiting_readers():
+    worker = GazeWorker(max_shape=(4, 4, 3))
+    results = []
+    reader = threading.Thread(target=lambda: results.append(worker.result(newer_than=0)))
+    reader.start()
+    reader.join(0.1)
+    assert reader.is_alive()
+
+    worker.close()
+    reader.join(2.0)
+    assert not reader.is_alive() and results == [None]
@@ -0,0 +1,51 @@
+import http.client, threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+for module in ("mpv", "rembg", "runwayml"):
+    pytest.importorskip(module)
+
+from app.server import http_handler
+from app.server.http_handler import MirrorHTTPRequestHandler, query_float
+
+
+def test_query_float_clamps():
+    assert query_float({"fps": ["120"]}, "fps", None, 1, 60) == 60
+    assert query_float({"fps": ["0.5"]}, "fps", None, 1, 60) == 1
+    assert query_float({}, "fps", 5, 1, 60) == 5
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "abc"])
+def test_query_float_rejects_non_finite(value):
+    with pytest.raises(ValueError):
+        query_float({"fps": [value]}, "fps", None, 1, 60)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MirrorHTTPRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    conn.request(method, path, body, headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, data
+
+
+def test_mjpeg_nan_is_bad_request(server):
+    assert request(server, "GET", "/api/debug/camera/stream.mjpeg?fps=nan")[0] == 400
+
+
+def test_post_routes_ignore_the_query(server, monkeypatch):
+    monkeypatch.setattr(http_handler.experience, "stop", lambda: None)
+    assert request(server, "POST", "/api/experience/stop?from=ui", b"")[0] == 200
+    assert request(server, "POST", "/api/experience/nothing?from=ui", b"")[0] == 404
@@ -0,0 +1,128 @@
+import threading, time, uuid
+
+import pytest
+
+from app.core import jobs
+
+
+def name():
+    return f"test-{uuid.uuid4().hex[:6]}"
+
+
+def wait_finished(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    version = 0
+    while job.status not in jobs.FINISHED and time.monotonic() < deadline:
+        version, _ = job.wait_for_update(version, timeout=0.1)
+    return job.status
+
+
+def test_cancel_while_pending():
+    ran = []
+    job = jobs.Job(name(), ["a"])
+    job.cancel()
+    assert job.status == jobs.CANCELLED
+    job.run(lambda job: ran.append(True))
+    assert not ran and job.status == jobs.CANCELLED
+    assert job.stages["a"]["status"] == jobs.PENDING
+
+
+def test_cancel_at_stage_boundary():
+    job = jobs.Job(name(), ["first", "second"])
+    cancel_now = threading.Event()
+    ran = []
+
+    def work(job):
+        with job.stage("first"):
+            cancel_now.set()
+            time.sleep(0.05)
+            ran.append("first")
+        with job.stage("second"):
+            ran.append("second")
+
+    runner = threading.Thread(target=job.run, args=(work,))
+    runner.start()
+    assert cancel_now.wait(2.0)
+    job.cancel()
+    runner.join(2.0)
+
+    # The running stage completes, the next one does not start
+    assert ran == ["first"]
+    assert job.status == jobs.CANCELLED
+    assert job.stages["first"]["status"] == jobs.DONE
+    assert job.stages["second"]["status"] == jobs.PENDING
+    assert job.to_dict()["progress"] == 0.5
+
+
+def test_cancelled_inside_a_stage_marks_it():
+    job = jobs.Job(name(), ["only"])
+
+    def work(job):
+        with job.stage("only"):
+            job.cancel()
+            job.check_cancelled()
+
+    job.run(work)
+    assert job.status == jobs.CANCELLED
+    assert job.stages["only"]["status"] == jobs.CANCELLED
+    assert job.stages["only"]["duration"] is not None
+
+
+def test_failure_is_reported():
+    job = jobs.Job(name(), ["only"])
+
+    def work(job):
+        with job.stage("only"):
+            raise RuntimeError("no face")
+
+    job.run(work)
+    assert job.status == jobs.FAILED and job.error == "no face"
+    assert job.stages["only"]["status"] == jobs.FAILED
+
+
+def test_unique_submit_conflicts():
+    release = threading.Event()
+    job_name = name()
+    first = jobs.submit(job_name, lambda job: release.wait(5.0), unique=True)
+    try:
+        with pytest.raises(jobs.JobConflict) as e:
+            jobs.submit(job_name, lambda job: None, unique=True)
+        assert e.value.job is first
+        assert jobs.active(job_name) is first
+    finally:
+        release.set()
+    assert wait_finished(first) == jobs.DONE
+    assert jobs.active(job_name) is None
+    # Free again once the first one finished
+    assert wait_finished(jobs.submit(job_name, lambda job: None, unique=True)) == jobs.DONE
+
+
+def test_wait_for_update_returns_on_bump():
+    job = jobs.Job(name(), ["only"])
+    version, state = job.wait_for_update(-1, timeout=0)
+    assert state["status"] == jobs.PENDING
+
+    start = time.monotonic()
+    assert job.wait_for_update(version, timeout=0.1)[0] == version
+    assert time.monotonic() - start >= 0.1
+
+    timer = threading.Timer(0.05, job.cancel)
+    timer.start()
+    new_version, state = job.wait_for_update(version, timeout=2.0)
+    timer.join()
+    assert new_version > version and state["status"] == jobs.CANCELLED
+
+
+def test_listeners_are_called_on_updates():
+    job = jobs.Job(name(), ["only"])
+    calls = []
+    job.add_listener(lambda: calls.append((job.status, job.stages["only"]["status"])))
+
+    def work(job):
+        with job.stage("only"):
+            pass
+
+    job.run(work)
+    assert calls[0] == (jobs.RUNNING, jobs.PENDING)
+    assert (jobs.RUNNING, jobs.RUNNING) in calls
+    assert calls[-1] == (jobs.DONE, jobs.DONE)
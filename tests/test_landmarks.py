@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.core.camera import landmarks as lmk
+
+# Exact in float32, so truncation to pixels is the same whichever way it is computed
+POINTS = np.array([[0.25, 0.5, 0.0], [0.75, 0.125, 0.0], [0.5, 0.875, 0.1]], dtype=np.float32)
+
+
+def test_face_landmarks_geometry():
+    face = lmk.FaceLandmarks(POINTS, (200, 100), 0.0)
+    np.testing.assert_allclose(face.pixels(), [[50, 50], [150, 12.5], [100, 87.5]])
+    assert face.bbox() == (50, 12, 150, 87)
+
+
+def test_landmark_objects_round_trip():
+    objects = lmk.array_to_landmarks(POINTS)
+    assert objects[1].y == 0.125
+    np.testing.assert_array_equal(lmk.landmarks_to_array(objects), POINTS)
+    assert lmk.landmarks_to_array(None) is None
+
+
+def test_image_key_depends_on_content_and_shape():
+    image = np.zeros((4, 6, 3), np.uint8)
+    assert lmk.image_key(image) == lmk.image_key(image.copy())
+    assert lmk.image_key(image) != lmk.image_key(image.reshape(6, 4, 3))
+    other = image.copy()
+    other[0, 0, 0] = 1
+    assert lmk.image_key(image) != lmk.image_key(other)
+
+
+def test_cache_detects_each_image_once():
+    cache = lmk.LandmarkCache(max_entries=2)
+    calls = []
+
+    def detect(image):
+        calls.append(int(image[0, 0]))
+        return None if image[0, 0] == 9 else lmk.FaceLandmarks(POINTS, (2, 2), 0.0)
+
+    images = [np.full((2, 2), v, np.uint8) for v in (1, 2, 9)]
+    assert cache.get(images[0], detect) is not None
+    assert cache.get(images[0].copy(), detect) is not None
+    # Failed detections are remembered as well
+    assert cache.get(images[2], detect) is None
+    assert cache.get(images[2], detect) is None
+    assert calls == [1, 9] and (cache.hits, cache.misses) == (2, 2)
+
+    # Least recently used goes first
+    cache.get(images[1], detect)
+    cache.get(images[0], detect)
+    assert calls == [1, 9, 2, 1]
+
+    cache.clear()
+    cache.get(images[2], detect)
+    assert calls[-1] == 9
+
+
+def test_face_landmarks_from_bare_tracker():
+    class Tracker:
+        def get_landmarks(self):
+            return lmk.array_to_landmarks(POINTS)
+
+    face = lmk.face_landmarks(Tracker(), (200, 100), timestamp=3.0)
+    assert face.size == (200, 100) and face.timestamp == 3.0
+    np.testing.assert_allclose(face.points, POINTS)
+
+
+def test_face_bbox_grows_and_clamps():
+    image_processing = pytest.importorskip("app.utils.image_processing", exc_type=ImportError)
+    face = lmk.FaceLandmarks(POINTS, (200, 100), 0.0)
+    assert image_processing.face_bbox(face, 200, 100) == (50, 12, 150, 87)
+    assert image_processing.face_bbox(POINTS, 200, 100, offset=20) == (30, 0, 170, 100)
+    assert image_processing.face_bbox(lmk.array_to_landmarks(POINTS), 200, 100) == (50, 12, 150, 87)
@@ -0,0 +1,37 @@
+from app.utils import metrics
+
+
+def test_counter_renders_with_counter_type():
+    counter = metrics.counter("test_events_total", "Events.", kind="a")
+    counter.inc()
+    counter.inc(2)
+    text = metrics.render()
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{kind="a"} 3.0' in text
+
+
+def test_counter_read_from_fn():
+    totals = {"hits": 0}
+    metrics.counter("test_hits_total", "Hits kept elsewhere.", fn=lambda: totals["hits"])
+    totals["hits"] = 5
+    assert "test_hits_total 5.0" in metrics.render()
+
+
+def test_kind_is_fixed_by_first_registration():
+    metrics.gauge("test_level", "Level.")
+    try:
+        metrics.counter("test_level")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("registered a gauge name as a counter")
+
+
+def test_timed_observes_every_call():
+    @metrics.timed("test_call_seconds", "Calls.", step="x")
+    def call():
+        return 1
+
+    call()
+    call()
+    assert 'test_call_seconds_count{step="x"} 2' in metrics.render()
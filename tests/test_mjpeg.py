@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+import pytest
+
+# The broadcaster reads the tracker from the experience, which pulls in the whole app
+for module in ("mpv", "rembg", "runwayml"):
+    pytest.importorskip(module)
+
+from app.server import mjpeg
+
+
+class FakeCamera:
+    def __init__(self):
+        self.calls = 0
+        self.seq = 0
+
+    def read_frame(self, preview=False, newer_than=None, timeout=None):
+        self.calls += 1
+        if self.seq == 0:
+            return None
+        time.sleep(0.01)
+        self.seq += 1
+        return mjpeg.camera.Frame(self.seq, time.monotonic(), np.zeros((8, 8, 3), np.uint8))
+
+
+@pytest.fixture
+def fake_camera(monkeypatch):
+    fake = FakeCamera()
+    monkeypatch.setattr(mjpeg, "camera", type("camera", (), {"read_frame": fake.read_frame, "Frame": mjpeg.camera.Frame}))
+    monkeypatch.setattr(mjpeg.experience, "get_tracker", lambda: None)
+    return fake
+
+
+def test_idle_without_camera(fake_camera):
+    broadcaster = mjpeg.MjpegBroadcaster()
+    subscriber = broadcaster.subscribe()
+    time.sleep(0.3)
+    broadcaster.unsubscribe(subscriber)
+    assert fake_camera.calls <= 0.3 / mjpeg.IDLE_WAIT + 2
+
+
+def test_thread_survives_failing_subscriber(fake_camera):
+    fake_camera.seq = 1
+    broadcaster = mjpeg.MjpegBroadcaster()
+
+    def closed_loop():
+        raise RuntimeError("Event loop is closed")
+
+    broken = broadcaster.subscribe(notify=closed_loop)
+    good = broadcaster.subscribe()
+    assert good.get(timeout=2.0) is not None
+    assert broken.dropped or broken.get(timeout=0) is not None
+    assert good.get(timeout=2.0) is not None
+
+    broadcaster.unsubscribe(broken)
+    broadcaster.unsubscribe(good)
+    deadline = time.monotonic() + 2.0
+    while broadcaster._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert broadcaster._thread is None
+
+
+def test_resubscribe_while_exiting(fake_camera, monkeypatch):
+    fake_camera.seq = 1
+    broadcaster = mjpeg.MjpegBroadcaster()
+    exiting, resubscribed = mjpeg.threading.Event(), mjpeg.threading.Event()
+    lock = broadcaster._lock
+
+    class WidenedLock:
+        # Holds the encoder between its exit check and its cleanup
+        def __enter__(self):
+            return lock.__enter__()
+
+        def __exit__(self, *exc):
+            lock.__exit__(*exc)
+            if mjpeg.threading.current_thread().name == "mjpeg-encoder" and not broadcaster._subscribers:
+                exiting.set()
+                resubscribed.wait(2.0)
+
+    subscriber = broadcaster.subscribe()
+    assert subscriber.get(timeout=2.0) is not None
+    broadcaster._lock = WidenedLock()
+    broadcaster.unsubscribe(subscriber)
+    assert exiting.wait(2.0)
+    subscriber = broadcaster.subscribe()
+    resubscribed.set()
+
+    assert subscriber.get(timeout=2.0) is not None
+    assert broadcaster._thread is not None
+    broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,84 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+for module in ("rembg", "runwayml", "app.core.camera.gaze_tracker.gaze_tracker"):
+    pytest.importorskip(module)
+
+from app.core.camera import landmarks as lmk
+from app.core.morph import morph
+from app.utils.artifact_cache import ArtifactCache
+
+FACE = np.array([[0.25, 0.25, 0], [0.75, 0.75, 0]], dtype=np.float32)
+
+
+def picture(path, colour):
+    cv2.imwrite(str(path), np.full((64, 64, 3), colour, np.uint8))
+    return path
+
+
+@pytest.fixture
+def child_env(tmp_path, monkeypatch):
+    tmp = tmp_path/"morph"
+    monkeypatch.setattr(morph.cfg, "MORPH_TMP_DIR", tmp)
+    monkeypatch.setattr(morph.cfg, "USER_CHILD_PATH", tmp_path/"user_child.png")
+    for name in ("align_input1_dir", "align_input2_dir", "align_output1_dir", "morph_input_dir"):
+        monkeypatch.setattr(morph, name, tmp/name)
+    monkeypatch.setattr(morph, "user_child_crop_path", tmp/"crop.png")
+    monkeypatch.setattr(morph, "user_child_rembg_path", tmp/"align_input1_dir"/"rembg.png")
+    monkeypatch.setattr(morph, "artifacts", ArtifactCache(tmp_path/"cache", 1 << 30))
+    monkeypatch.setattr(morph, "_child_prepared", None)
+    monkeypatch.setattr(morph, "_child_rembg", None)
+    monkeypatch.setattr(morph, "_child_digest", None)
+    # Only the child picture handling is under test here
+    monkeypatch.setattr(morph.image_processing, "remove_background_array", lambda image, session=None: image.copy())
+    monkeypatch.setattr(morph, "_generate_video", lambda child_img, keys: None)
+    return tmp_path
+
+
+def test_results_follow_the_picture_read(child_env, monkeypatch):
+    first = picture(morph.cfg.USER_CHILD_PATH, (0, 0, 255))
+    second = picture(child_env/"second.png", (255, 0, 0))
+    first_keys = morph.cache_keys()
+    fetch = morph.artifacts.fetch
+
+    def fetch_then_replace(key, name, dst):
+        # A new upload lands right after the job looked the picture up
+        if second.exists():
+            os.replace(second, first)
+        return fetch(key, name, dst)
+
+    monkeypatch.setattr(morph.artifacts, "fetch", fetch_then_replace)
+    monkeypatch.setattr(morph, "_landmark_fn",
+                        lambda tracker: lambda image: lmk.FaceLandmarks(FACE, image.shape[1::-1], 0.0))
+    assert morph.preprocess_child(tracker=None)
+
+    # Cached under the key of the picture actually cropped
+    crop = child_env/"crop_out.png"
+    assert fetch(first_keys["crop"], "child_crop.png", crop)
+    assert tuple(cv2.imread(str(crop))[0, 0]) == (0, 0, 255)
+    # Outdated, the new picture still has to be prepared
+    assert not morph.child_prepared() and morph._child_rembg is None
+    assert morph.cache_keys() != first_keys
+
+
+def test_prepared_when_unchanged(child_env, monkeypatch):
+    picture(morph.cfg.USER_CHILD_PATH, (0, 255, 0))
+    monkeypatch.setattr(morph, "_landmark_fn",
+                        lambda tracker: lambda image: lmk.FaceLandmarks(FACE, image.shape[1::-1], 0.0))
+    assert morph.preprocess_child(tracker=None)
+    assert morph.child_prepared()
+    assert morph._child_rembg.shape == (64, 64, 3)
+
+
+def test_keys_of_a_given_read(child_env):
+    picture(morph.cfg.USER_CHILD_PATH, (0, 0, 255))
+    first = morph.read_child()
+    first_keys = morph.cache_keys(first)
+    picture(child_env/"second.png", (255, 0, 0))
+    os.replace(child_env/"second.png", morph.cfg.USER_CHILD_PATH)
+    # A later read of the new picture does not change the keys of the old one
+    assert morph.cache_keys(morph.read_child()) != first_keys
+    assert morph.cache_keys(first) == first_keys
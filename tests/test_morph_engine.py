@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.core.morph.engine import MorphEngine, border_points, morph_frames, triangulate
+
+H, W = 48, 64
+POINTS = np.array([[20, 15], [44, 15], [32, 26], [24, 36], [40, 36]], dtype=np.float32)
+
+
+def images():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (H, W, 3), dtype=np.uint8), rng.integers(0, 256, (H, W, 3), dtype=np.uint8)
+
+
+def test_triangulation_covers_the_image():
+    points = np.vstack([POINTS, border_points(W, H)])
+    triangles = triangulate(points, (W, H))
+    assert triangles.shape[1] == 3 and len(triangles) > 0
+    (x0, y0), (x1, y1), (x2, y2) = points[triangles].transpose(1, 2, 0)
+    area = np.abs((x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)).sum() / 2
+    assert area == pytest.approx((W - 1) * (H - 1))
+
+
+def test_same_points_give_the_endpoints():
+    src, dst = images()
+    engine = MorphEngine(src, dst, POINTS, POINTS)
+    assert np.array_equal(engine.frame(0.0), src)
+    assert np.array_equal(engine.frame(1.0), dst)
+
+
+def test_endpoints_do_not_warp():
+    # At either end the intermediate shape is that image's own, the maps are identities
+    src, dst = images()
+    engine = MorphEngine(src, dst, POINTS, POINTS + [3, -2])
+    assert np.array_equal(engine.frame(0.0), src)
+    assert np.array_equal(engine.frame(1.0), dst)
+
+
+def test_frame_is_a_reused_buffer():
+    src, dst = images()
+    engine = MorphEngine(src, dst, POINTS, POINTS + 2)
+    first = engine.frame(0.5)
+    assert engine.frame(0.25) is first
+
+
+def test_midway_lies_between():
+    src = np.zeros((H, W, 3), np.uint8)
+    dst = np.full((H, W, 3), 200, np.uint8)
+    frame = MorphEngine(src, dst, POINTS, POINTS + 3).frame(0.5)
+    assert np.abs(frame.astype(int) - 100).max() <= 1
+
+
+@pytest.mark.parametrize("fps, transition, pause", [(25, 1.0, 0.5), (25, 0.3, 0.0), (10, 0.04, 0.26)])
+def test_morph_frames_count(fps, transition, pause):
+    src, dst = images()
+    frames = list(morph_frames(src, dst, POINTS, POINTS, fps, transition, pause))
+    assert len(frames) == max(round(transition * fps), 1) + round(pause * fps)
+    # The pause holds dst itself
+    assert (frames[-1] is dst) == (round(pause * fps) > 0)
+
+
+def test_rejects_mismatches():
+    src, dst = images()
+    with pytest.raises(ValueError):
+        MorphEngine(src, dst[:, 1:], POINTS, POINTS)
+    with pytest.raises(ValueError):
+        MorphEngine(src, dst, POINTS, POINTS[1:])
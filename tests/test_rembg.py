@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+# Runs rembg for real on a tiny u2net-shaped model, no model download
+for module in ("rembg", "onnx", "onnxruntime"):
+    pytest.importorskip(module)
+
+import cv2
+import onnx
+from onnx import TensorProto, helper
+
+from app.utils import image_processing
+
+MODEL = "u2netp"
+
+
+def tiny_u2net(path):
+    """(N, 3, 320, 320) -> (N, 1, 320, 320) like u2net, a sigmoid of a 3x3 conv, batch left dynamic."""
+    rng = np.random.default_rng(0)
+    weights = helper.make_tensor("w", TensorProto.FLOAT, (1, 3, 3, 3), rng.normal(size=27).astype(np.float32))
+    graph = helper.make_graph(
+        [helper.make_node("Conv", ["input", "w"], ["conv"], pads=[1, 1, 1, 1]),
+         helper.make_node("Sigmoid", ["conv"], ["output"])],
+        "tiny_u2net",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["n", 3, 320, 320])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["n", 1, 320, 320])],
+        [weights],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # Where rembg looks for already downloaded models, old and new layouts
+    for directory in (tmp_path, tmp_path/"models"/MODEL):
+        directory.mkdir(parents=True, exist_ok=True)
+        tiny_u2net(str(directory/f"{MODEL}.onnx"))
+    monkeypatch.setenv("U2NET_HOME", str(tmp_path))
+    monkeypatch.setattr(image_processing, "_sessions", {})
+    monkeypatch.setattr(image_processing, "_no_batch", set())
+    monkeypatch.setattr(image_processing, "_batch_checked", set())
+    return image_processing.get_session(MODEL)
+
+
+def pictures():
+    rng = np.random.default_rng(1)
+    images = []
+    for h, w in ((240, 320), (300, 200), (320, 320)):
+        image = cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (0, 0), 5)
+        cv2.circle(image, (w // 2, h // 2), min(h, w) // 3, (250, 240, 230), -1)
+        images.append(image)
+    return images
+
+
+def test_batch_matches_single(session):
+    images = pictures()
+    batched = image_processing.batch_remove_background(images, MODEL)
+    assert MODEL in image_processing._batch_checked
+    for image, result in zip(images, batched):
+        single = image_processing.remove_background_array(image, session)
+        assert result.shape == image.shape
+        assert np.abs(result.astype(int) - single).max() <= 2
+
+
+def test_single_matches_rembg_cutout(session):
+    from rembg import remove
+    image = pictures()[0]
+    rgba = np.asarray(remove(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), session=session))
+    bgra = cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA)
+    expected = image_processing.add_black_background(image_processing.refine_edges(bgra))
+    result = image_processing.remove_background_array(image, session)
+    assert np.abs(result.astype(int) - expected).max() <= 2
+
+
+def test_mismatching_batch_is_not_used(session, monkeypatch):
+    images = pictures()
+    singles = [image_processing.remove_background_array(image, session) for image in images]
+    monkeypatch.setattr(image_processing, "_u2net_masks", lambda s, imgs: [np.zeros(i.shape[:2], np.uint8) for i in imgs])
+
+    results = image_processing.batch_remove_background(images, MODEL)
+    assert MODEL in image_processing._no_batch
+    for single, result in zip(singles, results):
+        np.testing.assert_array_equal(result, single)
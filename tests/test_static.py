@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from app.server.static import StaticFiles
+
+SCRIPT = b"function mirror() { return 'mirror'; }\n" * 64
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path/"app.js").write_bytes(SCRIPT)
+    (tmp_path/"logo.png").write_bytes(b"\x89PNG" + bytes(2048))
+    return StaticFiles(tmp_path)
+
+
+def test_variants_have_their_own_etag(files):
+    entry = files.lookup("/app.js")
+    assert gzip.decompress(entry.variants["gzip"]) == SCRIPT
+    tags = {entry.etag_for(None), *(entry.etag_for(encoding) for encoding in entry.variants)}
+    assert len(tags) == 1 + len(entry.variants)
+    assert entry.etag_for(None) == entry.etag
+    assert entry.etag_for("gzip") == entry.etag[:-1] + '-gzip"'
+
+
+def test_not_modified_matches_any_variant(files):
+    entry = files.lookup("/app.js")
+    assert entry.not_modified(entry.etag, None)
+    assert entry.not_modified(f'"other", W/{entry.etag_for("gzip")}', None)
+    assert entry.not_modified("*", None)
+    assert not entry.not_modified('"other"', None)
+    # Not a variant this file has
+    logo = files.lookup("/logo.png")
+    assert not logo.variants
+    assert not logo.not_modified(logo.etag_for("gzip"), None)
+
+
+def test_etags_change_with_the_file(files, tmp_path):
+    old = files.lookup("/app.js")
+    (tmp_path/"app.js").write_bytes(SCRIPT + b"// v2\n")
+    files.ttl = 0
+    new = files.lookup("/app.js")
+    assert not new.not_modified(old.etag_for("gzip"), None)
+    assert not new.not_modified(old.etag, None)
@@ -0,0 +1,93 @@
+import pytest
+
+from app.server import upload as upload_module
+from app.server.upload import ChildUpload, MultipartReader, UploadError
+
+BOUNDARY = "----boundary42"
+PICTURE = bytes(range(256)) * 40 + b"\r\n--not-the-boundary\r\n"
+
+
+def multipart(*parts, boundary=BOUNDARY):
+    body = b""
+    for name, data in parts:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"x.jpg\"\r\n"
+                 f"Content-Type: image/jpeg\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+@pytest.fixture(autouse=True)
+def temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_module.cfg, "TEMP_DIR", tmp_path/"tmp")
+    return tmp_path/"tmp"
+
+
+def receive(body, content_type, chunk_size):
+    upload = ChildUpload(content_type, len(body))
+    for i in range(0, len(body), chunk_size):
+        upload.feed(body[i:i + chunk_size])
+    return upload.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, len(BOUNDARY) + 3, 4096])
+def test_multipart_field_is_streamed_whole(chunk_size):
+    body = multipart(("other", b"skip me"), ("file", PICTURE), ("file", b"second file ignored"))
+    path = receive(body, f"multipart/form-data; boundary={BOUNDARY}", chunk_size)
+    assert path.read_bytes() == PICTURE
+
+
+def test_raw_body():
+    path = receive(PICTURE, "image/jpeg", 1000)
+    assert path.read_bytes() == PICTURE
+
+
+def test_concurrent_uploads_get_their_own_file():
+    first = ChildUpload("image/jpeg", 3)
+    second = ChildUpload("image/jpeg", 3)
+    first.feed(b"aaa")
+    second.feed(b"bbb")
+    assert first.path != second.path
+    assert first.finish().read_bytes() == b"aaa"
+    assert second.finish().read_bytes() == b"bbb"
+
+
+@pytest.mark.parametrize("body, message", [
+    (multipart(("file", PICTURE))[:-20], "Truncated multipart"),
+    (multipart(("other", PICTURE)), "Missing 'file'"),
+    (b"no boundary here", "Truncated multipart"),
+])
+def test_bad_multipart_is_rejected_and_removed(temp_dir, body, message):
+    with pytest.raises(UploadError, match=message) as e:
+        receive(body, f"multipart/form-data; boundary={BOUNDARY}", 64)
+    assert e.value.code == 400
+    assert not list(temp_dir.iterdir())
+
+
+@pytest.mark.parametrize("content_type, length, code", [
+    ("image/jpeg", None, 411),
+    ("image/jpeg", upload_module.cfg.UPLOAD_MAX_SIZE + 1, 413),
+    ("text/plain", 10, 415),
+    ("multipart/form-data", 10, 400),
+])
+def test_rejected_before_reading(temp_dir, content_type, length, code):
+    with pytest.raises(UploadError) as e:
+        ChildUpload(content_type, length)
+    assert e.value.code == code
+
+
+def test_abort_removes_the_file(temp_dir):
+    upload = ChildUpload("image/jpeg", 3)
+    upload.feed(b"abc")
+    upload.finish()
+    upload.abort()
+    assert not list(temp_dir.iterdir())
+
+
+def test_split_delimiter_is_not_written():
+    out = []
+    reader = MultipartReader(BOUNDARY, "file", type("out", (), {"write": lambda self, d: out.append(d)})())
+    body = multipart(("file", b"data"))
+    cut = body.index(b"\r\n--" + BOUNDARY.encode(), 10) + 3
+    reader.feed(body[:cut])
+    reader.feed(body[cut:])
+    reader.close()
+    assert b"".join(out) == b"data"
@@ -0,0 +1,98 @@
+import shutil, subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from app.utils import video_processing
+from app.utils.video_processing import keyframe_chunks, keyframe_times, make_pingpong_video
+
+FRAMES = [{"pts_time": "1.4"}, {"pts_time": "0.000000"}, {"pts_time": "N/A", "pkt_pts_time": "0.7"}, {}]
+
+
+def probe_returning(result):
+    return lambda filename, **kwargs: result
+
+
+def test_keyframe_times(monkeypatch):
+    monkeypatch.setattr(video_processing.ffmpeg, "probe", probe_returning(
+        {"frames": FRAMES, "format": {"duration": "3.000000"}, "streams": [{"duration": "2.9"}]}))
+    assert keyframe_times("clip.mp4") == ([0.0, 0.7, 1.4], 3.0)
+
+
+@pytest.mark.parametrize("probe, duration", [
+    ({"format": {"duration": "N/A"}, "streams": [{"duration": "2.5"}]}, 2.5),
+    ({"format": {}, "streams": [{}]}, None),
+    ({"streams": []}, None),
+])
+def test_keyframe_times_without_container_duration(monkeypatch, probe, duration):
+    monkeypatch.setattr(video_processing.ffmpeg, "probe", probe_returning(probe))
+    assert keyframe_times("clip.h264") == ([], duration)
+
+
+def test_keyframe_chunks():
+    keyframes = [0.0, 0.7, 1.4, 2.1, 2.8]
+    assert keyframe_chunks(keyframes, 3.0, 1.0) == [(0.0, 1.4), (1.4, 2.8), (2.8, 3.0)]
+    # 0 gives one chunk per GOP
+    assert keyframe_chunks(keyframes, 3.0, 0) == [(0.0, 0.7), (0.7, 1.4), (1.4, 2.1), (2.1, 2.8), (2.8, 3.0)]
+    assert keyframe_chunks(keyframes, 3.0, 10.0) == [(0.0, 3.0)]
+    assert keyframe_chunks([], 3.0, 1.0) == [(0.0, 3.0)]
+
+
+def test_keyframe_chunks_unknown_duration():
+    assert keyframe_chunks([0.0, 0.7, 1.4], None, 0.5) == [(0.0, 0.7), (0.7, 1.4), (1.4, None)]
+    assert keyframe_chunks([], None, 1.0) == [(0.0, None)]
+
+
+def test_keyframe_chunks_past_duration():
+    # A keyframe at or after the reported end adds no empty chunk
+    assert keyframe_chunks([0.0, 1.0, 2.0], 2.0, 0.5) == [(0.0, 1.0), (1.0, 2.0)]
+
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")),
+                                  reason="ffmpeg and ffprobe are needed")
+
+
+def clip(path, fmt=None):
+    # 30 numbered frames, a keyframe every 7
+    cmd = ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=64x48:rate=10:duration=3",
+           "-g", "7", "-pix_fmt", "yuv420p"]
+    subprocess.run(cmd + (["-f", fmt] if fmt else []) + [str(path)], check=True)
+    return path
+
+
+def frames(path):
+    cap = cv2.VideoCapture(str(path))
+    out = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        out.append(frame.astype(np.int16))
+    cap.release()
+    return out
+
+
+@needs_ffmpeg
+def test_keyframe_times_real(tmp_path):
+    keyframes, duration = keyframe_times(clip(tmp_path/"clip.mp4"))
+    assert keyframes == pytest.approx([0.0, 0.7, 1.4, 2.1, 2.8])
+    assert duration == pytest.approx(3.0)
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("name, fmt", [("clip.mp4", None), ("clip.h264", "h264")])
+def test_pingpong_chunked_matches_whole(tmp_path, name, fmt):
+    source = clip(tmp_path/name, fmt)
+    make_pingpong_video(source, tmp_path/"whole.mp4")
+    make_pingpong_video(source, tmp_path/"chunked.mp4", segment_duration=0)
+    whole, chunked = frames(tmp_path/"whole.mp4"), frames(tmp_path/"chunked.mp4")
+    original = frames(source)
+
+    assert len(original) == 30
+    assert len(chunked) == len(whole) == 60
+    for a, b in zip(whole, chunked):
+        assert np.abs(a - b).mean() < 2
+    # Played back then reversed
+    for a, b in zip(chunked[30:], reversed(original)):
+        assert np.abs(a - b).mean() < 8
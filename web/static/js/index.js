@@ -46,22 +46,27 @@ function uploadFile(file) {
     const formData = new FormData();
     formData.append('file', file);
 
-    fetch('/experience/start', {
+    fetch('/api/experience/upload', {
         method: 'POST',
         body: formData
     })
         .then(response => {
+            if (response.status === 422) {
+                throw new Error('No face found');
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error ${response.status}`);
             }
-            return response.text();
+            return response.json();
         })
         .then(result => {
             dropZone.textContent = 'Upload successful!\nPlease look at the mirror, the experience will begin...';
         })
         .catch(error => {
             console.error('Upload error:', error);
-            dropZone.textContent = 'Upload failed.';
+            dropZone.textContent = error.message === 'No face found'
+                ? 'No face found, please upload another picture.'
+                : 'Upload failed.';
         });
 }
 